@@ -12,7 +12,24 @@ from routes.blogs import blogs_routes
 from routes.forums import forums_routes
 from routes.tutorials import tutorials_routes
 
-app = FastAPI()
+# Utils
+from utils.codec import DefaultResponse
+from utils.cache import CacheMiddleware
+from utils.cache import responses
+from utils.compression import CompressionMiddleware
+from utils.conditional import ConditionalMiddleware
+
+# the responses are serialized with orjson when it is installed
+app = FastAPI(default_response_class=DefaultResponse)
+
+# the GET responses are kept until their collections change
+app.add_middleware(CacheMiddleware)
+
+# the responses are compressed for the clients that accept it
+app.add_middleware(CompressionMiddleware)
+
+# the GET responses have ETag and Last-Modified, the clients revalidate them
+app.add_middleware(ConditionalMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,8 +55,18 @@ from home import HOME
     path="/",
     tags=["Home"]
 )
-def home():
+async def home():
     print(HOME)
     return {
         "Platzi": "Never stop learning, because life never stops teaching"
     }
+
+@app.get(
+    path="/_cache",
+    tags=["Home"]
+)
+async def cache_stats():
+    """
+    This path operation returns the hits and the misses of the response cache
+    """
+    return responses.stats()
@@ -1,24 +1,36 @@
 # Python
 from typing import List
+from typing import Optional
 
 # FastAPI
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import Body
+from fastapi import Query
 from fastapi import status
 
 # Models
+from schemas.contributions import ContributionAnswer
 from schemas.contributions import ContributionTitle
 from schemas.contributions import ContributionTitleBasic
 
 # Utils
 from utils.functions import get_all_contributions
+from utils.functions import get_fields
 from utils.functions import get_contribution
+from utils.functions import get_contribution_comments
 from utils.functions import get_contribution_basic
 from utils.functions import post_contribution
 from utils.functions import put_contribution
 from utils.functions import delete_contribution
+from utils.functions import lock_files
+from utils.routing import TrustedRoute
+from utils.pagination import Page
+from utils.pagination import CommentPage
+from utils.filters import ContributionFilter
+from utils.executor import offload
 
-blogs_routes = APIRouter()
+blogs_routes = APIRouter(route_class=TrustedRoute)
 
 
 # Blog
@@ -29,15 +41,21 @@ blogs_routes = APIRouter()
     summary="get all blogs",
     tags=["Blogs"]
 )
-def all_blogs():
+@offload
+def all_blogs(page: Page = Depends(), filters: ContributionFilter = Depends()):
     """
-    This path operation returns all blogs
+    This path operation returns a page of blogs
 
     Parameters:
+        - limit: int, records in the page
+        - cursor: str, cursor of the page
+        - id_user, kind, date_from, date_to, min_likes: the filters
+        - sort, descending: the order
+        - stream: bool, all the blogs from the cursor in NDJSON
 
     Returns a list of blogs with a ContributionTitle structure:
     """
-    blogs = get_all_contributions('blogs')
+    blogs = get_all_contributions('blogs', page, filters)
     
     return blogs
 
@@ -48,18 +66,49 @@ def all_blogs():
     summary="get a blog publication",
     tags=["Blogs"]
 )
-def get_blog(id_blog):
+@offload
+def get_blog(
+    id_blog,
+    fields: Optional[str] = Query(default=None, description="comma separated fields of the blog")
+):
     """
     This path operation returns a blog
 
     Parameters:
+        - id_blog: str
+        - fields: str, the fields of the blog, all of them by default
 
     Returns a blog with a ContributionTitle structure:
     """
-    blog = get_contribution('blogs', id_blog)
+    fields = get_fields(fields, ContributionTitle)
+    blog = get_contribution('blogs', id_blog, fields)
     
     return blog
 
+@blogs_routes.get(
+    path="/{id_blog}/comentarios",
+    response_model=List[ContributionAnswer],
+    status_code=status.HTTP_200_OK,
+    summary="get the comments of a blog publication",
+    tags=["Blogs"]
+)
+@offload
+def get_blog_comments(id_blog, page: CommentPage = Depends()):
+    """
+    This path operation returns a page of the comments of a blog
+
+    Parameters:
+        - id_blog: str
+        - limit: int, comments in the page
+        - cursor: str, cursor of the page
+        - order: str, recent or likes
+
+    Returns a list of comments with a ContributionAnswer structure:
+    """
+    comments = get_contribution_comments('blogs', id_blog, page)
+
+    return comments
+
 @blogs_routes.get(
     path="/{id_blog}/basic",
     response_model=ContributionTitleBasic,
@@ -67,6 +116,7 @@ def get_blog(id_blog):
     summary="get a blog publication",
     tags=["Blogs"]
 )
+@offload
 def get_blog_basic(id_blog):
     """
     This path operation returns the basic description for a blog
@@ -86,6 +136,8 @@ def get_blog_basic(id_blog):
     summary="create a blog publication",
     tags=["Blogs"]
 )
+@offload
+@lock_files('data/blogs.json')
 def post_blog(blog: ContributionTitleBasic = Body(...)):
     """
     This path operation create a new blog
@@ -106,6 +158,8 @@ def post_blog(blog: ContributionTitleBasic = Body(...)):
     summary="update a blog publication",
     tags=["Blogs"]
 )
+@offload
+@lock_files('data/blogs.json')
 def put_blog(id_blog, blog: ContributionTitleBasic = Body(...)):
     """
     This path operation update a blog
@@ -127,6 +181,8 @@ def put_blog(id_blog, blog: ContributionTitleBasic = Body(...)):
     summary="delete a blog publication",
     tags=["Blogs"]
 )
+@offload
+@lock_files('data/blogs.json')
 def delete_blog(id_blog):
     """
     This path operation delete a blog
@@ -3,6 +3,7 @@ from typing import List
 
 # FastAPI
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import Body
 from fastapi import status
 
@@ -12,12 +13,20 @@ from schemas.categories import BaseCategoryRoute
 from schemas.categories import CategoryRoutes
 
 # Utils
-from utils.functions import get_filename_json
-from utils.functions import write_filename_json
+from utils.functions import get_index
+from utils.functions import get_record
+from utils.functions import insert_record
+from utils.functions import update_record
+from utils.functions import delete_record
 from utils.functions import validate_unique_key
 from utils.functions import validate_valid_key
+from utils.functions import validate_valid_keys
+from utils.functions import lock_files
+from utils.routing import TrustedRoute
+from utils.pagination import Page
+from utils.executor import offload
 
-categories_routes = APIRouter()
+categories_routes = APIRouter(route_class=TrustedRoute)
 
 
 # Categories
@@ -28,18 +37,25 @@ categories_routes = APIRouter()
     summary="get all categories",
     tags=["Categories"]
 )
-def all_categories():
+@offload
+def all_categories(page: Page = Depends()):
     """
-    This path operation returns all categories
+    This path operation returns a page of categories
 
     Parameters:
+        - limit: int, records in the page
+        - cursor: str, cursor of the page
+        - stream: bool, all the categories from the cursor in NDJSON
 
     Returns a list of categories with following attributes:
         - id_category: str
         - name: str
 
     """
-    categories = get_filename_json('data/categories.json')
+    if page.stream:
+        return page.stream_records('data/categories.json')
+
+    categories = page.records('data/categories.json')
     categories = [{"id_category":c["id_category"],"name":c["name"]} for c in categories]
 
     return categories
@@ -51,6 +67,7 @@ def all_categories():
     summary="get a category",
     tags=["Categories"]
 )
+@offload
 def get_category(id_category):
     """
     This path operation the routes for a category
@@ -64,13 +81,13 @@ def get_category(id_category):
         - image_url: HttpUrl
         - courses_number: str
     """
-    categories = get_filename_json('data/categories.json')
-    routes = get_filename_json('data/routes.json')
-    
-    category = list(filter(lambda c: c['id_category']==id_category, categories))[0]
-    del categories
+    category = get_record(
+        'data/categories.json', 'id_category', id_category,
+        f"Invalid id category '{id_category}'"
+    )
+    routes = get_index('data/routes.json', 'id_route')
     
-    routes = list(filter(lambda r: r['id_route'] in category['routes'], routes))
+    routes = [routes[r] for r in category['routes'] if r in routes]
     category['routes'] = routes
 
     return category
@@ -82,6 +99,8 @@ def get_category(id_category):
     summary="create a category",
     tags=["Categories"]
 )
+@offload
+@lock_files('data/categories.json')
 def post_category(category: BaseCategoryRoute = Body(...)):
     """
     This path operation create a new category
@@ -92,31 +111,28 @@ def post_category(category: BaseCategoryRoute = Body(...)):
     Return a json with the new category
     """
     category = category.dict()
-    categories = get_filename_json('data/categories.json')
 
     # id_category must be unique
     validate_unique_key(
-        category['id_category'], categories, 'id_category',
+        category['id_category'], get_index('data/categories.json', 'id_category'), 'id_category',
         f"Invalid id category '{category['id_category']}'"
     )
 
     # name must be unique
     validate_unique_key(
-        category['name'], categories, 'name',
+        category['name'], get_index('data/categories.json', 'name'), 'name',
         f"Invalid name category '{category['name']}'"
     )
 
     # the id_courses must be valid
-    routes = get_filename_json('data/routes.json')
-    for r in category['routes']:
-        validate_valid_key(
-            r, routes, 'id_route',
-            f"Invalid id route '{r}'"
-        )
+    routes = get_index('data/routes.json', 'id_route')
+    validate_valid_keys(
+        category['routes'], routes, 'id_route',
+        "Invalid id route"
+    )
     
     # Save the category
-    categories.append(category)
-    write_filename_json('data/categories.json', categories)
+    insert_record('data/categories.json', category)
 
     return category
 
@@ -127,6 +143,8 @@ def post_category(category: BaseCategoryRoute = Body(...)):
     summary="update a category",
     tags=["Categories"]
 )
+@offload
+@lock_files('data/categories.json')
 def put_category(id_category, category: BaseCategoryRoute = Body(...)):
     """
     This path operation update a category
@@ -138,34 +156,29 @@ def put_category(id_category, category: BaseCategoryRoute = Body(...)):
     Return a json with the updated category
     """
     category = category.dict()
-    categories = get_filename_json('data/categories.json')
+    categories = get_index('data/categories.json', 'id_category')
 
     # id_category must be valid
     validate_valid_key(
         id_category, categories, 'id_category',
         f"Invalid id category '{id_category}'"
     )
-    del categories
 
     # name must be unique
-    temp_categories = list(filter(lambda c: c["id_category"] != id_category, categories))
     validate_unique_key(
-        category["name"], temp_categories, 'name',
-        f"Invalid name category '{category['name']}'"
+        category["name"], get_index('data/categories.json', 'name'), 'name',
+        f"Invalid name category '{category['name']}'",
+        current=categories[id_category]
     )
-    del temp_categories
-    routes = get_filename_json('data/routes.json')
+    routes = get_index('data/routes.json', 'id_route')
     
     # id_routes must be valid
-    for r in category['routes']:
-        validate_valid_key(
-            r, routes, 'id_route',
-            f"Invalid id route: '{r}'"
-        )
+    validate_valid_keys(
+        category['routes'], routes, 'id_route',
+        "Invalid id route:"
+    )
     del routes
-    categories = list(filter(lambda c: c['id_category']!=id_category, categories))
-    categories.append(category)
-    write_filename_json('data/categories.json', categories)
+    update_record('data/categories.json', 'id_category', id_category, category)
 
     return category
 
@@ -176,6 +189,8 @@ def put_category(id_category, category: BaseCategoryRoute = Body(...)):
     summary="delete a category",
     tags=["Categories"]
 )
+@offload
+@lock_files('data/categories.json')
 def delete_category(id_category):
     """
     This path operation delete a category
@@ -185,7 +200,7 @@ def delete_category(id_category):
     
     Return a json with the delete category
     """
-    categories = get_filename_json('data/categories.json')
+    categories = get_index('data/categories.json', 'id_category')
     
     # id category must be valid
     validate_valid_key(
@@ -194,8 +209,6 @@ def delete_category(id_category):
     )
 
     # save categories
-    category = list(filter(lambda c: c['id_category'] == id_category, categories))[0]
-    categories = list(filter(lambda c: c['id_category'] != id_category, categories))
-    write_filename_json('data/categories.json', categories)
+    category = delete_record('data/categories.json', 'id_category', id_category)
 
     return category
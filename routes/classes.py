@@ -1,25 +1,91 @@
 # Python
 from typing import List
+from typing import Optional
 import functools
 
 # FastAPI
 from fastapi import APIRouter
 from fastapi import HTTPException
 from fastapi import Body
+from fastapi import Depends
+from fastapi import Query
 from fastapi import status
 
 # Models
 from schemas.bases import BaseClass
+from schemas.bulk import BulkResult
+from schemas.contributions import ContributionAnswer
 from schemas.classes import ClassContent
 from schemas.classes import ClassContentBasic
 
 # Utils
-from utils.functions import get_filename_json
-from utils.functions import write_filename_json
+from utils.functions import get_fields
+from utils.functions import wanted
+from utils.functions import get_index
+from utils.functions import get_record
+from utils.functions import get_comments
+from utils.functions import get_referrers
+from utils.functions import transaction
+from utils.functions import insert_record
+from utils.functions import insert_records
+from utils.functions import update_record
 from utils.functions import validate_unique_key
 from utils.functions import validate_valid_key
+from utils.functions import validate_valid_keys
+from utils.functions import lock_files
+from utils.routing import TrustedRoute
+from utils.pagination import Page
+from utils.pagination import CommentPage
+from utils.loader import Loader
+from utils.executor import offload
 
-classes_routes = APIRouter()
+classes_routes = APIRouter(route_class=TrustedRoute)
+
+
+def validate_course_class(course, id_class):
+    """
+    the class must be in a module of the course
+    """
+    id_classes = list(map(lambda c: c["id_classes"], course["modules"]))
+    id_classes = functools.reduce(lambda a,b: a+b, id_classes, [])
+    if id_class not in id_classes:
+        raise HTTPException(
+            status_code=404,
+            detail=f"HTTP_404_NOT_FOUND: Invalid id class '{id_class}' for the id course '{course['id_course']}'"
+        )
+
+
+def prepare_class(class_, index=get_index):
+    """
+    parse a new class and validate it with the indexes of index(path, key)
+    """
+    class_ = class_.dict()
+
+    # id_class must be unique
+    validate_unique_key(
+        class_["id_class"], index('data/classes.json', 'id_class'), 'id_class',
+        f"Invalid id class '{class_['id_class']}'"
+    )
+
+    # name must be unique
+    validate_unique_key(
+        class_["name"], index('data/classes.json', 'name'), 'name',
+        f"Invalid id class '{class_['name']}'"
+    )
+
+    # id_comments must not be in class_
+    if class_["id_comments"]:
+        raise HTTPException(
+            status_code=406,
+            detail=f"HTTP_406_NOT_ACCEPTABLE: Invalid key 'id_comments'"
+        )
+
+    # Parsing class resourses
+    class_["video_url"] = str(class_["video_url"])
+    for r in class_["resourses"]:
+        r["url"] = str(r["url"])
+
+    return class_
 
 
 # Classes
@@ -30,16 +96,23 @@ classes_routes = APIRouter()
     summary="get all class with a basic information",
     tags=["Classes"]
 )
-def all_classes():
+@offload
+def all_classes(page: Page = Depends()):
     """
-    This path operation returns all classes
+    This path operation returns a page of classes
 
     Parameters:
+        - limit: int, records in the page
+        - cursor: str, cursor of the page
+        - stream: bool, all the classes from the cursor in NDJSON
 
     Returns a list of classes with a BaseClass structure:
     """
-    classes = get_filename_json('data/classes.json')
-    
+    if page.stream:
+        return page.stream_records('data/classes.json')
+
+    classes = page.records('data/classes.json')
+
     return classes
 
 @classes_routes.get(
@@ -49,30 +122,26 @@ def all_classes():
     summary="get a complete description of a class",
     tags=["Classes"]
 )
+@offload
 def get_classes_basic(id_class):
     """
     This path operation return the basic description for a class
 
     Parameters:
         - id_class: str
-    
+
     Returns a class with with a ClassContentBasic structure:
     """
-    classes = get_filename_json('data/classes.json')
-
     # id_class mush be valid
-    validate_valid_key(
-        id_class, classes, 'id_class',
+    class_ = get_record(
+        'data/classes.json', 'id_class', id_class,
         f"Invalid id class '{id_class}'"
     )
 
-    class_ = list(filter(lambda c: c["id_class"] == id_class, classes))[0]
-    del classes
-
     # Parsing class resourses
     for r in class_["resourses"]:
         r["url"] = str(r["url"])
-    
+
     return class_
 
 @classes_routes.get(
@@ -82,116 +151,102 @@ def get_classes_basic(id_class):
     summary="get a complete description of a class",
     tags=["Classes"]
 )
-def get_class(id_course, id_class):
+@offload
+def get_class(
+    id_course,
+    id_class,
+    fields: Optional[str] = Query(default=None, description="comma separated fields of the class")
+):
     """
     This path operation return the complete description for a class
 
     Parameters:
         - id_class: str
-    
+        - fields: str, the fields of the class, all of them by default
+
     Returns a class with with a ClassContent structure:
     """
-    courses = get_filename_json('data/courses.json')
-    
+    fields = get_fields(fields, ClassContent)
+
     # id_course mush be valid
-    validate_valid_key(
-        id_course, courses, 'id_course',
+    course = get_record(
+        'data/courses.json', 'id_course', id_course,
         f"Invalid id course '{id_course}'"
     )
 
     # id_class mush be valid for id_course
-    course = list(filter(lambda c: c["id_course"] == id_course, courses))[0]
-    del courses
-    id_classes = list(map(lambda c: c["id_classes"], course["modules"]))
-    id_classes = functools.reduce(lambda a,b: a+b, id_classes)
-    if id_class not in id_classes:
-        raise HTTPException(
-            status_code=404,
-            detail=f"HTTP_404_NOT_FOUND: Invalid id class '{id_class}' for the id course '{id_course}'"
-        )
+    validate_course_class(course, id_class)
 
-    classes = get_filename_json('data/classes.json')
-    class_ = list(filter(lambda c: c["id_class"] == id_class, classes))[0]
-    classes = list(filter(lambda c: c["id_class"] in id_classes, classes))
-    classes = list(map(lambda c: {"id_class": c["id_class"], "name":c["name"]}, classes))
+    class_ = get_record(
+        'data/classes.json', 'id_class', id_class,
+        f"Invalid id class '{id_class}'"
+    )
+    loader = Loader()
 
     # Parsing class resourses
     for r in class_["resourses"]:
         r["url"] = str(r["url"])
 
     # get course and modules
-    course["modules"] = list(
-        map(
-            lambda m: {**m, **{"classes": list(
-                filter(
-                    lambda c: c["id_class"] in m["id_classes"],
-                    classes
-                )
-            )}},
-            course["modules"]
+    if wanted(fields, "course", "modules"):
+        classes = loader.load_many(
+            'data/classes.json', 'id_class', (c for m in course["modules"] for c in m["id_classes"])
         )
-    )
-    class_["course"] = course
-    del classes
-    class_["modules"] = course["modules"]
+        course["modules"] = list(
+            map(
+                lambda m: {**m, **{"classes": [
+                    {"id_class": c, "name": classes[c]["name"]}
+                    for c in m["id_classes"] if c in classes
+                ]}},
+                course["modules"]
+            )
+        )
+        class_["course"] = course
+        del classes
+        class_["modules"] = course["modules"]
     del course
 
-    # get comments and answers
-    all_comments = get_filename_json('data/comments.json')
-    comments = list(filter(lambda c: c['id_contribution'] in class_["id_comments"], all_comments))
-    users = get_filename_json('data/users.json')
-    
-    comments = list(
-        map(
-            lambda c: {
-                **c,
-                **{"user": list(
-                    filter(
-                        lambda u: u["id_user"] == c["id_user"],
-                        users
-                    )
-                )[0]},
-            },
-            comments,
-        )
-    )
-    comments = list(
-        map(
-            lambda c: {
-                **c,
-                **{"answers": list(
-                    filter(
-                        lambda a: a["id_contribution"] in c["id_answers"],
-                        all_comments
-                    )
-                )},
-            } if c['id_answers'] else c,
-            comments
-        )
+    # get comments with their users and answers
+    if wanted(fields, "comments", "comments_total", "comments_cursor"):
+        class_ = loader.join_comments([class_])[0]
+
+    return class_
+
+@classes_routes.get(
+    path="/{id_course}/{id_class}/comentarios",
+    response_model=List[ContributionAnswer],
+    status_code=status.HTTP_200_OK,
+    summary="get the comments of a class",
+    tags=["Classes"]
+)
+@offload
+def get_class_comments(id_course, id_class, page: CommentPage = Depends()):
+    """
+    This path operation return a page of the comments of a class
+
+    Parameters:
+        - id_course: str
+        - id_class: str
+        - limit: int, comments in the page
+        - cursor: str, cursor of the page
+        - order: str, recent or likes
+
+    Returns a list of comments with a ContributionAnswer structure:
+    """
+    # id_class mush be valid for id_course
+    course = get_record(
+        'data/courses.json', 'id_course', id_course,
+        f"Invalid id course '{id_course}'"
     )
-    comments = list(
-        map(
-            lambda c: {
-                **c,
-                **{"answers": list(
-                    map(
-                        lambda a: {**a, **{'user': list(
-                            filter(
-                                lambda u: u["id_user"] == a["id_user"],
-                                users
-                            )
-                        )[0]}},
-                        c["answers"]
-                    )
-                )},
-            } if c['id_answers'] else c,
-            comments,
-        )
+    validate_course_class(course, id_class)
+    del course
+
+    comments = get_comments(
+        'data/classes.json', 'id_class', id_class,
+        f"Invalid id class '{id_class}'", page
     )
-    del all_comments
-    class_["comments"] = comments
 
-    return class_
+    return comments
 
 @classes_routes.post(
     path="/",
@@ -200,47 +255,46 @@ def get_class(id_course, id_class):
     summary="create a class for a course",
     tags=["Classes"]
 )
+@offload
+@lock_files('data/classes.json')
 def post_classes(class_: ClassContentBasic = Body(...)):
     """
     This path operation create a new class
 
     Parameters:
         - class_: ClassContentBasic
-    
+
     Return the new class in a json with a ClassContentBasic structure
     """
-    class_ = class_.dict()
-    classes = get_filename_json('data/classes.json')
+    class_ = prepare_class(class_)
 
-    # id_class must be unique
-    validate_unique_key(
-        class_["id_class"], classes, 'id_class',
-        f"Invalid id class '{class_['id_class']}'"
-    )
+    # Save the class_
+    insert_record('data/classes.json', class_)
 
-    # name must be unique
-    validate_unique_key(
-        class_["name"], classes, 'name',
-        f"Invalid id class '{class_['name']}'"
-    )
+    return class_
 
-    # id_comments must not be in class_
-    if class_["id_comments"]:
-        raise HTTPException(
-            status_code=406,
-            detail=f"HTTP_406_NOT_ACCEPTABLE: Invalid key 'id_comments'"
-        )
+@classes_routes.post(
+    path="/_bulk",
+    response_model=List[BulkResult],
+    status_code=status.HTTP_207_MULTI_STATUS,
+    summary="create several classes",
+    tags=["Classes"]
+)
+@offload
+@lock_files('data/classes.json')
+def post_classes_bulk(classes: List[ClassContentBasic] = Body(...)):
+    """
+    This path operation create several classes in a single write,
+    each one is validated along with the classes before it
 
-    # Parsing class resourses
-    class_["video_url"] = str(class_["video_url"])
-    for r in class_["resourses"]:
-        r["url"] = str(r["url"])
-    
-    # Save the class_
-    classes.append(class_)    
-    write_filename_json('data/classes.json', classes)
+    Parameters:
+        - classes: List[ClassContentBasic]
 
-    return class_
+    Return the result of each class in a json with a BulkResult structure
+    """
+    results = insert_records('data/classes.json', classes, prepare_class, 'id_class')
+
+    return results
 
 @classes_routes.put(
     path="/{id_class}",
@@ -249,60 +303,59 @@ def post_classes(class_: ClassContentBasic = Body(...)):
     summary="update a class",
     tags=["Classes"]
 )
+@offload
+@lock_files('data/classes.json')
 def put_classes(id_class, class_: ClassContentBasic = Body(...)):
     """
     This path operation update a class
 
     Parameters:
         - class_: ClassContentBasic
-    
+
     Return the updated class in a json with a ClassContentBasic structure
     """
     class_ = class_.dict()
-    classes = get_filename_json('data/classes.json')
-    
+    classes = get_index('data/classes.json', 'id_class')
+
     # id_class must be valid
     validate_valid_key(
         id_class, classes, 'id_class',
         f"Invalid id class '{id_class}'"
     )
-    
-    classes = list(filter(lambda c: c["id_class"] != id_class, classes))
 
     # id_class must be unique
     validate_unique_key(
         class_["id_class"], classes, 'id_class',
-        f"Invalid id class '{class_['id_class']}'"
+        f"Invalid id class '{class_['id_class']}'",
+        current=classes[id_class]
     )
-    
+
     # name must be unique
     validate_unique_key(
-        class_["name"], classes, 'name',
-        f"Invalid id class '{class_['name']}'"
+        class_["name"], get_index('data/classes.json', 'name'), 'name',
+        f"Invalid id class '{class_['name']}'",
+        current=classes[id_class]
     )
 
     # Parsing id_comments
     for i in range(len(class_["id_comments"])):
         class_["id_comments"][i] = str(class_["id_comments"][i])
-    
+
     # id_comments must be valid
-    comments = get_filename_json('data/comments.json')
-    for c in class_["id_comments"]:
-        validate_valid_key(
-            c, comments, 'id_contribution',
-            f"Invalid id comment '{c}'"
-        )
-    del comments
+    comments = get_index('data/comments.json', 'id_contribution')
+    validate_valid_keys(
+        class_["id_comments"], comments, 'id_contribution',
+        "Invalid id comment"
+    )
 
     # Parsing class resourses
     class_["video_url"] = str(class_["video_url"])
     for r in class_["resourses"]:
         r["url"] = str(r["url"])
-    
+
     # Save the class_
-    classes.append(class_)
-    write_filename_json('data/classes.json', classes)
-    
+    update_record('data/classes.json', 'id_class', id_class, class_)
+
     return class_
 
 @classes_routes.delete(
@@ -312,25 +365,25 @@ def put_classes(id_class, class_: ClassContentBasic = Body(...)):
     summary="delete a class",
     tags=["Classes"]
 )
+@offload
+@lock_files('data/classes.json', 'data/courses.json')
 def delete_classes(id_class):
     """
     This path operation delete a class
 
     Parameters:
         - id_class: str
-    
+
     Return the deleted class in a json with a ClassContentBasic structure
     """
-    classes = get_filename_json('data/classes.json')
-
     # id_class must be valid
-    validate_valid_key(
-        id_class, classes, 'id_class',
+    class_ = get_record(
+        'data/classes.json', 'id_class', id_class,
         f"Invalid id class '{id_class}'"
     )
-        
-    # delete class from courses
-    courses = get_filename_json('data/courses.json')
+
+    # delete class from the courses that have it
+    courses = get_referrers('data/courses.json', 'modules.id_classes', id_class)
     courses = list(
         map(
             lambda c: {**c, **{"modules": list(
@@ -342,13 +395,11 @@ def delete_classes(id_class):
             courses
         )
     )
-    
-    write_filename_json('data/courses.json', courses)
-    del courses
 
-    # Save the class_
-    class_ = list(filter(lambda  c: c["id_class"] == id_class, classes))[0]
-    classes = list(filter(lambda  c: c["id_class"] != id_class, classes))
-    write_filename_json('data/classes.json', classes)
-    
+    # Save the courses and the class together
+    with transaction() as changes:
+        for course in courses:
+            changes.update('data/courses.json', 'id_course', course["id_course"], course)
+        changes.delete('data/classes.json', 'id_class', id_class)
+
     return class_
@@ -4,23 +4,91 @@ from typing import List
 
 # FastAPI
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import HTTPException
 from fastapi import Body
 from fastapi import Query
 from fastapi import status
 
 # Models
+from schemas.bulk import BulkResult
 from schemas.contributions import ContributionAnswer
 from schemas.contributions import ContributionBasic
 from schemas.enums import TypeContribution
 
 # Utils
-from utils.functions import get_filename_json
-from utils.functions import write_filename_json
+from utils.functions import get_index
+from utils.functions import get_record
+from utils.functions import get_comments
+from utils.functions import get_referrers
+from utils.functions import insert_record
+from utils.functions import insert_records
+from utils.functions import update_record
+from utils.functions import transaction
 from utils.functions import validate_valid_key
+from utils.functions import validate_valid_keys
 from utils.functions import validate_unique_key
+from utils.functions import lock_files
+from utils.loader import Loader
+from utils.routing import TrustedRoute
+from utils.pagination import Page
+from utils.pagination import CommentPage
+from utils.filters import ContributionFilter
+from utils.executor import offload
 
-comments_routes = APIRouter()
+comments_routes = APIRouter(route_class=TrustedRoute)
+
+
+def prepare_comment(comment, index=get_index):
+    """
+    parse a new comment and validate it with the indexes of index(path, key)
+    """
+    comment = comment.dict()
+    comments = index('data/comments.json', 'id_contribution')
+
+    # Parsing
+    comment["id_contribution"] = str(comment["id_contribution"])
+    comment["id_user"] = str(comment["id_user"])
+    comment["date_publication"] = str(comment["date_publication"])
+    comment['kind'] = comment['kind'].value
+
+    # id_contribution must be unique
+    validate_unique_key(
+        comment["id_contribution"], comments, 'id_contribution',
+        f"Invalid id contribution '{comment['id_contribution']}'"
+    )
+
+    # id_user must be valid
+    users = index('data/users.json', 'id_user')
+    validate_valid_key(
+        comment["id_user"], users, 'id_user',
+        f"Invalid id user '{comment['id_user']}'"
+    )
+    del users
+
+    # kind must be valid
+    if comment['kind'] not in ["comment", "question"]:
+        raise HTTPException(
+            status_code=406,
+            detail=f"HTTP_406_NOT_ACCEPTABLE: Invalid comment kind '{comment['kind']}'"
+        )
+
+    # id_answers must be empty
+    if 'id_answers' in comment and comment['id_answers']:
+        raise HTTPException(
+            status_code=406,
+            detail=f"HTTP_406_NOT_ACCEPTABLE: Invalid id answers, must be empty"
+        )
+
+    return comment
+
+
+def join_comments(comments):
+    """
+    get the comments with their user and the thread of their answers
+    """
+    all_comments = Loader().load_comments(c["id_contribution"] for c in comments)
+    return [all_comments[c["id_contribution"]] for c in comments]
 
 
 # Comments
@@ -31,44 +99,28 @@ comments_routes = APIRouter()
     summary="get all comments",
     tags=["Comments"]
 )
-def all_comments():
+@offload
+def all_comments(page: Page = Depends(), filters: ContributionFilter = Depends()):
     """
-    This path operation returns all comments
+    This path operation returns a page of comments
 
     Parameters:
+        - limit: int, records in the page
+        - cursor: str, cursor of the page
+        - id_user, kind, date_from, date_to, min_likes: the filters
+        - sort, descending: the order
+        - stream: bool, all the comments from the cursor in NDJSON
 
     Returns a list of comments with a ContributionAnswer structure:
     """
-    comments = get_filename_json('data/comments.json')
-    users = get_filename_json('data/users.json')
-    comments = list(
-        map(
-            lambda c: {**c, **{"user": list(
-                filter(
-                    lambda u: u["id_user"] == c["id_user"],
-                    users
-                )
-            )[0]}},
-            comments
-        )
-    )
-    del users
+    if page.stream:
+        return page.stream_records('data/comments.json', join_comments, **filters.query())
+
+    comments = page.records('data/comments.json', **filters.query())
+
+    # get the user and the answers for all comments
+    comments = join_comments(comments)
 
-    comments = list(
-        map(
-            lambda c: {
-                **c,
-                **{"answers": list(
-                    filter(
-                        lambda a: a["id_contribution"] in c["id_answers"],
-                        comments
-                    )
-                )}
-            } if c["id_answers"] else c,
-            comments
-        )
-    )
-    
     return comments
 
 @comments_routes.get(
@@ -78,55 +130,54 @@ def all_comments():
     summary="get a comment",
     tags=["Comments"]
 )
+@offload
 def get_comment(id_comment):
     """
     This path operation return the complete information for a comment
 
     Parameters:
         - id_comment: str
-    
+
     Returns a comment with with a ContributionAnswer structure:
     """
-    comments = get_filename_json('data/comments.json')
-
     # id_comment must be valid
     validate_valid_key(
-        id_comment, comments, 'id_contribution',
+        id_comment, get_index('data/comments.json', 'id_contribution'), 'id_contribution',
         f"Invalid id comment '{id_comment}'"
     )
-    
-    # get comment
-    comment = list(filter(lambda c: c["id_contribution"]==id_comment, comments))[0]
-
-    # get user for comment
-    users = get_filename_json('data/users.json')
-    comment["user"] = list(filter(lambda u: u["id_user"] == comment["id_user"], users))[0]
-    
-    # get answers
-    if comment["id_answers"]:
-        comment["answers"] = list(
-            filter(
-                lambda a: a["id_contribution"] in comment["id_answers"],
-                comments
-            )
-        )
-        del comments
-    
-        ## get users for answers
-        comment["answers"] = list(
-            map(
-                lambda a: {**a, **{"user": list(
-                    filter(
-                        lambda u: u["id_user"] == a["id_user"],
-                        users
-                    )
-                )[0]}},
-                comment["answers"]
-            )
-        )
-    
+
+    # get user and answers for comment
+    comment = Loader().load_comments([id_comment])[id_comment]
+
     return comment
 
+@comments_routes.get(
+    path="/{id_comment}/respuestas",
+    response_model=List[ContributionAnswer],
+    status_code=status.HTTP_200_OK,
+    summary="get the answers of a comment",
+    tags=["Comments"]
+)
+@offload
+def get_comment_answers(id_comment, page: CommentPage = Depends()):
+    """
+    This path operation return a page of the answers of a comment
+
+    Parameters:
+        - id_comment: str
+        - limit: int, answers in the page
+        - cursor: str, cursor of the page
+        - order: str, recent or likes
+
+    Returns a list of answers with a ContributionAnswer structure:
+    """
+    answers = get_comments(
+        'data/comments.json', 'id_contribution', id_comment,
+        f"Invalid id comment '{id_comment}'", page, field="id_answers"
+    )
+
+    return answers
+
 @comments_routes.get(
     path="/{id_comment}/basic",
     response_model=ContributionBasic,
@@ -134,6 +185,7 @@ def get_comment(id_comment):
     summary="get a comment",
     tags=["Comments"]
 )
+@offload
 def get_comment_basic(id_comment):
     """
     This path operation return the basic description for a comment
@@ -143,17 +195,12 @@ def get_comment_basic(id_comment):
 
     Returns a comment with with a ContributionAnswer structure:
     """
-    comments = get_filename_json('data/comments.json')
-
     # id_comment must be valid
-    validate_valid_key(
-        id_comment, comments, 'id_contribution',
+    comment = get_record(
+        'data/comments.json', 'id_contribution', id_comment,
         f"Invalid id comment '{id_comment}'"
     )
 
-    # get comment
-    comment = list(filter(lambda c: c["id_contribution"]==id_comment, comments))[0]
-
     return comment
 
 @comments_routes.post(
@@ -163,6 +210,7 @@ def get_comment_basic(id_comment):
     summary="create a comment",
     tags=["Comments"]
 )
+@offload
 def post_comment(comment: ContributionBasic = Body(...)):
     """
     This path operation create a new comment
@@ -172,48 +220,37 @@ def post_comment(comment: ContributionBasic = Body(...)):
 
     Return the new comment in a json with a ContributionBasic structure
     """
-    comment = comment.dict()
-    comments = get_filename_json('data/comments.json')
+    comment = prepare_comment(comment)
 
-    # Parsing
-    comment["id_contribution"] = str(comment["id_contribution"])
-    comment["id_user"] = str(comment["id_user"])
-    comment["date_publication"] = str(comment["date_publication"])
-    comment['kind'] = comment['kind'].value
+    # Save comments, id_contribution is checked again along with the other writes
+    insert_record('data/comments.json', comment, unique={
+        'id_contribution': f"Invalid id contribution '{comment['id_contribution']}'"
+    })
 
-    # id_contribution must be unique
-    validate_unique_key(
-        comment["id_contribution"], comments, 'id_contribution',
-        f"Invalid id contribution '{comment['id_contribution']}'"
-    )
-    
-    # id_user must be valid
-    users = get_filename_json('data/users.json')
-    validate_valid_key(
-        comment["id_user"], users, 'id_user',
-        f"Invalid id user '{comment['id_user']}'"
-    )
-    del users
+    return comment
 
-    # kind must be valid
-    if comment['kind'] not in ["comment", "question"]:
-        raise HTTPException(
-            status_code=406,
-            detail=f"HTTP_406_NOT_ACCEPTABLE: Invalid comment kind '{comment['kind']}'"
-        )
+@comments_routes.post(
+    path="/_bulk",
+    response_model=List[BulkResult],
+    status_code=status.HTTP_207_MULTI_STATUS,
+    summary="create several comments",
+    tags=["Comments"]
+)
+@offload
+@lock_files('data/comments.json')
+def post_comment_bulk(comments: List[ContributionBasic] = Body(...)):
+    """
+    This path operation create several comments in a single write,
+    each one is validated along with the comments before it
 
-    # id_answers must be empty
-    if 'id_answers' in comment and comment['id_answers']:
-        raise HTTPException(
-            status_code=406,
-            detail=f"HTTP_406_NOT_ACCEPTABLE: Invalid id answers, must be empty"
-        )
+    Parameters:
+        - comments: List[ContributionBasic]
 
-    # Save comments
-    comments.append(comment)
-    write_filename_json('data/comments.json', comments)
-    
-    return comment
+    Return the result of each comment in a json with a BulkResult structure
+    """
+    results = insert_records('data/comments.json', comments, prepare_comment, 'id_contribution')
+
+    return results
 
 @comments_routes.put(
     path="/{id_comment}",
@@ -222,6 +259,8 @@ def post_comment(comment: ContributionBasic = Body(...)):
     summary="update a comment",
     tags=["Comments"]
 )
+@offload
+@lock_files('data/comments.json')
 def put_comment(id_comment, comment: ContributionBasic = Body(...)):
     """
     This path operation update a new comment
@@ -232,37 +271,37 @@ def put_comment(id_comment, comment: ContributionBasic = Body(...)):
 
     Return the updated comment in a json with a ContributionBasic structure
     """
-    comments = get_filename_json('data/comments.json')
-    
+    comments = get_index('data/comments.json', 'id_contribution')
+
     # id_contribution must be valid
     validate_valid_key(
         id_comment, comments , 'id_contribution',
         f"Invalid id contribution '{id_comment}'"
     )
 
-    comments = list(filter(lambda c: c["id_contribution"] != id_comment, comments))
     comment = comment.dict()
     # Parsing
     comment["id_contribution"] = str(comment["id_contribution"])
     comment["id_user"] = str(comment["id_user"])
     comment["date_publication"] = str(comment["date_publication"])
     comment['kind'] = comment['kind'].value
+    comment['id_answers'] = [str(a) for a in comment['id_answers']]
 
     # id_contribution must be unique
     validate_unique_key(
         comment["id_contribution"], comments, 'id_contribution',
-        f"Invalid id contribution '{comment['id_contribution']}'"
+        f"Invalid id contribution '{comment['id_contribution']}'",
+        current=comments[id_comment]
     )
 
     # id_answers must be valid
-    for a in comment['id_answers']:
-        validate_valid_key(
-            a, comments, 'id_contribution',
-            f"Invalid id answers '{a}'"
-        )
+    validate_valid_keys(
+        comment['id_answers'], comments, 'id_contribution',
+        "Invalid id answers"
+    )
 
     # id_user must be valid
-    users = get_filename_json('data/users.json')
+    users = get_index('data/users.json', 'id_user')
     validate_valid_key(
         comment["id_user"], users, 'id_user',
         f"Invalid id user '{comment['id_user']}'"
@@ -277,9 +316,8 @@ def put_comment(id_comment, comment: ContributionBasic = Body(...)):
         )
 
     # Save comments
-    comments.append(comment)
-    write_filename_json('data/comments.json', comments)
-    
+    update_record('data/comments.json', 'id_contribution', id_comment, comment)
+
     return comment
 
 @comments_routes.delete(
@@ -289,6 +327,8 @@ def put_comment(id_comment, comment: ContributionBasic = Body(...)):
     summary="delete a comment",
     tags=["Comments"]
 )
+@offload
+@lock_files('data/comments.json', 'data/blogs.json', 'data/forums.json', 'data/tutorials.json')
 def delete_comment(id_comment, kind: Optional[TypeContribution] = Query(default="comment")):
     """
     This path operation delete a comment
@@ -298,48 +338,29 @@ def delete_comment(id_comment, kind: Optional[TypeContribution] = Query(default=
 
     Return the deleted comment in a json with a ContributionBasic structure
     """
-    comments = get_filename_json('data/comments.json')
-
     # id_comment must be valid
-    validate_valid_key(
-        id_comment, comments, 'id_contribution',
+    comment = get_record(
+        'data/comments.json', 'id_contribution', id_comment,
         f"Invalid id comment '{id_comment}'"
     )
 
-    comment = list(filter(lambda  c: c["id_contribution"] == id_comment, comments))[0]
-    comments = list(filter(lambda  c: c["id_contribution"] != id_comment, comments))
-    kind = kind.value
-
-    # delete comment from all files
-    if kind in ["tutorial", "blog", "forum"]:
-        contributions = get_filename_json(f'data/{kind}s.json')
-
-        contributions = list(
-            map(
-                lambda c: {
-                    **c,
-                    **{"id_comments": [v for v in c["id_comments"] if v != id_comment]}
-                } if c["id_comments"] else c,
-                contributions
-            )
-        )
+    kind = TypeContribution(kind).value
 
-        write_filename_json(f'data/{kind}s.json', contributions)
-
-    elif kind == "answers":
-        comments = list(
-            map(
-                lambda c: {
-                    **c,
-                    **{"id_answers": [v for v in c["id_answers"] if v != id_comment]}
-                } if "id_answers" in c and c["id_answers"] else c,
-                comments
-            )
-        )
-    
-    comments = list(filter(lambda c: c["id_contribution"] != id_comment, comments))
+    # delete comment from the records that have it, they are saved together
+    with transaction() as changes:
+        if kind in ["tutorial", "blog", "forum"]:
+            contributions = get_referrers(f'data/{kind}s.json', 'id_comments', id_comment)
+            for c in contributions:
+                c = {**c, **{"id_comments": [v for v in c["id_comments"] if v != id_comment]}}
+                changes.update(f'data/{kind}s.json', 'id_contribution', c["id_contribution"], c)
+
+        elif kind == "answers":
+            comments = get_referrers('data/comments.json', 'id_answers', id_comment)
+            for c in comments:
+                c = {**c, **{"id_answers": [v for v in c["id_answers"] if v != id_comment]}}
+                changes.update('data/comments.json', 'id_contribution', c["id_contribution"], c)
 
-    # Save the comment
-    write_filename_json('data/comments.json', comments)
+        # Save the comment
+        changes.delete('data/comments.json', 'id_contribution', id_comment)
 
     return comment
@@ -1,25 +1,177 @@
 # Python
 from typing import List
+from typing import Optional
 import functools
 
 # FastAPI
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import Body
+from fastapi import Query
 from fastapi import status
 
 # Models
 from schemas.bases import BaseCourse
+from schemas.bulk import BulkResult
+from schemas.contributions import ContributionAnswer
 from schemas.courses import CourseInfo
 from schemas.courses import CourseInfoBasic
 from schemas.courses import CourseInfoComplete
 
 # Utils
-from utils.functions import get_filename_json
-from utils.functions import write_filename_json
+from utils.functions import get_fields
+from utils.functions import wanted
+from utils.functions import get_index
+from utils.functions import get_record
+from utils.functions import get_comments
+from utils.functions import insert_record
+from utils.functions import insert_records
+from utils.functions import update_record
+from utils.functions import delete_record
 from utils.functions import validate_unique_key
 from utils.functions import validate_valid_key
+from utils.functions import validate_valid_keys
+from utils.functions import lock_files
+from utils import config
+from utils.routing import TrustedRoute
+from utils.pagination import Page
+from utils.pagination import CommentPage
+from utils.loader import Loader
+from utils.views import Views
+from utils.executor import offload
 
-courses_routes = APIRouter()
+courses_routes = APIRouter(route_class=TrustedRoute)
+
+
+def build_course(id_course, loader, fields=None):
+    """
+    build the description of a course, only the fields that are given
+    or all of them. The records of the loader are shared so they must not be mutated
+    """
+    # id_course must be valid
+    course = loader.load(
+        'data/courses.json', 'id_course', id_course,
+        f"Invalid id course '{id_course}'"
+    )
+    course = {**course}
+
+    # get the teacher information
+    if wanted(fields, "teacher"):
+        teachers = loader.load_many('data/teachers.json', 'id_teacher', [course["id_teacher"]])
+        course["teacher"] = teachers[course["id_teacher"]]
+
+    # get the routes information
+    if wanted(fields, "routes"):
+        course["routes"] = loader.load_list('data/routes.json', 'id_route', course["id_routes"])
+
+    # get the class information
+    if wanted(fields, "modules"):
+        classes = loader.load_many(
+            'data/classes.json', 'id_class', (c for m in course["modules"] for c in m["id_classes"])
+        )
+        course["modules"] = [
+            {**m, **{"classes": [classes[c] for c in m["id_classes"] if c in classes]}}
+            for m in course["modules"]
+        ]
+
+    # get the project information
+    if wanted(fields, "project"):
+        projects = loader.load_many('data/projects.json', 'id_project', [course["id_project"]])
+        course['project'] = projects[course['id_project']]
+
+    # get the tutorials information with their users
+    if wanted(fields, "tutorials"):
+        tutorials = loader.load_list('data/tutorials.json', 'id_contribution', course["id_tutorials"])
+        course["tutorials"] = loader.join_users(tutorials)
+
+    # get the most recent comments information with their users
+    if wanted(fields, "comments", "comments_total", "comments_cursor"):
+        ids, course["comments_total"], course["comments_cursor"] = loader.page_comments(
+            course["id_comments"], limit=config.EMBEDDED_COMMENTS
+        )
+        comments = loader.load_list('data/comments.json', 'id_contribution', ids)
+        course["comments"] = loader.join_users(comments)
+
+    return course
+
+
+def get_course_fields(id_course, fields):
+    """
+    get the description of a course with some fields or with all of them.
+    A kept course has every field, else only the given fields are built
+    """
+    course = course_views.cached(id_course)
+    if course is None:
+        if fields is None:
+            course = course_views.get(id_course)
+        else:
+            course = build_course(id_course, Loader(), fields)
+
+    return course
+
+
+course_views = Views(build_course)
+
+
+def prepare_course(course, index=get_index):
+    """
+    parse a new course and validate it with the indexes of index(path, key)
+    """
+    course = course.dict()
+    
+    # id_course must be unique
+    validate_unique_key(
+        course["id_course"], index('data/courses.json', 'id_course'), 'id_course',
+        f"Invalid id course '{course['id_course']}'"
+    )
+
+    # name must be unique
+    validate_unique_key(
+        course["name"], index('data/courses.json', 'name'), 'name',
+        f"Invalid name course '{course['name']}'"
+    )
+
+    # the id in the key must be valid
+    keys = ["id_teacher", "id_project"]
+    for key in keys:
+        temp_file = index(f'data/{key.split("_")[1]}s.json', key)
+
+        validate_valid_key(
+            course[key], temp_file, key,
+            f"Invalid id {key.split('_')[1]} '{course[key]}'"
+        )
+    
+    # Parsing course
+    course["image_url"] = str(course["image_url"])
+    for key in ["id_tutorials", "id_comments"]:
+        course[key] = [str(v) for v in course[key]]
+
+    # the ids for the opcional keys must be valid if exist
+    optionals = {
+        "id_routes": "id_route",
+        "id_tutorials": "id_contribution",
+        "id_comments": "id_contribution"
+    }
+    for key, id_file in optionals.items():
+        if key in course:
+            temp_file = index(f'data/{key.split("_")[1]}.json', id_file)
+            
+            validate_valid_keys(
+                course[key], temp_file, id_file,
+                f"Invalid id {key.split('_')[1][:-1]}"
+            )
+    
+    # the id_classes must be valid
+    classes = index('data/classes.json', 'id_class')
+    id_classes = list(map(lambda m: m["id_classes"], course["modules"]))
+    id_classes = functools.reduce(lambda a,b: a + b, id_classes, [])
+
+    validate_valid_keys(
+        id_classes, classes, 'id_class',
+        "Invalid id class"
+    )
+
+    return course
 
 
 # Courses
@@ -30,15 +182,22 @@ courses_routes = APIRouter()
     summary="get all courses",
     tags=["Courses"]
 )
-def courses():
+@offload
+def courses(page: Page = Depends()):
     """
-    This path operation returns all courses
+    This path operation returns a page of courses
 
     Parameters:
+        - limit: int, records in the page
+        - cursor: str, cursor of the page
+        - stream: bool, all the courses from the cursor in NDJSON
 
     Returns a list of routes with a BaseCourse structure:
     """
-    courses = get_filename_json('data/courses.json')
+    if page.stream:
+        return page.stream_records('data/courses.json')
+
+    courses = page.records('data/courses.json')
     
     return courses
 
@@ -49,76 +208,53 @@ def courses():
     summary="get a basic description of a course",
     tags=["Courses"]
 )
-def class_course(id_course):
+@offload
+def class_course(
+    id_course,
+    fields: Optional[str] = Query(default=None, description="comma separated fields of the course")
+):
     """
     This path operation return the description for a route
 
     Parameters:
         - id_course: str
+        - fields: str, the fields of the course, all of them by default
     
     Returns a course with with a CourseInfo structure:
     """
-    courses = get_filename_json('data/courses.json')
+    fields = get_fields(fields, CourseInfo)
 
-    # id_course must be valid
-    validate_valid_key(
-        id_course, courses, 'id_course',
-        f"Invalid id course '{id_course}'"
-    )
-
-    course = list(filter(lambda c: c["id_course"] == id_course, courses))[0]
-    del courses
+    # the course is built once and kept until a record of it changes
+    course = get_course_fields(id_course, fields)
 
-    # get the teacher information
-    teachers = get_filename_json('data/teachers.json')
-    teacher = list(filter(lambda t: t["id_teacher"] == course["id_teacher"], teachers))[0]
-    del teachers
-    course["teacher"] = teacher
-    del teacher
-
-    # get the routes information
-    routes = get_filename_json('data/routes.json')
-    routes = list(filter(lambda r: r["id_route"] in course["id_routes"], routes))
-    course["routes"] = routes
-    del routes
+    return course
 
-    # get the class information
-    all_classes = get_filename_json('data/classes.json')
-    for m in course["modules"]:
-        classes = list(filter(lambda c: c["id_class"] in m["id_classes"], all_classes))
-        m["classes"] = classes
-    del all_classes
+@courses_routes.get(
+    path="/{id_course}/comentarios",
+    response_model=List[ContributionAnswer],
+    status_code=status.HTTP_200_OK,
+    summary="get the comments of a course",
+    tags=["Courses"]
+)
+@offload
+def course_comments(id_course, page: CommentPage = Depends()):
+    """
+    This path operation return a page of the comments of a course
 
-    # get the project information
-    projects = get_filename_json('data/projects.json')
-    project = list(filter(lambda p: p['id_project']==course['id_project'], projects))[0]
-    del projects
-    course['project'] = project
-    del project
-
-    # get the tutorials information
-    tutorials = get_filename_json('data/tutorials.json')
-    tutorials = list(filter(lambda t: t["id_contribution"] in course["id_tutorials"], tutorials))
-
-    ## get the user information for the tutorials
-    users = get_filename_json('data/users.json')
-    for t in tutorials:
-        t["user"] = list(filter(lambda u: u["id_user"] == t["id_user"], users))[0]
-    
-    course["tutorials"] = tutorials
-    del tutorials
+    Parameters:
+        - id_course: str
+        - limit: int, comments in the page
+        - cursor: str, cursor of the page
+        - order: str, recent or likes
 
-    # get the comments information
-    comments = get_filename_json('data/comments.json')
-    comments = list(filter(lambda c: c["id_contribution"] in course["id_comments"], comments))
-    
-    ## get the user information for the comments
-    for c in comments:
-        c["user"] = list(filter(lambda u: u["id_user"] == c["id_user"], users))[0]
-    del users
-    course["comments"] = comments
+    Returns a list of comments with a ContributionAnswer structure:
+    """
+    comments = get_comments(
+        'data/courses.json', 'id_course', id_course,
+        f"Invalid id course '{id_course}'", page
+    )
 
-    return course
+    return comments
 
 @courses_routes.get(
     path="/{id_course}/basic",
@@ -127,6 +263,7 @@ def class_course(id_course):
     summary="get a basic description of a course",
     tags=["Courses"]
 )
+@offload
 def class_course_basic(id_course):
     """
     This path operation return the basic description for a route
@@ -136,14 +273,11 @@ def class_course_basic(id_course):
     
     Returns a route with with a CourseInfoBasic structure:
     """
-    courses = get_filename_json('data/courses.json')
-
     # id_course must be valid
-    validate_valid_key(
-        id_course, courses, 'id_course',
+    course = get_record(
+        'data/courses.json', 'id_course', id_course,
         f"Invalid id course '{id_course}'"
     )
-    course = list(filter(lambda c: c["id_course"] == id_course, courses))[0]
 
     return course
 
@@ -154,73 +288,24 @@ def class_course_basic(id_course):
     summary="get a complete description of a course",
     tags=["Courses"]
 )
-def get_course(id_course):
+@offload
+def get_course(
+    id_course,
+    fields: Optional[str] = Query(default=None, description="comma separated fields of the course")
+):
     """
     This path operation return the complete description for a route
 
     Parameters:
         - id_route: str
+        - fields: str, the fields of the course, all of them by default
     
     Returns a route with with a CourseInfoComplete structure:
     """
-    courses = get_filename_json('data/courses.json')
-
-    # id_course must be valid
-    validate_valid_key(
-        id_course, courses, 'id_course',
-        f"Invalid id course '{id_course}'"
-    )
-
-    course = list(filter(lambda c: c["id_course"] == id_course, courses))[0]
-    del courses
-
-    # get the teacher information
-    teachers = get_filename_json('data/teachers.json')
-    teacher = list(filter(lambda t: t["id_teacher"] == course["id_teacher"], teachers))[0]
-    del teachers
-    course["teacher"] = teacher
-    del teacher
+    fields = get_fields(fields, CourseInfoComplete)
 
-    # get the routes information
-    routes = get_filename_json('data/routes.json')
-    routes = list(filter(lambda r: r["id_route"] in course["id_routes"], routes))
-    course["routes"] = routes
-    del routes
-
-    # get the class information
-    all_classes = get_filename_json('data/classes.json')
-    for m in course["modules"]:
-        classes = list(filter(lambda c: c["id_class"] in m["id_classes"], all_classes))
-        m["classes"] = classes
-    del all_classes
-
-    # get the project information
-    projects = get_filename_json('data/projects.json')
-    project = list(filter(lambda p: p['id_project']==course['id_project'], projects))[0]
-    del projects
-    course['project'] = project
-    del project
-
-    # get the tutorials information
-    tutorials = get_filename_json('data/tutorials.json')
-    tutorials = list(filter(lambda t: t["id_contribution"] in course["id_tutorials"], tutorials))
-
-    ## get the user information for the tutorials
-    users = get_filename_json('data/users.json')
-    for t in tutorials:
-        t["user"] = list(filter(lambda u: u["id_user"] == t["id_user"], users))[0]
-    course["tutorials"] = tutorials
-    del tutorials
-
-    # get the comments information
-    comments = get_filename_json('data/comments.json')
-    comments = list(filter(lambda c: c["id_contribution"] in course["id_comments"], comments))
-    
-    ## get the user information for the comments
-    for c in comments:
-        c["user"] = list(filter(lambda u: u["id_user"] == c["id_user"], users))[0]
-    del users
-    course["comments"] = comments
+    # the course is built once and kept until a record of it changes
+    course = get_course_fields(id_course, fields)
 
     return course
 
@@ -231,6 +316,8 @@ def get_course(id_course):
     summary="create a course",
     tags=["Courses"]
 )
+@offload
+@lock_files('data/courses.json')
 def post_course(course: CourseInfoBasic =  Body(...)):
     """
     This path operation create a new course
@@ -240,68 +327,35 @@ def post_course(course: CourseInfoBasic =  Body(...)):
     
     Return the new course in a json with a CourseInfoBasic structure
     """
-    course = course.dict()
-    courses = get_filename_json('data/courses.json')
-    
-    # id_course must be unique
-    validate_valid_key(
-        course["id_course"], courses, 'id_course',
-        f"Invalid id course '{course['id_course']}'"
-    )
-
-    # name must be unique
-    validate_valid_key(
-        course["id_course"], courses, 'id_course',
-        f"Invalid id course '{course['id_course']}'"
-    )
+    course = prepare_course(course)
 
-    # the id in the key must be valid
-    keys = ["id_teacher", "id_project"]
-    for key in keys:
-        temp_file = get_filename_json(f'data/{key.split("_")[1]}s.json')
-
-        validate_valid_key(
-            course[key], temp_file, key,
-            f"Invalid id {key.split('_')[1]} '{course[key]}'"
-        )
+    # Save the course
+    insert_record('data/courses.json', course)
     
-    # Parsing course
-    course["image_url"] = str(course["image_url"])
-    for key in ["id_tutorials", "id_comments"]:
-        course[key] = [str(v) for v in course[key]]
+    return course
 
-    # the ids for the opcional keys must be valid if exist
-    optionals = {
-        "id_routes": "id_route",
-        "id_tutorials": "id_contribution",
-        "id_comments": "id_contribution"
-    }
-    for key, id_file in optionals.items():
-        if key in course:
-            temp_file = get_filename_json(f'data/{key.split("_")[1]}.json')
-            
-            for t in course[key]:
-                validate_valid_key(
-                    t, temp_file, id_file,
-                    f"Invalid id {key.split('_')[1][:-1]} '{t}'"
-                )
-    
-    # the id_classes must be valid
-    classes = get_filename_json('data/classes.json')
-    id_classes = list(map(lambda m: m["id_classes"], course["modules"]))
-    id_classes = functools.reduce(lambda a,b: a + b, id_classes)
+@courses_routes.post(
+    path="/_bulk",
+    response_model=List[BulkResult],
+    status_code=status.HTTP_207_MULTI_STATUS,
+    summary="create several courses",
+    tags=["Courses"]
+)
+@offload
+@lock_files('data/courses.json')
+def post_course_bulk(courses: List[CourseInfoBasic] = Body(...)):
+    """
+    This path operation create several courses in a single write,
+    each one is validated along with the courses before it
 
-    for c in id_classes:
-        validate_valid_key(
-            c, classes, 'id_class',
-            f"Invalid id course '{c}'"
-        )
+    Parameters:
+        - courses: List[CourseInfoBasic]
 
-    # Save the course
-    courses.append(course)
-    write_filename_json('data/courses.json', courses)
-    
-    return course
+    Return the result of each course in a json with a BulkResult structure
+    """
+    results = insert_records('data/courses.json', courses, prepare_course, 'id_course')
+
+    return results
 
 @courses_routes.put(
     path="/{id_course}",
@@ -310,6 +364,8 @@ def post_course(course: CourseInfoBasic =  Body(...)):
     summary="update a course",
     tags=["Courses"]
 )
+@offload
+@lock_files('data/courses.json')
 def put_course(id_course, course: CourseInfoBasic = Body(...)):
     """
     This path operation update a course
@@ -320,7 +376,7 @@ def put_course(id_course, course: CourseInfoBasic = Body(...)):
     Return the new course in a json with a CourseInfoBasic structure
     """
     course = course.dict()
-    courses = get_filename_json('data/courses.json')
+    courses = get_index('data/courses.json', 'id_course')
     
     # id_course must be valid
     validate_valid_key(
@@ -329,17 +385,16 @@ def put_course(id_course, course: CourseInfoBasic = Body(...)):
     )
     
     # name must be unique
-    temp_courses = list(filter(lambda c: c["id_course"] != id_course, courses))
     validate_unique_key(
-        course["name"], temp_courses, 'name',
-        f"Invalid name course '{course['name']}'"
+        course["name"], get_index('data/courses.json', 'name'), 'name',
+        f"Invalid name course '{course['name']}'",
+        current=courses[id_course]
     )
-    del temp_courses    
 
     # the id in the key must be valid
     keys = ["id_teacher", "id_project"]
     for key in keys:
-        temp_file = get_filename_json(f'data/{key.split("_")[1]}s.json')
+        temp_file = get_index(f'data/{key.split("_")[1]}s.json', key)
         
         validate_valid_key(
             course[key], temp_file, key,
@@ -359,29 +414,25 @@ def put_course(id_course, course: CourseInfoBasic = Body(...)):
     }
     for key, id_file in optionals.items():
         if key in course:
-            temp_file = get_filename_json(f'data/{key.split("_")[1]}.json')
+            temp_file = get_index(f'data/{key.split("_")[1]}.json', id_file)
             
-            for t in course[key]:
-                validate_valid_key(
-                    t, temp_file, id_file,
-                    f"Invalid id {key.split('_')[1][:-1]} '{t}'"
-                )
+            validate_valid_keys(
+                course[key], temp_file, id_file,
+                f"Invalid id {key.split('_')[1][:-1]}"
+            )
     
     # the id_classes must be valid
-    classes = get_filename_json('data/classes.json')
+    classes = get_index('data/classes.json', 'id_class')
     id_classes = list(map(lambda m: m["id_classes"], course["modules"]))
-    id_classes = functools.reduce(lambda a,b: a + b, id_classes)
+    id_classes = functools.reduce(lambda a,b: a + b, id_classes, [])
 
-    for c in id_classes:
-        validate_valid_key(
-            c, classes, 'id_class',
-            f"Invalid id course '{c}'"
-        )
+    validate_valid_keys(
+        id_classes, classes, 'id_class',
+        "Invalid id class"
+    )
 
     # Save the course
-    courses = list(filter(lambda c: c["id_course"] != id_course, courses))
-    courses.append(course)
-    write_filename_json('data/courses.json', courses)
+    update_record('data/courses.json', 'id_course', id_course, course)
     
     return course
 
@@ -392,6 +443,8 @@ def put_course(id_course, course: CourseInfoBasic = Body(...)):
     summary="delete a course",
     tags=["Courses"]
 )
+@offload
+@lock_files('data/courses.json')
 def delete_course(id_course):
     """
     This path operation delete a new course
@@ -401,7 +454,7 @@ def delete_course(id_course):
     
     Return the deleted course in a json with a CourseInfoBasic structure
     """
-    courses = get_filename_json('data/courses.json')
+    courses = get_index('data/courses.json', 'id_course')
     
     # id_course must be valid
     validate_valid_key(
@@ -410,8 +463,6 @@ def delete_course(id_course):
     )
     
     # Save the course
-    course = list(filter(lambda c: c["id_course"] == id_course, courses))[0]
-    courses = list(filter(lambda c: c["id_course"] != id_course, courses))
-    write_filename_json('data/courses.json', courses)
+    course = delete_record('data/courses.json', 'id_course', id_course)
     
     return course
@@ -1,9 +1,12 @@
 # Python
 from typing import List
+from typing import Optional
 
 # FastAPI
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import Body
+from fastapi import Query
 from fastapi import status
 
 # Models
@@ -13,13 +16,21 @@ from schemas.contributions import ContributionTitleBasic
 
 # Utils
 from utils.functions import get_all_contributions
+from utils.functions import get_fields
 from utils.functions import get_contribution
+from utils.functions import get_contribution_comments
 from utils.functions import get_contribution_basic
 from utils.functions import post_contribution
 from utils.functions import put_contribution
 from utils.functions import delete_contribution
+from utils.functions import lock_files
+from utils.routing import TrustedRoute
+from utils.pagination import Page
+from utils.pagination import CommentPage
+from utils.filters import ContributionFilter
+from utils.executor import offload
 
-forums_routes = APIRouter()
+forums_routes = APIRouter(route_class=TrustedRoute)
 
 
 # Forum
@@ -30,15 +41,21 @@ forums_routes = APIRouter()
     summary="get all forums",
     tags=["Forums"]
 )
-def all_forums():
+@offload
+def all_forums(page: Page = Depends(), filters: ContributionFilter = Depends()):
     """
-    This path operation returns all forums
+    This path operation returns a page of forums
 
     Parameters:
+        - limit: int, records in the page
+        - cursor: str, cursor of the page
+        - id_user, kind, date_from, date_to, min_likes: the filters
+        - sort, descending: the order
+        - stream: bool, all the forums from the cursor in NDJSON
 
     Returns a list of forums with a ContributionTitle structure:
     """
-    forums = get_all_contributions('forums')
+    forums = get_all_contributions('forums', page, filters)
 
     return forums
 
@@ -49,18 +66,49 @@ def all_forums():
     summary="get a forum publication",
     tags=["Forums"]
 )
-def get_forum(id_forum):
+@offload
+def get_forum(
+    id_forum,
+    fields: Optional[str] = Query(default=None, description="comma separated fields of the forum")
+):
     """
     This path operation returns a forum
 
     Parameters:
+        - id_forum: str
+        - fields: str, the fields of the forum, all of them by default
 
     Returns a forum with a ContributionTitle structure:
     """
-    forum = get_contribution('forums', id_forum)
+    fields = get_fields(fields, ContributionTitle)
+    forum = get_contribution('forums', id_forum, fields)
     
     return forum
 
+@forums_routes.get(
+    path="/{id_forum}/comentarios",
+    response_model=List[ContributionAnswer],
+    status_code=status.HTTP_200_OK,
+    summary="get the comments of a forum publication",
+    tags=["Forums"]
+)
+@offload
+def get_forum_comments(id_forum, page: CommentPage = Depends()):
+    """
+    This path operation returns a page of the comments of a forum
+
+    Parameters:
+        - id_forum: str
+        - limit: int, comments in the page
+        - cursor: str, cursor of the page
+        - order: str, recent or likes
+
+    Returns a list of comments with a ContributionAnswer structure:
+    """
+    comments = get_contribution_comments('forums', id_forum, page)
+
+    return comments
+
 @forums_routes.get(
     path="/{id_forum}/basic",
     response_model=ContributionTitleBasic,
@@ -68,6 +116,7 @@ def get_forum(id_forum):
     summary="get a forum publication",
     tags=["Forums"]
 )
+@offload
 def get_forum_basic(id_forum):
     """
     This path operation return the basic description for a forum
@@ -88,6 +137,8 @@ def get_forum_basic(id_forum):
     summary="create a forum publication",
     tags=["Forums"]
 )
+@offload
+@lock_files('data/forums.json')
 def post_forum(forum: ContributionTitleBasic = Body(...)):
     """
     This path operation create a new forum
@@ -108,6 +159,8 @@ def post_forum(forum: ContributionTitleBasic = Body(...)):
     summary="update a forum publication",
     tags=["Forums"]
 )
+@offload
+@lock_files('data/forums.json')
 def put_forum(id_forum, forum: ContributionTitleBasic = Body(...)):
     """
     This path operation update a forum
@@ -129,6 +182,8 @@ def put_forum(id_forum, forum: ContributionTitleBasic = Body(...)):
     summary="delete a forum publication",
     tags=["Forums"]
 )
+@offload
+@lock_files('data/forums.json')
 def delete_forum(id_forum):
     """
     This path operation delete a forum
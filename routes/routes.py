@@ -1,10 +1,13 @@
 # Python
 from typing import List
+from typing import Optional
 import functools
 
 # FastAPI
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import Body
+from fastapi import Query
 from fastapi import status
 
 # Models
@@ -13,12 +16,23 @@ from schemas.routes import RouteDescription
 from schemas.routes import RouteDescriptionCreate
 
 # Utils
-from utils.functions import get_filename_json
-from utils.functions import write_filename_json
+from utils.functions import get_fields
+from utils.functions import wanted
+from utils.functions import get_index
+from utils.functions import get_record
+from utils.functions import get_referrers
+from utils.functions import insert_record
+from utils.functions import update_record
+from utils.functions import transaction
 from utils.functions import validate_unique_key
 from utils.functions import validate_valid_key
+from utils.functions import validate_valid_keys
+from utils.functions import lock_files
+from utils.routing import TrustedRoute
+from utils.pagination import Page
+from utils.executor import offload
 
-routes_routes = APIRouter()
+routes_routes = APIRouter(route_class=TrustedRoute)
 
 
 # Routes
@@ -29,15 +43,22 @@ routes_routes = APIRouter()
     summary="get all routes",
     tags=["Routes"]
 )
-def routes():
+@offload
+def routes(page: Page = Depends()):
     """
-    This path operation returns all routes
+    This path operation returns a page of routes
 
     Parameters:
+        - limit: int, records in the page
+        - cursor: str, cursor of the page
+        - stream: bool, all the routes from the cursor in NDJSON
 
     Returns a list of routes with a BaseRoute structure:
     """
-    routes = get_filename_json('data/routes.json')
+    if page.stream:
+        return page.stream_records('data/routes.json')
+
+    routes = page.records('data/routes.json')
 
     return routes
 
@@ -48,13 +69,18 @@ def routes():
     summary="get a route",
     tags=["Routes"]
 )
-def get_route(id_route):
+@offload
+def get_route(
+    id_route,
+    fields: Optional[str] = Query(default=None, description="comma separated fields of the route")
+):
     """
     This path operation return the description for a route
 
     Parameters:
         - id_route: str
-    
+        - fields: str, the fields of the route, all of them by default
+
     Returns a route with with the following attributes:
         - id_route: str
         - name: str
@@ -66,36 +92,36 @@ def get_route(id_route):
         - teachers: List[TeacherBasic]
         - sections: List[Section]
     """
-    routes = get_filename_json('data/routes.json')
-    
+    fields = get_fields(fields, RouteDescription)
+
     # id route must be valid
-    validate_valid_key(
-        id_route, routes, 'id_route',
+    route = get_record(
+        'data/routes.json', 'id_route', id_route,
         f"Invalid id route '{id_route}'"
     )
-    
-    route = list(filter(lambda r: r['id_route'] == id_route, routes))[0]
-    del routes
 
     # get the glossary
-    glossary = get_filename_json('data/glossary.json')
-    glossary = list(filter(lambda g: g['id_glossary'] in route["glossary"], glossary))
-    route["glossary"] = glossary
-    del glossary
+    if wanted(fields, "glossary"):
+        glossary = get_index('data/glossary.json', 'id_glossary')
+        glossary = [glossary[g] for g in route["glossary"] if g in glossary]
+        route["glossary"] = glossary
+        del glossary
 
     # get the courses
-    all_courses = get_filename_json('data/courses.json')
-    id_courses = list(map(lambda s: s['courses'], route['sections']))
-    
-    for i in range(len(id_courses)):
-        courses = list(filter(lambda c: c['id_course'] in id_courses[i], all_courses))
-        route['sections'][i]["courses"] = courses
-    del all_courses
+    if wanted(fields, "sections"):
+        all_courses = get_index('data/courses.json', 'id_course')
+        id_courses = list(map(lambda s: s['courses'], route['sections']))
+
+        for i in range(len(id_courses)):
+            courses = [all_courses[c] for c in id_courses[i] if c in all_courses]
+            route['sections'][i]["courses"] = courses
+        del all_courses
 
     # get the teachers
-    teachers = get_filename_json('data/teachers.json')
-    teachers = list(filter(lambda t: t['id_teacher'] in route["teachers"], teachers))
-    route["teachers"] = teachers
+    if wanted(fields, "teachers"):
+        teachers = get_index('data/teachers.json', 'id_teacher')
+        teachers = [teachers[t] for t in route["teachers"] if t in teachers]
+        route["teachers"] = teachers
 
     return route
 
@@ -106,25 +132,22 @@ def get_route(id_route):
     summary="get a route with a basic information",
     tags=["Routes"]
 )
+@offload
 def get_route_basic(id_route):
     """
     This path operation the basic information for a route
 
     Parameters:
         - id_route: str
-    
+
     Returns a route with a RouteDescriptionCreate structure:
     """
-    routes = get_filename_json('data/routes.json')
-    
     # id route must be valid
-    validate_valid_key(
-        id_route, routes, 'id_route',
+    route = get_record(
+        'data/routes.json', 'id_route', id_route,
         f"Invalid id route '{id_route}'"
     )
 
-    route = list(filter(lambda r: r['id_route'] == id_route, routes))[0]
-
     return route
 
 @routes_routes.post(
@@ -134,59 +157,57 @@ def get_route_basic(id_route):
     summary="create a route",
     tags=["Routes"]
 )
+@offload
+@lock_files('data/routes.json')
 def post_route(route: RouteDescriptionCreate = Body(...)):
     """
     This path operation create a new route
 
     Parameters:
         - Route: RouteDescription
-    
+
     Return the new route in a json with a BaseRoute structure
     """
     route = route.dict()
-    routes = get_filename_json('data/routes.json')
-    
+
     # id_route must be unique
     validate_unique_key(
-        route["id_route"], routes, 'id_route',
+        route["id_route"], get_index('data/routes.json', 'id_route'), 'id_route',
         f"Invalid id route '{route['id_route']}'"
     )
-    
+
     # name must be unique
     validate_unique_key(
-        route["name"], routes, 'name',
+        route["name"], get_index('data/routes.json', 'name'), 'name',
         f"Invalid name route '{route['name']}'"
     )
-    
+
     # the id_glossaries must be valid if exist
     if 'glossary' in route:
-        glossary = get_filename_json('data/glossary.json')
-
-        for g in route["glossary"]:
-            validate_valid_key(
-                g, glossary, 'id_glossary',
-                f"Invalid id glossary '{g}'"
-            )
-    
-    # the id_teachers must be valid
-    teachers = get_filename_json('data/teachers.json')
-    for t in route["teachers"]:
-        validate_valid_key(
-            t, teachers, 'id_teacher',
-            f"Invalid id teacher '{t}'"
+        glossary = get_index('data/glossary.json', 'id_glossary')
+
+        validate_valid_keys(
+            route["glossary"], glossary, 'id_glossary',
+            "Invalid id glossary"
         )
+
+    # the id_teachers must be valid
+    teachers = get_index('data/teachers.json', 'id_teacher')
+    validate_valid_keys(
+        route["teachers"], teachers, 'id_teacher',
+        "Invalid id teacher"
+    )
     del teachers
-    
+
     # the id_courses must be valid
-    courses = get_filename_json('data/courses.json')
+    courses = get_index('data/courses.json', 'id_course')
     id_courses = list(map(lambda s: s["courses"], route["sections"]))
-    id_courses = functools.reduce(lambda a,b: a + b, id_courses)
+    id_courses = functools.reduce(lambda a,b: a + b, id_courses, [])
 
-    for c in id_courses:
-        validate_valid_key(
-            c, courses, 'id_course',
-            f"Invalid id course '{c}'"
-        )
+    validate_valid_keys(
+        id_courses, courses, 'id_course',
+        "Invalid id course"
+    )
     del courses
     del id_courses
 
@@ -196,8 +217,7 @@ def post_route(route: RouteDescriptionCreate = Body(...)):
         s["level"] = s["level"].value
 
     # Save the route
-    routes.append(route)
-    write_filename_json('data/routes.json', routes)
+    insert_record('data/routes.json', route)
 
     return route
 
@@ -208,6 +228,8 @@ def post_route(route: RouteDescriptionCreate = Body(...)):
     summary="update a route",
     tags=["Routes"]
 )
+@offload
+@lock_files('data/routes.json')
 def put_route(id_route, route: RouteDescriptionCreate = Body(...)):
     """
     This path operation update a route
@@ -215,12 +237,12 @@ def put_route(id_route, route: RouteDescriptionCreate = Body(...)):
     Parameters:
         - id_route: str
         - Route: RouteDescription
-    
+
     Return the updated route in a json with a BaseRoute structure
     """
     route = route.dict()
-    routes = get_filename_json('data/routes.json')
-    
+    routes = get_index('data/routes.json', 'id_route')
+
     # id_route must be valid
     validate_valid_key(
         id_route, routes, 'id_route',
@@ -228,43 +250,39 @@ def put_route(id_route, route: RouteDescriptionCreate = Body(...)):
     )
 
     # name must be unique
-    temp_routes = list(filter(lambda r: r["id_route"] != id_route, routes))
-    validate_valid_key(
-        route["name"], temp_routes, 'name',
-        f"Invalid name route '{route['name']}'"
+    validate_unique_key(
+        route["name"], get_index('data/routes.json', 'name'), 'name',
+        f"Invalid name route '{route['name']}'",
+        current=routes[id_route]
     )
-    del temp_routes
-    
+
     # the id_glossaries must be valid if exist
     if 'glossary' in route:
-        glossary = get_filename_json('data/glossary.json')
-        
-        for g in route["glossary"]:
-            validate_valid_key(
-                g, glossary, 'id_glossary',
-                f"Invalid id glossary '{g}'"
-            )
+        glossary = get_index('data/glossary.json', 'id_glossary')
+
+        validate_valid_keys(
+            route["glossary"], glossary, 'id_glossary',
+            "Invalid id glossary"
+        )
         del glossary
 
     # the id_teachers must be valid
-    teachers = get_filename_json('data/teachers.json')
-    for t in route["teachers"]:
-        validate_valid_key(
-            t, teachers, 'id_teacher',
-            f"Invalid id teacher '{t}'"
-        )
+    teachers = get_index('data/teachers.json', 'id_teacher')
+    validate_valid_keys(
+        route["teachers"], teachers, 'id_teacher',
+        "Invalid id teacher"
+    )
     del teachers
 
     # the id_courses must be valid
-    courses = get_filename_json('data/courses.json')
+    courses = get_index('data/courses.json', 'id_course')
     id_courses = list(map(lambda s: s["courses"], route["sections"]))
-    id_courses = functools.reduce(lambda a,b: a + b, id_courses)
+    id_courses = functools.reduce(lambda a,b: a + b, id_courses, [])
 
-    for c in id_courses:
-        validate_valid_key(
-            c, courses, 'id_course',
-            f"Invalid id course '{c}'"
-        )
+    validate_valid_keys(
+        id_courses, courses, 'id_course',
+        "Invalid id course"
+    )
     del courses
     del id_courses
 
@@ -274,9 +292,7 @@ def put_route(id_route, route: RouteDescriptionCreate = Body(...)):
         s["level"] = s["level"].value
 
     # Save the route
-    routes = list(filter(lambda r: r["id_route"] != id_route, routes))
-    routes.append(route)
-    write_filename_json('data/routes.json', routes)
+    update_record('data/routes.json', 'id_route', id_route, route)
 
     return route
 
@@ -287,37 +303,34 @@ def put_route(id_route, route: RouteDescriptionCreate = Body(...)):
     summary="delete a route",
     tags=["Routes"]
 )
+@offload
+@lock_files('data/routes.json', 'data/categories.json')
 def delete_route(id_route):
     """
     This path operation delete a route
 
     Parameters:
         - id_route: str
-    
+
     Return the deleted route in a json with a RouteDescriptionCreate structure
     """
-    routes = get_filename_json('data/routes.json')
-    
     # id_route must be valid
-    validate_valid_key(
-        id_route, routes, 'id_route',
+    route = get_record(
+        'data/routes.json', 'id_route', id_route,
         f"Invalid id route '{id_route}'"
     )
 
-    # Removing route of all categories
-    categories = get_filename_json('data/categories.json')
-    
-    for c in categories:
-        if id_route in c["routes"]:
-            c["routes"] = list(filter(lambda r: r != id_route, c["routes"]))
-    
-    # Save the categories
-    write_filename_json('data/categories.json', categories)
-    del categories
-
-    # Save the routes
-    route = list(filter(lambda r: r['id_route'] == id_route, routes))[0]
-    routes = list(filter(lambda r: r['id_route'] != id_route, routes))
-    write_filename_json('data/routes.json', routes)
-    
+    # Removing route of the categories that have it
+    categories = get_referrers('data/categories.json', 'routes', id_route)
+    categories = [
+        {**c, **{"routes": list(filter(lambda r: r != id_route, c["routes"]))}}
+        for c in categories
+    ]
+
+    # Save the categories and the route together
+    with transaction() as changes:
+        for c in categories:
+            changes.update('data/categories.json', 'id_category', c["id_category"], c)
+        changes.delete('data/routes.json', 'id_route', id_route)
+
     return route
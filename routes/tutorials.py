@@ -1,24 +1,36 @@
 # Python
 from typing import List
+from typing import Optional
 
 # FastAPI
 from fastapi import APIRouter
+from fastapi import Depends
 from fastapi import Body
+from fastapi import Query
 from fastapi import status
 
 # Models
+from schemas.contributions import ContributionAnswer
 from schemas.contributions import ContributionTitle
 from schemas.contributions import ContributionTitleBasic
 
 # Utils
 from utils.functions import get_all_contributions
+from utils.functions import get_fields
 from utils.functions import get_contribution
+from utils.functions import get_contribution_comments
 from utils.functions import get_contribution_basic
 from utils.functions import post_contribution
 from utils.functions import put_contribution
 from utils.functions import delete_contribution
+from utils.functions import lock_files
+from utils.routing import TrustedRoute
+from utils.pagination import Page
+from utils.pagination import CommentPage
+from utils.filters import ContributionFilter
+from utils.executor import offload
 
-tutorials_routes = APIRouter()
+tutorials_routes = APIRouter(route_class=TrustedRoute)
 
 
 # Tutorial
@@ -29,15 +41,21 @@ tutorials_routes = APIRouter()
     summary="get all tutorials",
     tags=["Tutorials"]
 )
-def all_tutorials():
+@offload
+def all_tutorials(page: Page = Depends(), filters: ContributionFilter = Depends()):
     """
-    This path operation returns all tutorials
+    This path operation returns a page of tutorials
 
     Parameters:
+        - limit: int, records in the page
+        - cursor: str, cursor of the page
+        - id_user, kind, date_from, date_to, min_likes: the filters
+        - sort, descending: the order
+        - stream: bool, all the tutorials from the cursor in NDJSON
 
     Returns a list of tutorials with a ContributionTitle structure:
     """
-    tutorials = get_all_contributions('tutorials')
+    tutorials = get_all_contributions('tutorials', page, filters)
 
     return tutorials
 
@@ -48,18 +66,49 @@ def all_tutorials():
     summary="get a tutorial publication",
     tags=["Tutorials"]
 )
-def get_tutorial(id_tutorial):
+@offload
+def get_tutorial(
+    id_tutorial,
+    fields: Optional[str] = Query(default=None, description="comma separated fields of the tutorial")
+):
     """
     This path operation returns a tutorial
 
     Parameters:
+        - id_tutorial: str
+        - fields: str, the fields of the tutorial, all of them by default
 
     Returns a tutorial with a ContributionTitle structure:
     """
-    tutorial = get_contribution('tutorials', id_tutorial)
+    fields = get_fields(fields, ContributionTitle)
+    tutorial = get_contribution('tutorials', id_tutorial, fields)
     
     return tutorial
 
+@tutorials_routes.get(
+    path="/{id_tutorial}/comentarios",
+    response_model=List[ContributionAnswer],
+    status_code=status.HTTP_200_OK,
+    summary="get the comments of a tutorial publication",
+    tags=["Tutorials"]
+)
+@offload
+def get_tutorial_comments(id_tutorial, page: CommentPage = Depends()):
+    """
+    This path operation returns a page of the comments of a tutorial
+
+    Parameters:
+        - id_tutorial: str
+        - limit: int, comments in the page
+        - cursor: str, cursor of the page
+        - order: str, recent or likes
+
+    Returns a list of comments with a ContributionAnswer structure:
+    """
+    comments = get_contribution_comments('tutorials', id_tutorial, page)
+
+    return comments
+
 @tutorials_routes.get(
     path="/{id_tutorial}/basic",
     response_model=ContributionTitleBasic,
@@ -67,6 +116,7 @@ def get_tutorial(id_tutorial):
     summary="get a tutorial publication",
     tags=["Tutorials"]
 )
+@offload
 def get_tutorial_basic(id_tutorial):
     """
     This path operation return the basic description for a tutorial
@@ -87,6 +137,8 @@ def get_tutorial_basic(id_tutorial):
     summary="create a tutorial publication",
     tags=["Tutorials"]
 )
+@offload
+@lock_files('data/tutorials.json')
 def post_tutorial(tutorial: ContributionTitleBasic = Body(...)):
     """
     This path operation create a new tutorial
@@ -107,6 +159,8 @@ def post_tutorial(tutorial: ContributionTitleBasic = Body(...)):
     summary="update a tutorial publication",
     tags=["Tutorials"]
 )
+@offload
+@lock_files('data/tutorials.json')
 def put_tutorial(id_tutorial, tutorial: ContributionTitleBasic = Body(...)):
     """
     This path operation update a tutorial
@@ -128,6 +182,8 @@ def put_tutorial(id_tutorial, tutorial: ContributionTitleBasic = Body(...)):
     summary="delete a tutorial publication",
     tags=["Tutorials"]
 )
+@offload
+@lock_files('data/tutorials.json')
 def delete_tutorial(id_tutorial):
     """
     This path operation delete a tutorial
@@ -0,0 +1,12 @@
+# Python
+from typing import Optional
+
+# Pydantic
+from pydantic import BaseModel
+from pydantic import Field
+
+
+class BulkResult(BaseModel):
+    status_code: int = Field(...)
+    id: Optional[str] = Field(default=None)
+    detail: Optional[str] = Field(default=None)
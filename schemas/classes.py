@@ -45,3 +45,5 @@ class ClassContent(BaseClass):
     description: Optional[str] = Field(default=None)
     resourses: Optional[List[Resourse]] = Field(default=[])
     comments: Optional[List[ContributionAnswer]] = Field(default=[])
+    comments_total: Optional[int] = Field(default=None)
+    comments_cursor: Optional[str] = Field(default=None)
@@ -66,7 +66,12 @@ class Contribution(BaseContributionBasic):
 
 ### Comments
 class ContributionAnswer(Contribution):
-    answers: Optional[List[Contribution]] = Field(default=[])
+    answers: Optional[List['ContributionAnswer']] = Field(default=[])
+    answers_total: Optional[int] = Field(default=None)
+    answers_cursor: Optional[str] = Field(default=None)
+
+
+ContributionAnswer.update_forward_refs()
 
 
 class BaseContributionTitle(BaseContributionUser):
@@ -80,6 +85,8 @@ class BaseContributionTitle(BaseContributionUser):
 ### Blogs, Tutorials and Forums
 class ContributionTitle(BaseContributionTitle):
     comments: Optional[List[ContributionAnswer]] = Field(default=[])
+    comments_total: Optional[int] = Field(default=None)
+    comments_cursor: Optional[str] = Field(default=None)
 
 
 ### Contributions Basic
@@ -46,6 +46,8 @@ class CourseInfoClass(BaseCourse):
 class CourseInfo(CourseInfoClass):
     tutorials: Optional[List[BaseContributionTitle]] = Field(default=[])
     comments: Optional[List[Contribution]] = Field(default=[])
+    comments_total: Optional[int] = Field(default=None)
+    comments_cursor: Optional[str] = Field(default=None)
 
 
 class CourseInfoComplete(CourseInfoClass):
@@ -24,6 +24,15 @@ class Levels(Enum):
     advanced = "advanced"
     complementary = "complementary"
 
+class ContributionSort(Enum):
+    id_contribution = "id_contribution"
+    date_publication = "date_publication"
+    likes = "likes"
+
+class CommentOrder(Enum):
+    recent = "recent"
+    likes = "likes"
+
 class Social(Enum):
     facebook = "facebook"
     twitter = "twitter"
@@ -0,0 +1,75 @@
+# Python
+import os
+import shutil
+import uuid
+
+# Pytest
+import pytest
+
+# FastAPI
+from fastapi.testclient import TestClient
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def reset():
+    """
+    forget the collections and the responses kept by the previous test
+    """
+    from routes.courses import course_views
+    from utils import cache
+    from utils import conditional
+    from utils import repository
+    from utils import storage
+
+    with repository._collections_lock:
+        repository._collections.clear()
+        repository._recovered.clear()
+    storage._storage = None
+    with conditional._urls_lock:
+        conditional._urls.clear()
+    cache.responses.clear()
+    with course_views.lock:
+        course_views.documents.clear()
+        course_views.dependents.clear()
+        course_views.keys.clear()
+        course_views.generations.clear()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    a client of the app over a copy of the data
+    """
+    shutil.copytree(
+        os.path.join(ROOT, 'data'), tmp_path / 'data',
+        ignore=shutil.ignore_patterns(
+            '*.journal', '*.db*', '*.lock', '*.compacted', '*.txn', '*.tmp', '.*.commit'
+        )
+    )
+    monkeypatch.chdir(tmp_path)
+    from main import app
+
+    reset()
+    yield TestClient(app)
+    reset()
+
+
+@pytest.fixture
+def new_comment():
+    """
+    make the body of a new comment
+    """
+    def make(**values):
+        comment = {
+            "id_contribution": str(uuid.uuid4()),
+            "date_publication": "2021-11-22",
+            "likes": 1,
+            "id_user": "0c75673c-4aed-11ec-81d3-0242ac130003",
+            "kind": "comment",
+            "content": "content",
+        }
+        comment.update(values)
+        return comment
+    return make
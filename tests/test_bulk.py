@@ -0,0 +1,84 @@
+# Python
+from collections.abc import Mapping
+
+# Pytest
+import pytest
+
+# FastAPI
+from fastapi import HTTPException
+
+# Utils
+from utils import repository
+from utils.functions import validate_valid_keys
+
+
+def test_each_record_of_a_bulk_insert_has_its_status(client, new_comment):
+    first = new_comment()
+    last = new_comment()
+    comments = [
+        first,
+        new_comment(id_contribution=first["id_contribution"]),
+        new_comment(id_user="00000000-0000-4000-8000-000000000000"),
+        last,
+    ]
+
+    response = client.post("/comentarios/_bulk", json=comments)
+
+    assert response.status_code == 207
+    results = response.json()
+    assert [r["status_code"] for r in results] == [201, 406, 404, 201]
+    assert results[0]["id"] == first["id_contribution"]
+    assert results[3]["id"] == last["id_contribution"]
+    assert "Invalid id contribution" in results[1]["detail"]
+    assert "Invalid id user" in results[2]["detail"]
+
+    index = repository.get_index('data/comments.json', 'id_contribution')
+    assert first["id_contribution"] in index and last["id_contribution"] in index
+    assert len(repository.load('data/comments.json')) == 3
+
+
+def test_a_bulk_insert_without_valid_records_writes_nothing(client, new_comment):
+    comments = [
+        new_comment(kind="blog"),
+        new_comment(id_user="00000000-0000-4000-8000-000000000000"),
+    ]
+
+    response = client.post("/comentarios/_bulk", json=comments)
+
+    assert response.status_code == 207
+    assert [r["status_code"] for r in response.json()] == [406, 404]
+    assert all(r["id"] is None for r in response.json())
+    assert len(repository.load('data/comments.json')) == 1
+
+
+class Unwalkable(Mapping):
+    """
+    an index that can only be looked up
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __getitem__(self, key):
+        if key not in self.keys:
+            raise KeyError(key)
+        return key
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __iter__(self):
+        raise AssertionError("the index was walked")
+
+    def __len__(self):
+        raise AssertionError("the index was walked")
+
+
+def test_the_valid_keys_are_looked_up_one_by_one():
+    index = Unwalkable({"a", "b"})
+    validate_valid_keys(["a", "b", "a"], index, "id", "Invalid id")
+
+    with pytest.raises(HTTPException) as error:
+        validate_valid_keys(["a", "c", "d", "c"], index, "id", "Invalid id")
+    assert error.value.status_code == 404
+    assert error.value.detail.endswith("Invalid id 'c', 'd'")
@@ -0,0 +1,121 @@
+# Python
+import asyncio
+
+# Utils
+from utils import cache
+
+
+def test_a_repeated_get_is_answered_from_the_cache(client):
+    first = client.get("/comentarios/")
+    second = client.get("/comentarios/")
+
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.content == first.content
+    assert cache.responses.stats()["hits"] == 1
+
+
+def test_a_change_drops_the_responses_of_its_collection(client, new_comment):
+    client.get("/comentarios/")
+    client.get("/categoria/")
+    comment = new_comment()
+    assert client.post("/comentarios/", json=comment).status_code == 201
+
+    comments = client.get("/comentarios/")
+    categories = client.get("/categoria/")
+
+    assert comments.headers["x-cache"] == "MISS"
+    assert comment["id_contribution"] in comments.text
+    # the responses of the other collections are kept
+    assert categories.headers["x-cache"] == "HIT"
+
+
+def test_each_host_has_its_own_links(client):
+    first = client.get("/categoria/?limit=1", headers={"host": "one.example"})
+    second = client.get("/categoria/?limit=1", headers={"host": "two.example"})
+
+    assert first.headers["link"].startswith("<http://one.example/")
+    assert second.headers["x-cache"] == "MISS"
+    assert second.headers["link"].startswith("<http://two.example/")
+
+
+def test_each_scheme_has_its_own_links(client):
+    client.get("/categoria/?limit=1", headers={"host": "one.example"})
+    response = client.get("https://one.example/categoria/?limit=1")
+
+    assert response.headers["x-cache"] == "MISS"
+    assert response.headers["link"].startswith("<https://one.example/")
+
+
+def make_app(status, body=b"built"):
+    """
+    an app that takes a while to build each response, and counts them
+    """
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        await asyncio.sleep(0.05)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    return app, calls
+
+
+def request_many(middleware, count):
+    """
+    send identical GET requests at the same time, get the messages sent for each one
+    """
+    async def request():
+        scope = {
+            "type": "http", "method": "GET", "scheme": "http", "path": "/list",
+            "query_string": b"", "headers": [(b"host", b"testserver")],
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware(scope, receive, send)
+        return messages
+
+    async def main():
+        return await asyncio.gather(*(request() for _ in range(count)))
+
+    return asyncio.run(main())
+
+
+def test_identical_requests_share_an_uncacheable_response():
+    app, calls = make_app(500, b"failed")
+    middleware = cache.CacheMiddleware(app, cache.ResponseCache(1024 * 1024, 300))
+
+    results = request_many(middleware, 5)
+
+    assert len(calls) == 1
+    assert [m[0]["status"] for m in results] == [500] * 5
+    assert [m[1]["body"] for m in results] == [b"failed"] * 5
+    assert sorted(dict(m[0]["headers"])[b"x-cache"] for m in results) == [b"HIT"] * 4 + [b"MISS"]
+
+
+def test_identical_requests_share_a_response_with_the_cache_off():
+    app, calls = make_app(200)
+    responses = cache.ResponseCache(0, 300)
+    middleware = cache.CacheMiddleware(app, responses)
+
+    results = request_many(middleware, 5)
+
+    assert len(calls) == 1
+    assert [m[1]["body"] for m in results] == [b"built"] * 5
+    assert responses.stats()["entries"] == 0
+    # the next request builds the response again
+    request_many(middleware, 1)
+    assert len(calls) == 2
@@ -0,0 +1,105 @@
+# Python
+import gzip
+
+# Pytest
+import pytest
+
+# Starlette
+from starlette.datastructures import Headers
+from starlette.testclient import TestClient
+
+# Utils
+from utils import cache
+from utils import compression
+from utils import config
+
+
+@pytest.fixture
+def compressed(monkeypatch):
+    """
+    compress every response, whatever its size
+    """
+    monkeypatch.setattr(config, "COMPRESSION_MIN_SIZE", 1)
+
+
+def encoding(accept):
+    return compression.get_encoding(Headers({"accept-encoding": accept}))
+
+
+def test_the_encoding_follows_the_qualities():
+    assert encoding("gzip") == "gzip"
+    assert encoding("gzip;q=0") is None
+    assert encoding("identity") is None
+    assert encoding("") is None
+    assert encoding("*") == ("br" if compression.brotli else "gzip")
+
+
+@pytest.mark.skipif(compression.brotli is not None, reason="brotli is installed")
+def test_br_is_not_chosen_without_brotli():
+    assert encoding("br") is None
+    assert encoding("br, gzip;q=0.5") == "gzip"
+
+
+def test_a_list_is_sent_in_gzip(client, compressed):
+    plain = client.get("/comentarios/", headers={"accept-encoding": "identity"})
+    response = client.get("/comentarios/", headers={"accept-encoding": "gzip"})
+
+    assert "content-encoding" not in plain.headers
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == plain.json()
+
+
+def test_a_list_is_sent_in_br(client, compressed):
+    brotli = pytest.importorskip("brotli")
+    client.get("/comentarios/")
+    response = client.get("/comentarios/", headers={"accept-encoding": "br, gzip"}, stream=True)
+
+    assert response.headers["content-encoding"] == "br"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert b"id_contribution" in brotli.decompress(response.raw.read(decode_content=False))
+
+
+def test_a_small_response_is_sent_as_it_is(client):
+    response = client.get("/categoria/?limit=1", headers={"accept-encoding": "gzip"})
+
+    assert len(response.content) < config.COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in response.headers
+
+
+def test_an_encoded_response_is_sent_as_it_is(compressed):
+    body = gzip.compress(b"already compressed")
+
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain"),
+                (b"content-encoding", b"gzip"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    client = TestClient(compression.CompressionMiddleware(app))
+    response = client.get("/", headers={"accept-encoding": "gzip"})
+
+    assert response.content == b"already compressed"
+    assert response.headers["content-length"] == str(len(body))
+
+
+def test_the_compressed_variant_is_kept_with_the_response(client, compressed):
+    headers = {"accept-encoding": "gzip"}
+    client.get("/comentarios/", headers=headers)
+    second = client.get("/comentarios/", headers=headers)
+    [entry] = cache.responses.entries.values()
+    variant = entry[6]["gzip"]
+    third = client.get("/comentarios/", headers=headers)
+
+    assert second.headers["x-cache"] == third.headers["x-cache"] == "HIT"
+    assert third.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in third.headers["vary"]
+    # the variant is compressed once
+    assert entry[6]["gzip"] is variant
+    assert gzip.decompress(variant[1]) == entry[2] == third.content
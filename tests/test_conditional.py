@@ -0,0 +1,76 @@
+# Python
+from email.utils import formatdate
+import time
+
+# Starlette
+from starlette.datastructures import MutableHeaders
+
+# Utils
+from utils import conditional
+
+
+def wait_next_second():
+    time.sleep(int(time.time()) + 1.01 - time.time())
+
+
+def test_if_none_match_is_answered_with_304(client):
+    etag = client.get("/comentarios/").headers["etag"]
+
+    response = client.get("/comentarios/", headers={"if-none-match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+def test_a_change_gives_a_new_etag(client, new_comment):
+    etag = client.get("/comentarios/").headers["etag"]
+    assert client.post("/comentarios/", json=new_comment()).status_code == 201
+
+    response = client.get("/comentarios/", headers={"if-none-match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_if_modified_since_after_a_change_in_the_same_second(client, new_comment):
+    client.get("/comentarios/")
+    wait_next_second()
+    assert client.post("/comentarios/", json=new_comment()).status_code == 201
+    # the date of the change, as a client could have it from another url
+    since = formatdate(time.time(), usegmt=True)
+
+    response = client.get("/comentarios/", headers={"if-modified-since": since})
+
+    assert response.status_code == 200
+    assert "last-modified" not in response.headers
+
+
+def test_if_modified_since_once_the_second_is_over(client):
+    client.get("/comentarios/")
+    wait_next_second()
+    modified = client.get("/comentarios/").headers["last-modified"]
+
+    response = client.get("/comentarios/", headers={"if-modified-since": modified})
+
+    assert response.status_code == 304
+    assert response.headers["last-modified"] == modified
+
+
+def test_last_modified_is_only_set_for_a_past_second(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1000.9)
+    headers = MutableHeaders()
+
+    conditional.set_validators(headers, '"a"', 1000.2)
+    assert "last-modified" not in headers
+
+    conditional.set_validators(headers, '"a"', 999.2)
+    assert headers["last-modified"] == formatdate(999.2, usegmt=True)
+
+
+def test_if_modified_since_is_ignored_in_the_same_second(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1000.9)
+    since = {"if-modified-since": formatdate(1000, usegmt=True)}
+
+    assert not conditional.not_modified(since, '"a"', 1000.2)
+    assert conditional.not_modified(since, '"a"', 999.2)
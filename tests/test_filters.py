@@ -0,0 +1,98 @@
+# Pytest
+import pytest
+
+# Utils
+from utils import repository
+
+
+USERS = ["030c0048-4aed-11ec-81d3-0242ac130003", "0c75673c-4aed-11ec-81d3-0242ac130003"]
+
+
+def walk(client, url):
+    ids = []
+    while url is not None:
+        response = client.get(url)
+        assert response.status_code == 200
+        ids += [r["id_contribution"] for r in response.json()]
+        link = response.headers.get("link")
+        url = None if link is None else link[1:link.index(">")]
+    return ids
+
+
+@pytest.fixture
+def comments(client, new_comment):
+    values = [
+        (USERS[0], "comment", "2021-11-23", 4),
+        (USERS[1], "question", "2021-11-25", 1),
+        (USERS[0], "question", "2021-11-22", 7),
+        (USERS[1], "comment", "2021-11-24", 4),
+        (USERS[0], "comment", "2021-11-26", 2),
+        (USERS[1], "question", "2021-11-20", 9),
+    ]
+    response = client.post("/comentarios/_bulk", json=[
+        new_comment(id_user=user, kind=kind, date_publication=date, likes=likes)
+        for user, kind, date, likes in values
+    ])
+    assert [r["status_code"] for r in response.json()] == [201] * len(values)
+    return repository.load('data/comments.json')
+
+
+def expected(records, check, sort="id_contribution", descending=False):
+    records = sorted(
+        (r for r in records if check(r)),
+        key=lambda r: (r[sort], r["id_contribution"]), reverse=descending
+    )
+    return [r["id_contribution"] for r in records]
+
+
+FILTERS = {
+    "id_user": (f"id_user={USERS[0]}", lambda r: r["id_user"] == USERS[0]),
+    "kind": ("kind=question", lambda r: r["kind"] == "question"),
+    "user and kind": (
+        f"id_user={USERS[1]}&kind=question",
+        lambda r: r["id_user"] == USERS[1] and r["kind"] == "question"
+    ),
+    "dates": (
+        "date_from=2021-11-22&date_to=2021-11-24",
+        lambda r: "2021-11-22" <= r["date_publication"] <= "2021-11-24"
+    ),
+    "likes": ("min_likes=4", lambda r: r["likes"] >= 4),
+}
+
+
+@pytest.mark.parametrize("name", FILTERS)
+@pytest.mark.parametrize("sort", ["id_contribution", "date_publication", "likes"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_a_filtered_list_is_walked_in_its_order(client, comments, name, sort, descending):
+    query, check = FILTERS[name]
+    url = f"/comentarios/?{query}&sort={sort}&descending={str(descending).lower()}&limit=2"
+
+    assert walk(client, url) == expected(comments, check, sort, descending)
+
+
+def test_a_filtered_list_without_a_limit_keeps_its_order(client, comments):
+    query, check = FILTERS["user and kind"]
+
+    response = client.get(f"/comentarios/?{query}")
+
+    assert [r["id_contribution"] for r in response.json()] == [
+        r["id_contribution"] for r in comments if check(r)
+    ]
+
+
+def test_the_bucket_of_a_filter_follows_the_changes(client, comments):
+    query, check = FILTERS["id_user"]
+    url = f"/comentarios/?{query}&sort=likes&limit=2"
+    assert walk(client, url) == expected(comments, check, "likes")
+
+    changed = {**comments[1], "id_user": USERS[0], "likes": 5}
+    response = client.put(f"/comentarios/{changed['id_contribution']}", json=changed)
+    assert response.status_code == 200
+
+    assert walk(client, url) == expected(repository.load('data/comments.json'), check, "likes")
+
+
+def test_a_range_of_dates_must_be_in_order(client):
+    response = client.get("/comentarios/?date_from=2021-11-24&date_to=2021-11-22")
+
+    assert response.status_code == 400
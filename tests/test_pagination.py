@@ -0,0 +1,151 @@
+# Python
+import threading
+
+# Utils
+from utils import repository
+from utils.loader import Loader
+
+
+def next_url(response):
+    link = response.headers.get("link")
+    return None if link is None else link[1:link.index(">")]
+
+
+def walk(client, url):
+    ids = []
+    while url is not None:
+        response = client.get(url)
+        assert response.status_code == 200
+        ids += [r["id_contribution"] for r in response.json()]
+        url = next_url(response)
+    return ids
+
+
+def add_comments(client, comments):
+    response = client.post("/comentarios/_bulk", json=comments)
+    assert [r["status_code"] for r in response.json()] == [201] * len(comments)
+
+
+def set_course_comments(ids):
+    course = dict(repository.get_index('data/courses.json', 'id_course')["python"])
+    course["id_comments"] = ids
+    repository.update('data/courses.json', 'id_course', "python", course)
+
+
+def test_a_list_is_walked_with_its_cursors(client, new_comment):
+    comments = [new_comment() for _ in range(5)]
+    add_comments(client, comments)
+
+    ids = walk(client, "/comentarios/?limit=2")
+
+    assert ids == sorted(r["id_contribution"] for r in repository.load('data/comments.json'))
+
+
+def test_a_list_without_a_limit_is_whole_and_in_its_order(client, new_comment):
+    comments = [new_comment() for _ in range(3)]
+    add_comments(client, comments)
+
+    response = client.get("/comentarios/")
+
+    assert "link" not in response.headers
+    assert [r["id_contribution"] for r in response.json()] == [
+        r["id_contribution"] for r in repository.load('data/comments.json')
+    ]
+
+
+def test_a_list_is_walked_once_while_records_are_inserted(client, new_comment):
+    add_comments(client, [new_comment() for _ in range(8)])
+    existing = [r["id_contribution"] for r in repository.load('data/comments.json')]
+    inserted = [new_comment() for _ in range(6)]
+
+    def insert():
+        for comment in inserted:
+            assert client.post("/comentarios/", json=comment).status_code == 201
+
+    thread = threading.Thread(target=insert)
+    ids = []
+    url = "/comentarios/?limit=2"
+    while url is not None:
+        response = client.get(url)
+        ids += [r["id_contribution"] for r in response.json()]
+        url = next_url(response)
+        if not thread.is_alive() and not thread.ident:
+            thread.start()
+    thread.join()
+
+    assert len(ids) == len(set(ids))
+    assert set(existing) <= set(ids)
+    assert set(ids) <= set(existing) | {c["id_contribution"] for c in inserted}
+
+
+def test_an_insert_does_not_move_the_next_page(client, new_comment):
+    comments = [
+        new_comment(id_contribution=f"{n}0000000-0000-4000-8000-000000000000") for n in (2, 4, 6)
+    ]
+    add_comments(client, comments)
+    first = client.get("/comentarios/?limit=1")
+    assert first.json()[0]["id_contribution"] == comments[0]["id_contribution"]
+
+    # a record before the cursor
+    before = new_comment(id_contribution="10000000-0000-4000-8000-000000000000")
+    add_comments(client, [before])
+    second = client.get(next_url(first))
+
+    assert second.json()[0]["id_contribution"] == comments[1]["id_contribution"]
+
+
+def test_the_comments_of_a_record_are_walked_in_order(client, new_comment):
+    dates = ["2021-11-23", "2021-11-25", "2021-11-22", "2021-11-24", "2021-11-26"]
+    comments = [new_comment(date_publication=d) for d in dates]
+    add_comments(client, comments)
+    set_course_comments([c["id_contribution"] for c in comments])
+
+    ids = walk(client, "/cursos/python/comentarios?limit=2")
+
+    by_date = sorted(comments, key=lambda c: c["date_publication"], reverse=True)
+    assert ids == [c["id_contribution"] for c in by_date]
+
+
+def test_a_new_comment_does_not_move_the_next_page_of_a_record(client, new_comment):
+    comments = [new_comment(date_publication=f"2021-11-2{n}") for n in range(1, 5)]
+    add_comments(client, comments)
+    set_course_comments([c["id_contribution"] for c in comments])
+    first = client.get("/cursos/python/comentarios?limit=2")
+
+    newest = new_comment(date_publication="2021-11-29")
+    add_comments(client, [newest])
+    set_course_comments([c["id_contribution"] for c in comments + [newest]])
+    second = client.get(next_url(first))
+
+    ids = [c["id_contribution"] for c in comments]
+    assert [c["id_contribution"] for c in first.json()] == [ids[3], ids[2]]
+    assert [c["id_contribution"] for c in second.json()] == [ids[1], ids[0]]
+    assert next_url(second) is None
+
+
+def test_the_most_liked_comments_follow_the_changes(client, new_comment):
+    comments = [new_comment(likes=n) for n in (3, 1, 2)]
+    add_comments(client, comments)
+    ids = [c["id_contribution"] for c in comments]
+    set_course_comments(ids)
+    url = "/cursos/python/comentarios?order=likes&limit=2"
+    assert walk(client, url) == [ids[0], ids[2], ids[1]]
+
+    liked = {**comments[1], "likes": 5}
+    assert client.put(f"/comentarios/{ids[1]}", json=liked).status_code == 200
+
+    assert walk(client, url) == [ids[1], ids[0], ids[2]]
+
+
+def test_only_the_page_of_the_comments_is_loaded(client, new_comment):
+    comments = [new_comment(date_publication=f"2021-11-2{n}") for n in range(5)]
+    add_comments(client, comments)
+    ids = [c["id_contribution"] for c in comments]
+    loader = Loader()
+
+    page, total, cursor = loader.page_comments(ids, limit=2)
+
+    assert page == [ids[4], ids[3]] and total == 5 and cursor is not None
+    assert set(loader.memo['data/comments.json', 'id_contribution']) == set(page)
+    # the other comments can move into the page
+    assert {i for _, _, i in loader.dependencies} == set(ids)
@@ -0,0 +1,97 @@
+# Python
+import json
+import threading
+
+# Pytest
+import pytest
+
+# Utils
+from utils import config
+from utils import repository
+from utils import storage
+
+
+@pytest.fixture(params=['json', 'journal'])
+def users(request, tmp_path, monkeypatch):
+    if request.param == 'journal':
+        engine = storage.JournalStorage(fsync=False)
+    else:
+        engine = storage.JsonStorage()
+        engine.fsync = False
+    monkeypatch.setattr(storage, '_storage', engine)
+    path = str(tmp_path / 'users.json')
+    with open(path, 'w') as f:
+        json.dump([{"id_user": "0", "name": "zero"}], f)
+    return path
+
+
+def test_concurrent_writes_are_grouped(users, monkeypatch):
+    monkeypatch.setattr(config, 'GROUP_COMMIT_WINDOW', 0.05)
+    collection = repository.get_collection(users)
+    batches = []
+    apply = collection.storage.apply
+
+    def counted(path, data, changes):
+        batches.append(len(changes))
+        return apply(path, data, changes)
+
+    monkeypatch.setattr(collection.storage, 'apply', counted)
+    threads = [
+        threading.Thread(target=repository.insert, args=(users, {"id_user": str(n), "name": "n"}))
+        for n in range(1, 21)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert sum(batches) == 20
+    assert len(batches) < 20
+    # the storage has every record
+    assert len(collection.storage.read(users)) == 21
+
+
+def test_a_failed_check_fails_alone(users, monkeypatch):
+    monkeypatch.setattr(config, 'GROUP_COMMIT_WINDOW', 0.05)
+    errors = {}
+
+    def reject():
+        raise ValueError("rejected")
+
+    def insert(n, check=None):
+        try:
+            repository.insert(users, {"id_user": str(n), "name": "n"}, check)
+        except ValueError as e:
+            errors[n] = e
+
+    threads = [
+        threading.Thread(target=insert, args=(n, reject if n == 3 else None)) for n in range(1, 6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert list(errors) == [3]
+    ids = sorted(r["id_user"] for r in repository.load(users))
+    assert ids == ["0", "1", "2", "4", "5"]
+    assert sorted(r["id_user"] for r in storage.get_storage().read(users)) == ids
+
+
+def test_the_changes_keep_the_order_of_the_records(users):
+    for n in range(1, 4):
+        repository.insert(users, {"id_user": str(n), "name": "n"})
+    shared = repository.load(users)
+
+    repository.update(users, 'id_user', "1", {"id_user": "1", "name": "moved"})
+    transaction = repository.Transaction()
+    transaction.update(users, 'id_user', "2", {"id_user": "2", "name": "kept"})
+    transaction.commit()
+    repository.delete(users, 'id_user', "0")
+
+    data = repository.load(users)
+    assert [(r["id_user"], r["name"]) for r in data] == [("2", "kept"), ("3", "n"), ("1", "moved")]
+    assert storage.get_storage().read(users) == data
+    # a list that was read does not change under its reader
+    assert [r["id_user"] for r in shared] == ["0", "1", "2", "3"]
+    assert repository.get_index(users, 'id_user')["2"] is data[0]
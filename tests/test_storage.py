@@ -0,0 +1,400 @@
+# Python
+import json
+import os
+import subprocess
+import sys
+import threading
+
+# Pytest
+import pytest
+
+# Utils
+from utils import config
+from utils import repository
+from utils import storage
+from utils.locks import fcntl
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_storage(engine):
+    if engine == 'journal':
+        return storage.JournalStorage(fsync=False)
+    engine = storage.JsonStorage()
+    engine.fsync = False
+    return engine
+
+
+def write_json(path, content):
+    with open(path, 'w') as f:
+        json.dump(content, f)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def leftovers(directory):
+    return [n for n in os.listdir(directory) if n.endswith(('.txn', '.commit', '.commit.tmp'))]
+
+
+@pytest.fixture
+def directory(tmp_path):
+    write_json(tmp_path / 'users.json', [{"id_user": "1", "name": "one"}])
+    write_json(tmp_path / 'projects.json', [{"id_project": "1", "name": "one"}])
+    return str(tmp_path)
+
+
+def test_recover_finishes_a_committed_transaction(directory):
+    engine = make_storage('json')
+    path = os.path.join(directory, 'users.json')
+    temp = f'{path}.abc.txn'
+    write_json(temp, [{"id_user": "2", "name": "two"}])
+    write_json(os.path.join(directory, '.abc.commit'), {"files": {path: temp}})
+
+    engine.recover(directory)
+
+    assert read_json(path) == [{"id_user": "2", "name": "two"}]
+    assert leftovers(directory) == []
+
+
+def test_recover_drops_an_uncommitted_transaction(directory):
+    engine = make_storage('json')
+    path = os.path.join(directory, 'users.json')
+    write_json(f'{path}.abc.txn', [{"id_user": "2", "name": "two"}])
+    write_json(os.path.join(directory, '.abc.commit.tmp'), {"files": {}})
+
+    engine.recover(directory)
+
+    assert read_json(path) == [{"id_user": "1", "name": "one"}]
+    assert leftovers(directory) == []
+
+
+def test_recover_appends_the_entries_of_a_committed_transaction(directory):
+    engine = make_storage('journal')
+    path = os.path.join(directory, 'users.json')
+    entries = [{"op": "insert", "record": {"id_user": "2", "name": "two"}}]
+    write_json(os.path.join(directory, '.abc.commit'), {"entries": {path: entries}})
+
+    engine.recover(directory)
+
+    assert [r["id_user"] for r in engine.read(path)] == ["1", "2"]
+    assert leftovers(directory) == []
+
+
+def test_finish_tolerates_a_finished_marker(directory):
+    engine = make_storage('json')
+    engine.finish(os.path.join(directory, '.abc.commit'), {"files": {}})
+
+
+def commit_paused(engine, monkeypatch):
+    """
+    make the commits of an engine wait in the middle, after their
+    temporal files are written and before their marker
+    """
+    reached = threading.Event()
+    resume = threading.Event()
+    commit = engine.commit
+
+    def paused(*args):
+        reached.set()
+        assert resume.wait(10)
+        commit(*args)
+
+    monkeypatch.setattr(engine, 'commit', paused)
+    return reached, resume
+
+
+@pytest.mark.parametrize('engine', ['json', 'journal'])
+def test_recover_waits_for_a_live_transaction(directory, engine, monkeypatch):
+    writer = make_storage(engine)
+    recovering = make_storage(engine)
+    users = os.path.join(directory, 'users.json')
+    projects = os.path.join(directory, 'projects.json')
+    reached, resume = commit_paused(writer, monkeypatch)
+
+    if engine == 'json':
+        users_data = [{"id_user": "1", "name": "one"}, {"id_user": "2", "name": "two"}]
+        batch = {users: (users_data, None), projects: ([], None)}
+    else:
+        batch = {
+            users: (None, [("insert", None, {"id_user": "2", "name": "two"})]),
+            projects: (None, [("delete", {"id_project": "1"}, None)]),
+        }
+    errors = []
+
+    def write():
+        try:
+            writer.apply_many(batch)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    assert reached.wait(10)
+
+    recovery = threading.Thread(target=recovering.recover, args=(directory,))
+    recovery.start()
+    recovery.join(0.3)
+    # the recovery does not touch the files of the live transaction
+    assert recovery.is_alive()
+
+    resume.set()
+    thread.join(10)
+    recovery.join(10)
+    assert not errors
+    assert [r["id_user"] for r in writer.read(users)] == ["1", "2"]
+    assert writer.read(projects) == []
+    assert leftovers(directory) == []
+    if engine == 'journal':
+        # the entries are appended once
+        assert len(writer.read_journal(users)) == 1
+
+
+@pytest.mark.skipif(fcntl is None, reason="the locks only work inside a process without fcntl")
+def test_recover_waits_for_a_transaction_of_another_process(directory):
+    engine = make_storage('json')
+    code = (
+        "import sys; from utils import storage; "
+        "storage.JsonStorage().recover(sys.argv[1]); print('recovered')"
+    )
+    with engine.transactions(directory):
+        process = subprocess.Popen(
+            [sys.executable, '-c', code, directory], cwd=ROOT, stdout=subprocess.PIPE
+        )
+        with pytest.raises(subprocess.TimeoutExpired):
+            process.wait(0.5)
+    assert process.communicate(timeout=10)[0].strip() == b'recovered'
+
+
+def test_journal_replay_is_idempotent(directory):
+    engine = make_storage('journal')
+    path = os.path.join(directory, 'users.json')
+    entries = [
+        {"op": "insert", "record": {"id_user": "2", "name": "two"}},
+        {"op": "update", "value": "1", "record": {"id_user": "1", "name": "uno"}},
+    ]
+    engine.append(path, entries)
+    engine.append(path, entries)
+
+    assert engine.read(path) == [{"id_user": "2", "name": "two"}, {"id_user": "1", "name": "uno"}]
+
+
+def test_a_compaction_keeps_the_version_of_a_collection(directory, monkeypatch):
+    engine = make_storage('journal')
+    monkeypatch.setattr(storage, '_storage', engine)
+    path = os.path.join(directory, 'users.json')
+    engine.append(path, [{"op": "insert", "record": {"id_user": "2", "name": "two"}}])
+    collection = repository.Collection(path).refresh()
+    signature, version = collection.signature, collection.version
+
+    engine.compact(path)
+    collection.refresh()
+
+    assert engine.read_journal(path) == []
+    assert (collection.signature, collection.version) == (signature, version)
+    assert collection.stored == engine.signature(path)
+
+    # a change after the compaction is loaded
+    engine.append(path, [{"op": "delete", "value": "1"}])
+    collection.refresh()
+    assert collection.version == version + 1
+    assert [r["id_user"] for r in collection.data] == ["2"]
+
+
+def test_a_read_never_sees_half_a_compaction(directory, monkeypatch):
+    engine = make_storage('journal')
+    reader = make_storage('journal')
+    path = os.path.join(directory, 'users.json')
+    engine.append(path, [{"op": "insert", "record": {"id_user": "2", "name": "two"}}])
+    reached = threading.Event()
+    resume = threading.Event()
+    read_journal = reader.read_journal
+
+    def paused(*args):
+        # the json file was read, the journal is not yet
+        reached.set()
+        assert resume.wait(10)
+        return read_journal(*args)
+
+    monkeypatch.setattr(reader, 'read_journal', paused)
+    read = []
+    thread = threading.Thread(target=lambda: read.append(reader.read(path)))
+    thread.start()
+    assert reached.wait(10)
+
+    compaction = threading.Thread(target=engine.compact, args=(path,))
+    compaction.start()
+    compaction.join(0.3)
+    # the compaction waits for the reader to replace the files
+    assert compaction.is_alive()
+
+    resume.set()
+    thread.join(10)
+    compaction.join(10)
+    assert [r["id_user"] for r in read[0]] == ["1", "2"]
+    assert engine.read_journal(path) == []
+    assert [r["id_user"] for r in engine.read(path)] == ["1", "2"]
+
+
+@pytest.fixture
+def database(tmp_path):
+    return str(tmp_path / 'platzi.db')
+
+
+def test_sqlite_fills_a_table_from_the_json_file(directory, database):
+    engine = storage.SqliteStorage(database)
+    path = os.path.join(directory, 'users.json')
+
+    assert engine.read(path) == [{"id_user": "1", "name": "one"}]
+    assert engine.signature(path) == 1
+    # the json file is only read the first time
+    write_json(path, [])
+    assert storage.SqliteStorage(database).read(path) == [{"id_user": "1", "name": "one"}]
+
+
+def test_sqlite_write_replaces_the_data(directory, database):
+    engine = storage.SqliteStorage(database)
+    path = os.path.join(directory, 'users.json')
+
+    version = engine.write(path, [{"id_user": "2", "name": "two"}])
+
+    assert version == engine.signature(path) == 2
+    assert engine.read(path) == [{"id_user": "2", "name": "two"}]
+    engine.write(path, {"not": "a list"})
+    assert engine.read(path) == {"not": "a list"}
+
+
+def test_sqlite_apply_changes_the_rows(directory, database):
+    engine = storage.SqliteStorage(database)
+    path = os.path.join(directory, 'users.json')
+    one = {"id_user": "1", "name": "one"}
+    two = {"id_user": "2", "name": "two"}
+    three = {"id_user": "3", "name": "three"}
+    engine.apply(path, None, [('insert', None, two), ('insert', None, three)])
+
+    # a replace keeps the position, an update goes to the end
+    uno = {"id_user": "1", "name": "uno"}
+    dos = {"id_user": "2", "name": "dos"}
+    version = engine.apply(path, None, [('replace', one, uno), ('update', two, dos)])
+    assert [r["name"] for r in engine.read(path)] == ["uno", "three", "dos"]
+
+    assert engine.apply(path, None, [('delete', three, None)]) == version + 1
+    assert [r["name"] for r in engine.read(path)] == ["uno", "dos"]
+
+
+def test_sqlite_versions_are_seen_by_other_connections(directory, database):
+    engine = storage.SqliteStorage(database)
+    other = storage.SqliteStorage(database)
+    users = os.path.join(directory, 'users.json')
+    projects = os.path.join(directory, 'projects.json')
+    before = other.signature(users), other.signature(projects)
+
+    signatures = engine.apply_many({
+        users: (None, [('insert', None, {"id_user": "2", "name": "two"})]),
+        projects: ([], None),
+    })
+
+    assert other.signature(users) == signatures[users]
+    assert other.signature(projects) == signatures[projects]
+    assert signatures[users] == before[0] + 1 and signatures[projects] == before[1] + 1
+    assert [r["id_user"] for r in other.read(users)] == ["1", "2"]
+    assert other.read(projects) == []
+
+
+def test_sqlite_rolls_back_a_failed_transaction(directory, database):
+    engine = storage.SqliteStorage(database)
+    users = os.path.join(directory, 'users.json')
+    projects = os.path.join(directory, 'projects.json')
+    versions = engine.signature(users), engine.signature(projects)
+
+    with pytest.raises(TypeError):
+        engine.apply_many({
+            users: (None, [('insert', None, {"id_user": "2", "name": "two"})]),
+            projects: (None, [('insert', None, {"id_project": "2", "name": object()})]),
+        })
+    engine.recover(directory)
+
+    assert (engine.signature(users), engine.signature(projects)) == versions
+    assert [r["id_user"] for r in engine.read(users)] == ["1"]
+    assert [r["id_project"] for r in engine.read(projects)] == ["1"]
+
+
+def test_the_app_runs_on_sqlite(client, new_comment, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'STORAGE', 'sqlite')
+    monkeypatch.setattr(config, 'SQLITE_PATH', str(tmp_path / 'platzi.db'))
+    monkeypatch.setattr(storage, '_storage', None)
+    comment = new_comment()
+
+    assert client.post("/comentarios/", json=comment).status_code == 201
+    assert client.get(f"/comentarios/{comment['id_contribution']}").status_code == 200
+    assert isinstance(storage.get_storage(), storage.SqliteStorage)
+    rows = storage.get_storage().read('data/comments.json')
+    assert comment["id_contribution"] in [r["id_contribution"] for r in rows]
+
+
+def test_a_failed_write_keeps_the_file(directory, monkeypatch):
+    engine = make_storage('json')
+    path = os.path.join(directory, 'users.json')
+    write_temp = engine.write_temp
+
+    def crash(temp, content):
+        write_temp(temp, content[:1])
+        raise OSError("crash")
+
+    monkeypatch.setattr(engine, 'write_temp', crash)
+    with pytest.raises(OSError):
+        engine.write(path, [{"id_user": "2", "name": "two"}, {"id_user": "3", "name": "three"}])
+
+    assert read_json(path) == [{"id_user": "1", "name": "one"}]
+    engine.recover(directory)
+    assert [n for n in os.listdir(directory) if n.endswith('.txn')] == []
+
+
+def test_a_write_replaces_the_file(directory):
+    engine = make_storage('json')
+    path = os.path.join(directory, 'users.json')
+    inode = os.stat(path).st_ino
+
+    signature = engine.write(path, [{"id_user": "2", "name": "two"}])
+
+    assert os.stat(path).st_ino != inode
+    assert signature == engine.signature(path)
+    assert read_json(path) == [{"id_user": "2", "name": "two"}]
+    assert leftovers(directory) == []
+
+
+def test_recover_keeps_the_files_written_after_a_crash(directory):
+    engine = make_storage('json')
+    users = os.path.join(directory, 'users.json')
+    projects = os.path.join(directory, 'projects.json')
+    temps = {users: f'{users}.abc.txn', projects: f'{projects}.abc.txn'}
+    write_json(temps[users], [{"id_user": "2", "name": "old"}])
+    write_json(temps[projects], [{"id_project": "2", "name": "old"}])
+    signatures = engine.signatures([users, projects])
+    write_json(os.path.join(directory, '.abc.commit'), {"files": temps, "signatures": signatures})
+    # a live process writes the users after the crash
+    engine.write(users, [{"id_user": "3", "name": "new"}])
+
+    engine.recover(directory)
+
+    assert read_json(users) == [{"id_user": "3", "name": "new"}]
+    assert read_json(projects) == [{"id_project": "2", "name": "old"}]
+    assert leftovers(directory) == []
+
+
+def test_recover_keeps_the_entries_appended_after_a_crash(directory):
+    engine = make_storage('journal')
+    users = os.path.join(directory, 'users.json')
+    entries = [{"op": "update", "value": "1", "record": {"id_user": "1", "name": "old"}}]
+    content = {"entries": {users: entries}, "signatures": engine.signatures([users])}
+    write_json(os.path.join(directory, '.abc.commit'), content)
+    # a live process changes the record after the crash
+    engine.append(users, [{"op": "update", "value": "1", "record": {"id_user": "1", "name": "new"}}])
+
+    engine.recover(directory)
+
+    assert engine.read(users) == [{"id_user": "1", "name": "new"}]
+    assert leftovers(directory) == []
@@ -0,0 +1,73 @@
+# Python
+import json
+
+# Utils
+from utils import cache
+from utils import repository
+from utils.streaming import NDJSON
+
+
+def add_comments(client, comments):
+    response = client.post("/comentarios/_bulk", json=comments)
+    assert [r["status_code"] for r in response.json()] == [201] * len(comments)
+
+
+def lines(response):
+    """
+    get the records of a NDJSON response, each one in a line
+    """
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(NDJSON)
+    assert response.text.endswith("\n")
+    return [json.loads(line) for line in response.text.split("\n")[:-1]]
+
+
+def test_a_list_is_streamed_whole(client, new_comment):
+    add_comments(client, [new_comment() for _ in range(5)])
+
+    records = lines(client.get("/comentarios/?stream=true&limit=2"))
+
+    assert [r["id_contribution"] for r in records] == sorted(
+        r["id_contribution"] for r in repository.load('data/comments.json')
+    )
+    assert all("user" in r and "answers" in r for r in records)
+
+
+def test_a_list_is_streamed_for_its_media_type(client):
+    response = client.get("/comentarios/", headers={"accept": NDJSON})
+
+    assert len(lines(response)) == len(repository.load('data/comments.json'))
+
+
+def test_a_stream_starts_at_the_cursor(client, new_comment):
+    add_comments(client, [new_comment() for _ in range(5)])
+    first = client.get("/comentarios/?limit=2")
+    link = first.headers["link"]
+
+    records = lines(client.get(link[1:link.index(">")] + "&stream=true"))
+
+    ids = sorted(r["id_contribution"] for r in repository.load('data/comments.json'))
+    assert [r["id_contribution"] for r in first.json()] == ids[:2]
+    assert [r["id_contribution"] for r in records] == ids[2:]
+
+
+def test_a_stream_is_filtered_and_sorted(client, new_comment):
+    add_comments(client, [
+        new_comment(kind=kind, likes=likes)
+        for kind, likes in [("question", 3), ("comment", 9), ("question", 7), ("question", 1)]
+    ])
+
+    response = client.get("/comentarios/?stream=true&kind=question&sort=likes&descending=true")
+
+    assert [(r["kind"], r["likes"]) for r in lines(response)] == [
+        ("question", 7), ("question", 3), ("question", 1)
+    ]
+
+
+def test_a_stream_is_not_kept_in_the_cache(client):
+    first = client.get("/comentarios/?stream=true")
+    second = client.get("/comentarios/?stream=true")
+
+    assert "content-length" not in first.headers
+    assert first.headers["x-cache"] == second.headers["x-cache"] == "MISS"
+    assert cache.responses.stats()["entries"] == 0
@@ -0,0 +1,62 @@
+# Python
+import uuid
+
+# Utils
+from utils import repository
+from utils.loader import Loader
+
+
+def add_thread(client, new_comment, answers, dates=None):
+    """
+    add the comments of a dict from each name to the names of its answers,
+    the answers are set after all of them exist so they can make a cycle.
+    Gets a dict from each name to its id
+    """
+    dates = dates or {}
+    ids = {name: str(uuid.uuid4()) for name in answers}
+    comments = [
+        new_comment(id_contribution=ids[name], date_publication=dates.get(name, "2021-11-22"))
+        for name in answers
+    ]
+    response = client.post("/comentarios/_bulk", json=comments)
+    assert [r["status_code"] for r in response.json()] == [201] * len(comments)
+    for name, names in answers.items():
+        comment = dict(repository.get_index('data/comments.json', 'id_contribution')[ids[name]])
+        comment["id_answers"] = [ids[n] for n in names]
+        repository.update('data/comments.json', 'id_contribution', ids[name], comment)
+    return ids
+
+
+def test_an_answer_to_an_ancestor_is_cut(client, new_comment):
+    ids = add_thread(client, new_comment, {"a": ["b"], "b": ["a", "b"]})
+
+    comment = Loader().load_comments([ids["a"]])[ids["a"]]
+
+    answer = comment["answers"][0]
+    assert answer["id_contribution"] == ids["b"]
+    assert answer["answers"] == [] and answer["answers_total"] == 2
+
+
+def test_the_thread_is_cut_at_the_depth(client, new_comment):
+    ids = add_thread(client, new_comment, {"a": ["b"], "b": ["c"], "c": ["d"], "d": []})
+
+    comment = Loader().load_comments([ids["a"]], depth=2)[ids["a"]]
+
+    answer = comment["answers"][0]["answers"][0]
+    assert answer["id_contribution"] == ids["c"]
+    assert answer["answers"] == [] and answer["answers_total"] == 1
+
+
+def test_the_most_recent_answers_are_embedded_up_to_the_breadth(client, new_comment):
+    names = [f"answer{n}" for n in range(5)]
+    dates = {name: f"2021-11-2{n}" for n, name in enumerate(names)}
+    ids = add_thread(client, new_comment, {"a": names, **{n: [] for n in names}}, dates)
+
+    comment = Loader().load_comments([ids["a"]], breadth=2)[ids["a"]]
+
+    assert [a["id_contribution"] for a in comment["answers"]] == [ids["answer4"], ids["answer3"]]
+    assert comment["answers_total"] == 5
+    rest = client.get(f"/comentarios/{ids['a']}/respuestas?cursor={comment['answers_cursor']}")
+    assert [a["id_contribution"] for a in rest.json()] == [
+        ids["answer2"], ids["answer1"], ids["answer0"]
+    ]
@@ -0,0 +1,73 @@
+# Routes
+from routes.courses import course_views
+
+# Utils
+from utils import repository
+
+
+def kept(key):
+    """
+    check if the document of a key is kept, and that only its dependencies point to it
+    """
+    document = course_views.documents.get(key)
+    pointing = {d for d, keys in course_views.dependents.items() if key in keys}
+    assert pointing == (set() if document is None else set(document[2]))
+    return document is not None
+
+
+def class_names(course):
+    return [c["name"] for m in course["modules"] for c in m["classes"]]
+
+
+def test_renaming_a_class_drops_the_course(client):
+    assert client.get("/cursos/clases/scrapy").status_code == 200
+    assert kept("scrapy")
+    class_ = client.get("/clases/class2/basic").json()
+    class_["name"] = "renamed class"
+    class_["id_comments"] = []
+
+    assert client.put("/clases/class2", json=class_).status_code == 200
+
+    assert not kept("scrapy")
+    assert "renamed class" in class_names(client.get("/cursos/clases/scrapy").json())
+
+
+def test_editing_a_comment_drops_the_course(client, new_comment):
+    comment = new_comment()
+    assert client.post("/comentarios/", json=comment).status_code == 201
+    course = dict(repository.get_index('data/courses.json', 'id_course')["scrapy"])
+    course["id_comments"] = [comment["id_contribution"]]
+    repository.update('data/courses.json', 'id_course', "scrapy", course)
+    assert client.get("/cursos/clases/scrapy").json()["comments"][0]["content"] == "content"
+    assert kept("scrapy")
+
+    edited = {**comment, "content": "edited"}
+    assert client.put(f"/comentarios/{comment['id_contribution']}", json=edited).status_code == 200
+
+    assert not kept("scrapy")
+    assert client.get("/cursos/clases/scrapy").json()["comments"][0]["content"] == "edited"
+
+
+def test_deleting_a_class_drops_the_course(client):
+    names = class_names(client.get("/cursos/clases/scrapy").json())
+    deleted = repository.get_index('data/classes.json', 'id_class')["class3"]["name"]
+    assert deleted in names and kept("scrapy")
+
+    assert client.delete("/clases/class3").status_code == 200
+
+    assert not kept("scrapy")
+    assert deleted not in class_names(client.get("/cursos/clases/scrapy").json())
+
+
+def test_a_dropped_course_leaves_no_dependencies(client):
+    client.get("/cursos/clases/scrapy")
+    client.get("/cursos/clases/python")
+    assert kept("scrapy") and kept("python")
+
+    repository.delete('data/classes.json', 'id_class', "class3")
+
+    for key in ("scrapy", "python"):
+        kept(key)
+    dropped = [k for k in ("scrapy", "python") if k not in course_views.documents]
+    assert dropped
+    assert not any(k in keys for keys in course_views.dependents.values() for k in dropped)
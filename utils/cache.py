@@ -0,0 +1,287 @@
+# Python
+from collections import OrderedDict
+import asyncio
+import threading
+import time
+
+# Starlette
+from starlette.datastructures import Headers
+from starlette.datastructures import MutableHeaders
+
+# Utils
+from utils import config
+from utils import repository
+from utils.compression import compress_response
+from utils.compression import get_encoding
+from utils.compression import is_compressible
+from utils.conditional import get_key
+from utils.executor import run_io
+
+
+class ResponseCache:
+    """
+    the bodies of the responses kept in memory, the least recently used go
+    first when they are more than max_size bytes, and each one is kept for
+    ttl seconds at most. A response is dropped when a collection it was
+    built from changes. The compressed bodies of a response are kept
+    along with it, each content coding is compressed once
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (status, headers, body, reads, expires, size, variants)
+        self.entries = OrderedDict()
+        self.dependents = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.generations = {}
+        self.lock = threading.Lock()
+        repository.subscribe(self.changed)
+
+    def get(self, key):
+        """
+        get the entry of the response of a key, None when it is not kept.
+        The entry must be checked before it is used
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[4] < time.monotonic():
+                self.remove(key)
+                entry = None
+        return entry
+
+    def check(self, key, entry):
+        """
+        check if the collections an entry was built from did not change,
+        it is dropped when they did
+        """
+        # the collections changed by other processes are loaded again,
+        # a collection read again is read by the current request too
+        for path, (signature, _) in entry[3].items():
+            if repository.get_collection(path).signature != signature:
+                with self.lock:
+                    if self.entries.get(key) is entry:
+                        self.remove(key)
+                return False
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        return True
+
+    def count(self, hit):
+        """
+        count a request answered with a kept response or a new one
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_variant(self, key, entry, encoding):
+        """
+        get the headers and the body of the response of an entry in a content coding,
+        it is compressed the first time and kept along with the response
+        """
+        status, headers, body, _, _, _, variants = entry
+        if encoding is None or not is_compressible(status, Headers(raw=headers)):
+            return headers, body
+
+        variant = variants.get(encoding)
+        if variant is None:
+            variant = compress_response(headers, body, encoding)
+            with self.lock:
+                if self.entries.get(key) is entry and encoding not in variants:
+                    variants[encoding] = variant
+                    self.size += len(variant[1])
+                    self.evict()
+        return variant
+
+    def put(self, key, status, headers, body, reads, generations):
+        """
+        keep the response of a key built from the collections read,
+        generations are the ones of the cache when the response was started
+        """
+        size = len(body) + sum(len(k) + len(v) for k, v in headers)
+        if size > self.max_size:
+            return
+
+        with self.lock:
+            # a collection changed while the response was built
+            if any(self.generations.get(p, 0) != generations.get(p, 0) for p in reads):
+                return
+
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (
+                status, headers, body, dict(reads), time.monotonic() + self.ttl, size, {}
+            )
+            self.size += size
+            for path in reads:
+                self.dependents.setdefault(path, set()).add(key)
+            self.evict()
+
+    def evict(self):
+        while self.size > self.max_size:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry[5] + sum(len(body) for _, body in entry[6].values())
+        for path in entry[3]:
+            keys = self.dependents.get(path)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dependents[path]
+
+    def changed(self, path, old, record):
+        """
+        drop the responses built from a changed collection
+        """
+        with self.lock:
+            # nothing was built from a collection before it was first loaded
+            self.generations[path] = self.generations.get(path, -1) + 1
+            for key in list(self.dependents.get(path, ())):
+                self.remove(key)
+
+    def clear(self):
+        """
+        drop all the responses
+        """
+        with self.lock:
+            self.entries.clear()
+            self.dependents.clear()
+            self.generations.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        get the counters of the cache
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "size": self.size,
+                "max_size": self.max_size,
+            }
+
+
+responses = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL)
+
+
+class CacheMiddleware:
+    """
+    answer the GET requests with the body of a previous response to the
+    same url, kept while the collections it was built from do not change.
+    The identical requests that come while a response is built wait for
+    it instead of building it again, whether it is kept or not. The
+    X-Cache header of a response tells if it was built for the request
+    """
+
+    def __init__(self, app, cache=responses):
+        self.app = app
+        self.cache = cache
+        # key -> (event loop, future of the response being built)
+        self.flights = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        key = ("GET",) + get_key(scope, request_headers)
+        loop = asyncio.get_running_loop()
+
+        # the lookup is in memory, only a kept response waits for the i/o threads
+        entry = self.cache.get(key) if self.cache.max_size else None
+        if entry is not None and await run_io(self.cache.check, key, entry):
+            await self.send_entry(key, entry, request_headers, send)
+            return
+
+        flight = self.flights.get(key)
+        if flight is not None and flight[0] is loop:
+            # the response was built after this request came, it is as recent as a new one
+            shared = await asyncio.shield(flight[1])
+            if shared is not None:
+                await self.send_shared(shared, send)
+                return
+
+        future = loop.create_future()
+        self.flights.setdefault(key, (loop, future))
+        shared = None
+        try:
+            shared = await self.build(key, scope, receive, send)
+        finally:
+            if self.flights.get(key) == (loop, future):
+                del self.flights[key]
+            future.set_result(shared)
+
+    async def send_entry(self, key, entry, request_headers, send):
+        self.cache.count(True)
+        encoding = get_encoding(request_headers)
+        if encoding is None or encoding in entry[6]:
+            headers, body = self.cache.get_variant(key, entry, encoding)
+        else:
+            headers, body = await run_io(self.cache.get_variant, key, entry, encoding)
+        await send({
+            "type": "http.response.start",
+            "status": entry[0],
+            "headers": headers + [(b"x-cache", b"HIT")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def send_shared(self, shared, send):
+        status, headers, body, reads = shared
+        self.cache.count(True)
+        repository.record_reads(reads)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": headers + [(b"x-cache", b"HIT")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def build(self, key, scope, receive, send):
+        """
+        build the response of a request and keep it when it can be kept.
+        Get its status, headers, body and the collections read for the
+        requests that wait for it, None when it is not shared
+        """
+        self.cache.count(False)
+        start = None
+        chunks = []
+        done = False
+        with self.cache.lock:
+            generations = dict(self.cache.generations)
+
+        async def send_and_keep(message):
+            nonlocal start, done
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                # the cookies of a response are only for its client
+                if "set-cookie" not in response_headers:
+                    start = (message["status"], list(response_headers.raw))
+                response_headers.append("x-cache", "MISS")
+            elif message["type"] == "http.response.body" and start is not None:
+                chunks.append(message.get("body", b""))
+                done = not message.get("more_body", False)
+            await send(message)
+
+        with repository.track_reads() as reads:
+            await self.app(scope, receive, send_and_keep)
+
+        if not done:
+            return None
+        status, headers = start
+        body = b"".join(chunks)
+        # a streamed body can read collections after the headers are sent
+        if status == 200 and reads and "content-length" in Headers(raw=headers):
+            self.cache.put(key, status, headers, body, reads, generations)
+        return status, headers, body, dict(reads)
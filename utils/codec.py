@@ -0,0 +1,64 @@
+# Python
+import base64
+import binascii
+import json
+
+# FastAPI
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    # without orjson the standard json module is used
+    orjson = None
+
+
+def loads(content):
+    """
+    parse a json document from str or bytes
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def dumps_bytes(content):
+    """
+    serialize a json document as utf-8 bytes
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            # orjson does not take some values, like integers over 64 bits
+            pass
+    return json.dumps(content, ensure_ascii=False).encode('utf-8')
+
+
+def dumps(content):
+    """
+    serialize a json document as str
+    """
+    return dumps_bytes(content).decode('utf-8')
+
+
+def encode_cursor(values):
+    """
+    serialize a list of values as an opaque cursor, safe in an url
+    """
+    return base64.urlsafe_b64encode(dumps_bytes(values)).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    parse the values of an opaque cursor, a ValueError when it is not valid
+    """
+    try:
+        return loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, TypeError) as e:
+        raise ValueError(cursor) from e
+
+
+# response class of the path operations
+DefaultResponse = ORJSONResponse if orjson is not None else JSONResponse
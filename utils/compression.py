@@ -0,0 +1,144 @@
+# Python
+import zlib
+
+# Starlette
+from starlette.datastructures import Headers
+from starlette.datastructures import MutableHeaders
+
+# Utils
+from utils import config
+
+try:
+    import brotli
+except ImportError:
+    # without brotli the responses are compressed with gzip only
+    brotli = None
+
+
+# the media types of the responses that are compressed
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def get_encoding(headers):
+    """
+    get the content coding of the response for the Accept-Encoding
+    of a request, br or gzip, None when it is not compressed
+    """
+    accepted = {}
+    for item in headers.get("accept-encoding", "").split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    # br goes first when both have the same quality
+    best = max(encodings, key=lambda e: accepted.get(e, accepted.get("*", 0.0)))
+    return best if accepted.get(best, accepted.get("*", 0.0)) > 0 else None
+
+
+def is_compressible(status, headers):
+    """
+    check if a response is compressed, streamed responses
+    have no Content-Length and they are always compressed
+    """
+    if status < 200 or status in (204, 304) or "content-encoding" in headers:
+        return False
+    if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+        return False
+    length = headers.get("content-length")
+    return length is None or int(length) >= config.COMPRESSION_MIN_SIZE
+
+
+class Compressor:
+    """
+    compress a body in chunks, each chunk is flushed
+    so a streamed response is not held back
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=config.BROTLI_QUALITY)
+        else:
+            # wbits 31 writes the gzip header and trailer
+            self.compressor = zlib.compressobj(config.GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        if self.encoding == "br":
+            return self.compressor.process(chunk) + self.compressor.flush()
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, chunk=b""):
+        if self.encoding == "br":
+            return self.compressor.process(chunk) + self.compressor.finish()
+        return self.compressor.compress(chunk) + self.compressor.flush()
+
+
+def compress_response(headers, body, encoding):
+    """
+    get the headers and the body of a whole response in a content coding
+    """
+    body = Compressor(encoding).finish(body)
+    headers = MutableHeaders(raw=list(headers))
+    headers["content-encoding"] = encoding
+    headers["content-length"] = str(len(body))
+    headers.add_vary_header("Accept-Encoding")
+    return headers.raw, body
+
+
+class CompressionMiddleware:
+    """
+    compress the responses with the content coding accepted by the request,
+    the small ones and the ones already compressed are sent as they are
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        encoding = get_encoding(Headers(scope=scope)) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                if is_compressible(message["status"], Headers(raw=message["headers"])):
+                    # the headers are sent with the first chunk of the body
+                    start = message
+                    return
+            elif message["type"] == "http.response.body" and start is not None:
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                if compressor is None and not more_body:
+                    start["headers"], body = compress_response(start["headers"], body, encoding)
+                    await send(start)
+                    message = {"type": "http.response.body", "body": body}
+                else:
+                    if compressor is None:
+                        compressor = Compressor(encoding)
+                        headers = MutableHeaders(scope=start)
+                        headers["content-encoding"] = encoding
+                        headers.add_vary_header("Accept-Encoding")
+                        if "content-length" in headers:
+                            del headers["content-length"]
+                        await send(start)
+                    if more_body:
+                        body = compressor.compress(body)
+                    else:
+                        body = compressor.finish(body)
+                    message = {"type": "http.response.body", "body": body, "more_body": more_body}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
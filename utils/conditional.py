@@ -0,0 +1,152 @@
+# Python
+from collections import OrderedDict
+from email.utils import formatdate
+from email.utils import parsedate_to_datetime
+import hashlib
+import threading
+import time
+
+# Starlette
+from starlette.datastructures import Headers
+from starlette.datastructures import MutableHeaders
+
+# Utils
+from utils import repository
+from utils.executor import run_io
+from utils.compression import get_encoding
+
+
+# urls with their last representation, with the paths of the collections it was built from
+MAX_URLS = 4096
+_urls = OrderedDict()
+_urls_lock = threading.Lock()
+
+
+def get_key(scope, headers):
+    """
+    get the key of the representation of a request, its url and the media type it accepts.
+    The scheme and the host are in the url, the links of a response are absolute
+    """
+    return (
+        scope.get("scheme", "http"), headers.get("host", ""),
+        scope["path"], scope.get("query_string", b""), headers.get("accept", "")
+    )
+
+
+def get_validators(key, reads):
+    """
+    get the ETag and the Last-Modified of a representation built
+    from the collections read, with their signature and modified time
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(key).encode('utf-8'))
+    for path in sorted(reads):
+        digest.update(repr((path, reads[path][0])).encode('utf-8'))
+    modified = max((m for _, m in reads.values() if m is not None), default=None)
+    return f'"{digest.hexdigest()}"', modified
+
+
+def get_current_validators(key):
+    """
+    get the validators of the last representation of a request for the
+    current versions of its collections, None when it is not known
+    """
+    with _urls_lock:
+        paths = _urls.get(key)
+    if paths is None:
+        return None
+    reads = {}
+    for path in paths:
+        collection = repository.get_collection(path)
+        reads[path] = (collection.signature, collection.modified)
+    return get_validators(key, reads)
+
+
+def not_modified(headers, etag, modified):
+    """
+    check if the representation of the client is the current one,
+    If-None-Match goes first and If-Modified-Since is used without it
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        # the weak comparison is used for If-None-Match
+        return "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None and is_settled(modified):
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # the http dates have a precision of seconds
+        return int(modified) <= since
+    return False
+
+
+def is_settled(modified):
+    """
+    check if a modified time is in a past second, the http dates have a
+    precision of seconds so another change in the same second would get
+    the same date. A date is only used once its second is over
+    """
+    return modified is not None and int(modified) < int(time.time())
+
+
+def set_validators(headers, etag, modified):
+    """
+    set the ETag and the Last-Modified headers of a response
+    """
+    headers["etag"] = etag
+    if is_settled(modified):
+        headers["last-modified"] = formatdate(modified, usegmt=True)
+
+
+class ConditionalMiddleware:
+    """
+    answer the GET requests with strong ETags and Last-Modified from the
+    versions of the collections their response was built from. A request
+    with the validators of the current representation is answered with a
+    304 before its path operation runs, from the collections of the last
+    response to the same url, without building or serializing its body
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        # a compressed representation has its own validators
+        key = get_key(scope, headers) + (get_encoding(headers),)
+        if "if-none-match" in headers or "if-modified-since" in headers:
+            validators = await run_io(get_current_validators, key)
+            if validators is not None and not_modified(headers, *validators):
+                response_headers = MutableHeaders()
+                set_validators(response_headers, *validators)
+                await send({
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": response_headers.raw,
+                })
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        async def send_with_validators(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                response_headers = MutableHeaders(scope=message)
+                # a streamed body can read collections after the headers are sent
+                if reads and "content-length" in response_headers and "etag" not in response_headers:
+                    set_validators(response_headers, *get_validators(key, reads))
+                    with _urls_lock:
+                        _urls[key] = list(reads)
+                        _urls.move_to_end(key)
+                        while len(_urls) > MAX_URLS:
+                            _urls.popitem(last=False)
+            await send(message)
+
+        with repository.track_reads() as reads:
+            await self.app(scope, receive, send_with_validators)
@@ -0,0 +1,48 @@
+# Python
+import os
+
+
+# storage engine for the data collections, journal, json or sqlite
+STORAGE = os.getenv('PLATZI_STORAGE', 'journal')
+
+# the journal of a collection is folded into its json file
+# when it is bigger than this size and than the json file
+JOURNAL_COMPACT_SIZE = int(os.getenv('PLATZI_JOURNAL_COMPACT_SIZE', 1024 * 1024))
+
+# flush the writes to the disk before answering
+FSYNC = os.getenv('PLATZI_FSYNC', '1') == '1'
+
+# the writers of a collection wait this many seconds for other writers
+# to write their changes together, and at most this many changes
+GROUP_COMMIT_WINDOW = float(os.getenv('PLATZI_GROUP_COMMIT_WINDOW', 0))
+GROUP_COMMIT_SIZE = int(os.getenv('PLATZI_GROUP_COMMIT_SIZE', 256))
+
+# sqlite database used when the storage engine is sqlite
+SQLITE_PATH = os.getenv('PLATZI_SQLITE_PATH', 'data/platzi.db')
+
+# the answers of a comment are embedded up to this depth,
+# and at most this many answers for each comment
+COMMENT_DEPTH = int(os.getenv('PLATZI_COMMENT_DEPTH', 8))
+COMMENT_BREADTH = int(os.getenv('PLATZI_COMMENT_BREADTH', 100))
+
+# comments embedded in a record, the others are in its comments endpoint
+EMBEDDED_COMMENTS = int(os.getenv('PLATZI_EMBEDDED_COMMENTS', 20))
+
+# records in a page of a list when the limit is not given, and the largest limit
+PAGE_SIZE = int(os.getenv('PLATZI_PAGE_SIZE', 100))
+PAGE_SIZE_MAX = int(os.getenv('PLATZI_PAGE_SIZE_MAX', 1000))
+
+# the GET responses are kept in memory up to this many bytes,
+# each one for this many seconds at most, 0 turns the cache off
+RESPONSE_CACHE_SIZE = int(os.getenv('PLATZI_RESPONSE_CACHE_SIZE', 64 * 1024 * 1024))
+RESPONSE_CACHE_TTL = float(os.getenv('PLATZI_RESPONSE_CACHE_TTL', 300))
+
+# the responses of at least this many bytes are compressed with gzip, or with
+# brotli when it is installed, at these levels
+COMPRESSION_MIN_SIZE = int(os.getenv('PLATZI_COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('PLATZI_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('PLATZI_BROTLI_QUALITY', 5))
+
+# threads that run the path operations and the reads and writes of the
+# collections, apart from the threadpool of the server
+IO_THREADS = int(os.getenv('PLATZI_IO_THREADS', 64))
@@ -0,0 +1,36 @@
+# Python
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+
+# Utils
+from utils import config
+
+
+# the threads that read and write the collections, the locks of the
+# collections are taken by thread so their work can not run in the event loop
+_executor = ThreadPoolExecutor(max_workers=config.IO_THREADS, thread_name_prefix='io')
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    run a blocking function in the i/o threads without blocking
+    the event loop, it sees the context variables of the caller
+    """
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+def offload(func):
+    """
+    make an async path operation from a blocking one, it runs in the
+    i/o threads instead of the threadpool of the server so a slow disk
+    does not hold the requests that do not wait for it
+    """
+    @functools.wraps(func)
+    async def offloaded(*args, **kwargs):
+        return await run_io(func, *args, **kwargs)
+
+    offloaded.offloaded = func
+    return offloaded
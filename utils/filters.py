@@ -0,0 +1,81 @@
+# Python
+from datetime import date
+from typing import Optional
+from uuid import UUID
+
+# FastAPI
+from fastapi import HTTPException
+from fastapi import Query
+
+# Models
+from schemas.enums import ContributionSort
+from schemas.enums import TypeContribution
+
+
+class ContributionFilter:
+    """
+    the filters and the order of a list of contributions. The user and the
+    kind are taken from their buckets kept in the order of the sort key, the
+    range of the sort key is bisected and the other conditions are checked
+    on the way
+    """
+
+    def __init__(
+        self,
+        id_user: Optional[UUID] = Query(default=None, description="author of the contributions"),
+        kind: Optional[TypeContribution] = Query(default=None, description="kind of the contributions"),
+        date_from: Optional[date] = Query(default=None, description="first date of publication"),
+        date_to: Optional[date] = Query(default=None, description="last date of publication"),
+        min_likes: Optional[int] = Query(default=None, ge=0, description="least likes"),
+        sort: ContributionSort = Query(
+            default=ContributionSort.id_contribution, description="key of the order"
+        ),
+        descending: bool = Query(default=False, description="the greatest values first")
+    ):
+        if date_from is not None and date_to is not None and date_from > date_to:
+            raise HTTPException(
+                status_code=400,
+                detail=f"HTTP_400_BAD_REQUEST: Invalid range of dates from '{date_from}' to '{date_to}'"
+            )
+        self.id_user = None if id_user is None else str(id_user)
+        self.kind = None if kind is None else kind.value
+        self.date_from = None if date_from is None else str(date_from)
+        self.date_to = None if date_to is None else str(date_to)
+        self.min_likes = min_likes
+        self.sort = sort.value
+        self.descending = descending
+
+    def query(self):
+        """
+        get the arguments of Page.records for the filters
+        """
+        key = None if self.sort == 'id_contribution' else self.sort
+        query = {"key": key, "descending": self.descending}
+
+        equal = {}
+        if self.id_user is not None:
+            equal["id_user"] = self.id_user
+        if self.kind is not None:
+            equal["kind"] = self.kind
+        query["equal"] = equal
+
+        # a range of the sort key is bisected, the other ranges are checked
+        ranges = {
+            "date_publication": (self.date_from, self.date_to),
+            "likes": (self.min_likes, None),
+        }
+        checks = []
+        for name, (low, high) in ranges.items():
+            if name == key:
+                query["low"], query["high"] = low, high
+            elif low is not None or high is not None:
+                checks.append((name, low, high))
+        if checks:
+            query["where"] = lambda record: all(
+                name in record
+                and (low is None or record[name] >= low)
+                and (high is None or record[name] <= high)
+                for name, low, high in checks
+            )
+
+        return query
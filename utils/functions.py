@@ -1,32 +1,169 @@
 # Python
-import json
+from collections import ChainMap
+from collections.abc import Mapping
+import contextlib
 
 # FastAPI
 from fastapi import HTTPException
 
+# Utils
+from utils import repository
+from utils.loader import Loader
+from utils.routing import parse_fields
 
-def get_filename_json(path):
+
+@contextlib.contextmanager
+def transaction():
+    """
+    stage changes to several files in a json format, they are written
+    together when the block ends and none if it raises. The changes are
+    write(path, content), insert(path, record), update(path, key, value, record)
+    that keeps the position of the record and delete(path, key, value)
+    """
+    changes = repository.Transaction()
+    yield changes
+    changes.commit()
+
+
+def lock_files(*paths):
+    """
+    hold files in a json format while they are read, validated and written,
+    it works as a context manager or as a decorator of a path operation
+    """
+    return repository.locked(*paths)
+
+
+def get_index(path, key):
+    """
+    get a dict from the values of a key to its record for a file in a json format,
+    the records are shared so they must not be mutated
+    """
+    return repository.get_index(path, key)
+
+
+def get_referrers(path, reference, value):
+    """
+    get the records of a file in a json format with a value in a reference,
+    like modules.id_classes, the records are shared so they must not be mutated
+    """
+    return repository.get_referrers(path, reference, value)
+
+
+def get_record(path, key, value, err):
+    """
+    get a copy of the record with a value in a key, it must be valid
+    """
+    index = get_index(path, key)
+    validate_valid_key(value, index, key, err)
+
+    return repository.copy_record(index[value])
+
+
+def insert_record(path, record, unique=None):
+    """
+    add a record to a file in a json format, the records added at the
+    same time are written together. unique maps a key to the error
+    raised if its value is taken when the record is added
     """
-    get the data from a file in a json format
+    def check():
+        for key, err in unique.items():
+            validate_unique_key(record[key], get_index(path, key), key, err)
+
+    return repository.insert(path, record, check if unique else None)
+
+
+def insert_records(path, records, prepare, key):
+    """
+    add the records that prepare accepts to a file in a json format in a
+    single write. prepare(record, get_index) parses and validates a record,
+    the indexes it gets of the file have the records before it in the batch.
+    Get the status code and the value in a key or the error of each record
+    """
+    valid = []
+    batch = {}
+
+    def get_batch_index(index_path, index_key):
+        if index_path != path:
+            return get_index(index_path, index_key)
+        if index_key not in batch:
+            batch[index_key] = {r[index_key]: r for r in reversed(valid) if index_key in r}
+        return ChainMap(batch[index_key], get_index(path, index_key))
+
+    results = []
+    for record in records:
+        try:
+            record = prepare(record, get_batch_index)
+        except HTTPException as e:
+            results.append({"status_code": e.status_code, "detail": e.detail})
+            continue
+        valid.append(record)
+        for index_key, index in batch.items():
+            if index_key in record:
+                index.setdefault(record[index_key], record)
+        results.append({"status_code": 201, "id": record[key]})
+
+    # Save the valid records together
+    with transaction() as changes:
+        for record in valid:
+            changes.insert(path, record)
+
+    return results
+
+
+def update_record(path, key, value, record):
+    """
+    replace the record with a value in a key for a file in a json format
     """
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.loads(f.read())
+    return repository.update(path, key, value, record)
 
 
-def write_filename_json(path, content):
+def delete_record(path, key, value):
     """
-    write a file in a json format
+    delete the record with a value in a key for a file in a json format
     """
-    with open(path, 'w', encoding='utf-8') as f:
-        f.write(json.dumps(content, ensure_ascii=False))
+    return repository.delete(path, key, value)
 
 
-def validate_unique_key(value, values_dict, key, err):
+def get_fields(fields, model):
     """
-    valide if a value in a key is unique
+    get the names in a comma separated list of fields of a model,
+    None for all the fields. Every name must be a field of the model
     """
-    keys = list(map(lambda v: v[key], values_dict))
-    if value in keys:
+    fields = parse_fields(fields)
+    if fields is not None:
+        invalid = [f for f in fields if f not in model.__fields__]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail="HTTP_400_BAD_REQUEST: Invalid fields " + ", ".join(f"'{f}'" for f in invalid)
+            )
+    return fields
+
+
+def wanted(fields, *names):
+    """
+    check if any of the names is in the fields, all of them are when fields is None
+    """
+    return fields is None or any(name in fields for name in names)
+
+
+def get_keys(values_dict, key):
+    """
+    get a dict from the values of a key to its record,
+    values_dict can be a list of records or an index
+    """
+    if isinstance(values_dict, Mapping):
+        return values_dict
+    return {v[key]: v for v in reversed(values_dict)}
+
+
+def validate_unique_key(value, values_dict, key, err, current=None):
+    """
+    valide if a value in a key is unique,
+    current is the record being updated and it is ignored
+    """
+    record = get_keys(values_dict, key).get(value)
+    if record is not None and record is not current:
         raise HTTPException(
             status_code=406,
             detail=f"HTTP_406_NOT_ACCEPTABLE: {err}'"
@@ -37,150 +174,113 @@ def validate_valid_key(value, values_dict, key, err):
     """
     valide if a value in a key is valid
     """
-    keys = list(map(lambda v: v[key], values_dict))
-    if value not in keys:
+    if value not in get_keys(values_dict, key):
         raise HTTPException(
             status_code = 404,
             detail=f"HTTP_404_NOT_FOUND: {err}"
         )
 
 
-# Contributions
-def get_all_contributions(kind):
-    """
-    get all contributions for a kind in [blogs, forums, tutorials]
-    """
-    contributions = get_filename_json(f'data/{kind}.json')
-    comments = get_filename_json('data/comments.json')
-    users = get_filename_json('data/users.json')
-
-    # get comments and user for each blog
-    contributions = list(
-        map(
-            lambda ct: {
-                **ct,
-                **[{"comments": list(
-                    filter(
-                        lambda c: c["id_contribution"] in ct["id_comments"],
-                        comments
-                    )
-                )} if ct["id_comments"] else {"comments": []}][0],
-                **{"user": list(
-                    filter(
-                        lambda u: u["id_user"] == ct["id_user"],
-                        users
-                    )
-                )[0]}
-            },
-            contributions
+def validate_valid_keys(values, values_dict, key, err):
+    """
+    valide if all the values in a key are valid,
+    every invalid value is reported in the same error
+    """
+    keys = get_keys(values_dict, key)
+    # each value is looked up, a merged index like a ChainMap is never walked
+    invalid = [v for v in dict.fromkeys(values) if v not in keys]
+    if invalid:
+        raise HTTPException(
+            status_code = 404,
+            detail=f"HTTP_404_NOT_FOUND: {err} " + ", ".join(f"'{v}'" for v in invalid)
         )
-    )
 
-    # get users and answers for all contributions
-    for ct in contributions:
-        for c in ct["comments"]:
-            # get user for each contribution's comment
-            c["user"] = list(filter(lambda u: u["id_user"] == c["id_user"], users))[0]
-    
-            # get answers for each contribution's comment
-            if "id_answers" in c and c["id_answers"]:
-                c["answers"] = list(
-                    filter(
-                        lambda a: a["id_contribution"] in c["id_answers"],
-                        comments
-                    )
-                )
-            
-                ## get users for answers
-                c["answers"] = list(
-                    map(
-                        lambda a: {**a, **{"user": list(
-                            filter(
-                                lambda u: u["id_user"] == a["id_user"],
-                                users
-                            )
-                        )[0]}},
-                        c["answers"]
-                    )
-                )
-    
+
+# Contributions
+def join_contributions(contributions):
+    """
+    get the contributions with their comments and their user
+    """
+    loader = Loader()
+
+    # get comments with their users and answers, and the user for each blog
+    contributions = loader.join_comments(contributions)
+    contributions = loader.join_users(contributions)
+
     return contributions
 
 
-def get_contribution(kind, id):
+def get_all_contributions(kind, page, filters):
     """
-    get a contribution for a kind in [blogs, forums, tutorials]
+    get a page of the contributions for a kind in [blogs, forums, tutorials]
+    that pass a filter, or a stream of them
+    """
+    if page.stream:
+        return page.stream_records(f'data/{kind}.json', join_contributions, **filters.query())
+
+    contributions = page.records(f'data/{kind}.json', **filters.query())
+
+    return join_contributions(contributions)
+
+
+def get_contribution(kind, id, fields=None):
+    """
+    get a contribution for a kind in [blogs, forums, tutorials],
+    only the joins of the given fields are made
     """
-    contributions = get_filename_json(f'data/{kind}.json')
-    
     # id must be valid
-    validate_valid_key(
-        id, contributions, 'id_contribution'
+    contribution = get_record(
+        f'data/{kind}.json', 'id_contribution', id,
         f"Invalid id {kind[:-1]} '{id}'"
     )
+    loader = Loader()
+
+    # get comments with their users and answers, and the user
+    if wanted(fields, "comments", "comments_total", "comments_cursor"):
+        contribution = loader.join_comments([contribution])[0]
+    if wanted(fields, "user"):
+        contribution = loader.join_users([contribution])[0]
 
-    # get contribution
-    contribution = list(filter(lambda c: c["id_contribution"] == id, contributions))[0]
-    del contributions
-    comments = get_filename_json('data/comments.json')
-    users = get_filename_json('data/users.json')
-
-    # get comments
-    contribution["comments"] = list(
-        filter(
-            lambda c: c["id_contribution"] in contribution["id_comments"],
-            comments
-        )
-    ) if contribution["id_comments"] else []
-
-    # get user
-    contribution["user"] = list(filter(lambda u: u["id_user"] == contribution["id_user"], users))[0]
-
-    # get answers and users
-    for c in contribution["comments"]:
-        # get user for each contribution's comment
-        c["user"] = list(filter(lambda u: u["id_user"] == c["id_user"], users))[0]
-
-        # get answers for each contribution's comment
-        if "id_answers" in c and c["id_answers"]:
-            c["answers"] = list(
-                filter(
-                    lambda a: a["id_contribution"] in c["id_answers"],
-                    comments
-                )
-            )
-        
-            ## get users for answers
-            c["answers"] = list(
-                map(
-                    lambda a: {**a, **{"user": list(
-                        filter(
-                            lambda u: u["id_user"] == a["id_user"],
-                            users
-                        )
-                    )[0]}},
-                    c["answers"]
-                )
-            )
-    
     return contribution
 
 
+def get_comments(path, key, id, err, page, field="id_comments"):
+    """
+    get a page of the comments in a field of a record, each one
+    with its user and the thread of its answers
+    """
+    loader = Loader()
+
+    # id must be valid
+    record = loader.load(path, key, id, err)
+
+    # get comments with their users and answers
+    ids = page.comments(loader, record[field])
+    comments = loader.load_comments(ids)
+
+    return [comments[i] for i in ids if i in comments]
+
+
+def get_contribution_comments(kind, id, page):
+    """
+    get a page of the comments of a contribution for a kind in [blogs, forums, tutorials]
+    """
+    return get_comments(
+        f'data/{kind}.json', 'id_contribution', id,
+        f"Invalid id {kind[:-1]} '{id}'", page
+    )
+
+
 def get_contribution_basic(kind, id):
     """
     get a basic contribution for a kind in [blogs, forums, tutorials]
     """
-    contributions = get_filename_json(f'data/{kind}.json')
-    
     # id must be valid
-    validate_valid_key(
-        id, contributions, 'id_contribution',
+    contribution = get_record(
+        f'data/{kind}.json', 'id_contribution', id,
         f"Invalid id {kind[:-1]} '{id}'"
     )
 
-    # get contribution
-    contribution = list(filter(lambda c: c["id_contribution"]==id, contributions))[0]
-
     return contribution
 
 
@@ -189,7 +289,7 @@ def post_contribution(kind, contribution):
     post a new contribution for a kind in [blogs, forums, tutorials]
     """
     contribution = contribution.dict()
-    contributions = get_filename_json(f'data/{kind}.json')
+    contributions = get_index(f'data/{kind}.json', 'id_contribution')
 
     # Parsing
     contribution["id_contribution"] = str(contribution["id_contribution"])
@@ -202,14 +302,13 @@ def post_contribution(kind, contribution):
         contribution["id_contribution"], contributions, 'id_contribution',
         f"Invalid id contribution '{contribution['id_contribution']}'"
     )
-    
+
     # id_user must be valid
-    users = get_filename_json('data/users.json')
+    users = get_index('data/users.json', 'id_user')
     validate_valid_key(
         contribution["id_user"], users, 'id_user',
         f"Invalid id user '{contribution['id_user']}'"
     )
-    del users
 
     # kind must be valid
     if contribution['kind'] != kind[:-1]:
@@ -226,9 +325,8 @@ def post_contribution(kind, contribution):
         )
 
     # Save contributions
-    contributions.append(contribution)
-    write_filename_json(f'data/{kind}.json', contributions)
-    
+    insert_record(f'data/{kind}.json', contribution)
+
     return contribution
 
 
@@ -236,46 +334,44 @@ def put_contribution(kind, id, contribution):
     """
     put a contribution for a kind in [blogs, forums, tutorials]
     """
-    contributions = get_filename_json(f'data/{kind}.json')
-    
+    contributions = get_index(f'data/{kind}.json', 'id_contribution')
+
     # id_contribution must be valid
     validate_valid_key(
         id, contributions, 'id_contribution',
         f"Invalid id contribution '{id}'"
     )
 
-    contributions = list(filter(lambda c: c["id_contribution"] != id, contributions))
     contribution = contribution.dict()
     # Parsing
     contribution["id_contribution"] = str(contribution["id_contribution"])
     contribution["id_user"] = str(contribution["id_user"])
     contribution["date_publication"] = str(contribution["date_publication"])
     contribution['kind'] = contribution['kind'].value
+    contribution['id_comments'] = [str(c) for c in contribution['id_comments']]
 
     # id_contribution must be unique
     validate_unique_key(
         contribution["id_contribution"], contributions, 'id_contribution',
-        f"Invalid id contribution '{contribution['id_contribution']}'"
+        f"Invalid id contribution '{contribution['id_contribution']}'",
+        current=contributions[id]
     )
 
-    comments = get_filename_json('data/comments.json')
-    
+    comments = get_index('data/comments.json', 'id_contribution')
+
     # id_comments must be valid
-    for c in contribution['id_comments']:
-        validate_valid_key(
-            c, comments, 'id_contribution',
-            f"Invalid id answers '{c}'"
-        )
-    del comments
-    
-    users = get_filename_json('data/users.json')
+    validate_valid_keys(
+        contribution['id_comments'], comments, 'id_contribution',
+        "Invalid id answers"
+    )
+
+    users = get_index('data/users.json', 'id_user')
 
     # id_user must be valid
     validate_valid_key(
         contribution["id_user"], users, 'id_user',
         f"Invalid id user '{contribution['id_user']}'"
     )
-    del users
 
     # kind must be valid
     if contribution['kind'] != kind[:-1]:
@@ -285,8 +381,7 @@ def put_contribution(kind, id, contribution):
         )
 
     # Save contributions
-    contributions.append(contribution)
-    write_filename_json(f'data/{kind}.json', contributions)
+    update_record(f'data/{kind}.json', 'id_contribution', id, contribution)
 
     return contribution
 
@@ -295,17 +390,15 @@ def delete_contribution(kind, id):
     """
     delete a contribution for a kind in [blogs, forums, tutorials]
     """
-    contributions = get_filename_json(f'data/{kind}.json')
+    contributions = get_index(f'data/{kind}.json', 'id_contribution')
 
     # id_blog must be valid
     validate_valid_key(
-        id, contributions, f'id_{kind[:-1]}'
+        id, contributions, 'id_contribution',
         f"Invalid id {kind[:-1]} '{id}'"
     )
 
     # Save the blog
-    contribution = list(filter(lambda  c: c[f'id_{kind[:-1]}'] == id, contributions))[0]
-    contributions = list(filter(lambda  c: c[f'id_{kind[:-1]}'] != id, contributions))
-    write_filename_json(f'data/{kind}.json', contributions)
-    
+    contribution = delete_record(f'data/{kind}.json', 'id_contribution', id)
+
     return contribution
@@ -0,0 +1,171 @@
+# FastAPI
+from fastapi import HTTPException
+
+# Utils
+from utils import codec
+from utils import config
+from utils import repository
+
+
+# types of the sort key of a comment for each order
+COMMENT_KEY_TYPES = {
+    "recent": (str, str),
+    "likes": (int, str, str),
+}
+
+
+def comment_key(comment, order):
+    """
+    get the sort key of a comment for an order, recent or likes
+    """
+    if order == "likes":
+        return (comment["likes"], comment["date_publication"], comment["id_contribution"])
+    return (comment["date_publication"], comment["id_contribution"])
+
+
+# the sort key of each order, the same function for the kept groups of an order
+COMMENT_SORT_KEYS = {
+    "recent": lambda comment: comment_key(comment, "recent"),
+    "likes": lambda comment: comment_key(comment, "likes"),
+}
+
+
+class Loader:
+    """
+    load the records related to a response by their ids, the ids of a
+    collection are resolved together and every id is resolved once.
+    A loader lives for a single request
+    """
+
+    def __init__(self):
+        self.memo = {}
+        self.dependencies = set()
+
+    def load_many(self, path, key, ids):
+        """
+        get a dict from each valid id to its record, in the order of the ids
+        """
+        ids = list(ids)
+        memo = self.memo.setdefault((path, key), {})
+        missing = [i for i in ids if i not in memo]
+        if missing:
+            index = repository.get_index(path, key)
+            for i in missing:
+                memo[i] = index.get(i)
+                # the missing ids are dependencies too, they can be added later
+                self.dependencies.add((path, key, i))
+        return {i: memo[i] for i in ids if memo[i] is not None}
+
+    def load(self, path, key, id, err):
+        """
+        get the record of an id, it must be valid
+        """
+        record = self.load_many(path, key, [id]).get(id)
+        if record is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"HTTP_404_NOT_FOUND: {err}"
+            )
+        return record
+
+    def load_list(self, path, key, ids):
+        """
+        get the records of the valid ids in a list, in the same order
+        """
+        ids = list(ids)
+        records = self.load_many(path, key, ids)
+        return [records[i] for i in ids if i in records]
+
+    def join_users(self, records):
+        """
+        get a copy of the records with the user of each one
+        """
+        records = list(records)
+        users = self.load_many('data/users.json', 'id_user', (r["id_user"] for r in records))
+        return [{**r, **{"user": users[r["id_user"]]}} for r in records]
+
+    def page_comments(self, ids, order="recent", after=None, limit=None):
+        """
+        get the valid ids of some comments sorted by an order, the most recent
+        or the most liked first, at most limit of them with a sort key after
+        another one. Also gets the number of valid ids and the cursor of the
+        next page, None in the last page.
+        The comments of the ids are kept sorted, only the page is loaded
+        """
+        ids = list(ids)
+        page, total, last = repository.get_group_page(
+            'data/comments.json', order, ids, COMMENT_SORT_KEYS[order], after, limit
+        )
+        # any comment of the ids can move into the page when it changes
+        for i in ids:
+            self.dependencies.add(('data/comments.json', 'id_contribution', i))
+        self.load_many('data/comments.json', 'id_contribution', page)
+
+        cursor = None
+        if last is not None:
+            cursor = codec.encode_cursor([order, *last])
+        return page, total, cursor
+
+    def load_comments(self, ids, depth=None, breadth=None):
+        """
+        get a dict from each valid id to its comment with its user and the
+        thread of its answers, up to a depth and with the breadth most recent
+        answers of each comment, the others are counted. Each level of the
+        threads is loaded in one batch and the users of all of them in another one.
+        An answer that is also an ancestor of its comment is left out
+        """
+        depth = config.COMMENT_DEPTH if depth is None else depth
+        breadth = config.COMMENT_BREADTH if breadth is None else breadth
+
+        ids = list(ids)
+        comments = {}
+        answers = {}
+        level = ids
+        for _ in range(depth + 1):
+            # a comment is loaded once, in the first level it is found
+            level = [i for i in dict.fromkeys(level) if i not in comments]
+            if not level:
+                break
+            records = self.load_many('data/comments.json', 'id_contribution', level)
+            comments.update(records)
+
+            for i, c in records.items():
+                answers[i] = self.page_comments(c.get("id_answers") or [], limit=breadth)
+            level = [a for i in records for a in answers[i][0]]
+
+        comments = dict(zip(comments, self.join_users(comments.values())))
+
+        def thread(i, ancestors, height):
+            page, total, cursor = answers[i]
+            embedded = []
+            if height < depth:
+                ancestors = ancestors | {i}
+                embedded = [
+                    thread(a, ancestors, height + 1)
+                    for a in page if a in comments and a not in ancestors
+                ]
+            return {**comments[i], **{
+                "answers": embedded, "answers_total": total, "answers_cursor": cursor
+            }}
+
+        return {i: thread(i, frozenset(), 0) for i in ids if i in comments}
+
+    def join_comments(self, records, key="id_comments", to="comments", limit=None):
+        """
+        get a copy of the records with the limit most recent comments of the
+        ids in a key and the count of all of them, the comments in the pages
+        of all the records are loaded together
+        """
+        limit = config.EMBEDDED_COMMENTS if limit is None else limit
+        records = list(records)
+        pages = [self.page_comments(r[key], limit=limit) for r in records]
+        comments = self.load_comments(i for page, _, _ in pages for i in page)
+
+        return [
+            {**r, **{
+                to: [comments[c] for c in page if c in comments],
+                f"{to}_total": total,
+                f"{to}_cursor": cursor
+            }}
+            for r, (page, total, cursor) in zip(records, pages)
+        ]
@@ -0,0 +1,157 @@
+# Python
+import contextlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # without fcntl the locks only work inside a process
+    fcntl = None
+
+
+class RWLock:
+    """
+    a lock shared by the readers and exclusive for one writer,
+    the writer can take it again and also read while it holds it
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = None
+        self.writes = 0
+        self.waiting = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer != me:
+                # the waiting writers go first so they are not starved
+                while self.writer is not None or self.waiting:
+                    self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer != me:
+                self.waiting += 1
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+                self.waiting -= 1
+                self.writer = me
+            self.writes += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writes -= 1
+                if not self.writes:
+                    self.writer = None
+                    self.condition.notify_all()
+
+
+class ProcessLock:
+    """
+    a reentrant lock between the threads and the processes,
+    the processes share it through a lock file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.owner = None
+        self.file = None
+
+    def owned(self):
+        """
+        check if the current thread holds the lock
+        """
+        return self.owner == threading.get_ident()
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.depth += 1
+        self.owner = threading.get_ident()
+        if self.depth == 1 and fcntl is not None:
+            try:
+                self.file = open(self.path, 'a')
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                self.__exit__()
+                raise
+        return self
+
+    def __exit__(self, *args):
+        self.depth -= 1
+        if self.depth == 0:
+            self.owner = None
+            if self.file is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+                self.file.close()
+                self.file = None
+        self.lock.release()
+
+
+class SharedLock:
+    """
+    a lock between the threads and the processes that several holders
+    share, or one holds alone when it is exclusive. The processes share
+    it through a lock file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = RWLock()
+
+    @contextlib.contextmanager
+    def hold(self, exclusive=False):
+        with self.lock.write() if exclusive else self.lock.read():
+            if fcntl is None:
+                yield
+                return
+            with open(self.path, 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def get_lock(path):
+    """
+    get the lock of the read-modify-write cycles of a collection
+    """
+    lock = _locks.get(path)
+    if lock is None:
+        with _locks_lock:
+            lock = _locks.setdefault(path, ProcessLock(f'{path}.lock'))
+    return lock
+
+
+_shared_locks = {}
+
+
+def get_shared_lock(path):
+    """
+    get the shared lock of a lock file
+    """
+    lock = _shared_locks.get(path)
+    if lock is None:
+        with _locks_lock:
+            lock = _shared_locks.setdefault(path, SharedLock(path))
+    return lock
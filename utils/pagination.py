@@ -0,0 +1,199 @@
+# Python
+from typing import Optional
+
+# FastAPI
+from fastapi import HTTPException
+from fastapi import Query
+from fastapi import Request
+from fastapi import Response
+
+# Models
+from schemas.enums import CommentOrder
+
+# Utils
+from utils import codec
+from utils import config
+from utils import repository
+from utils.loader import COMMENT_KEY_TYPES
+from utils.streaming import RecordStream
+from utils.streaming import wants_stream
+
+
+def decode_cursor(cursor, *types):
+    """
+    get the values of a cursor, it must be valid and have a value of each type
+    """
+    try:
+        values = codec.decode_cursor(cursor)
+        if (
+            not isinstance(values, list) or len(values) != len(types)
+            or not all(isinstance(v, t) for v, t in zip(values, types))
+        ):
+            raise ValueError(values)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"HTTP_400_BAD_REQUEST: Invalid cursor '{cursor}'"
+        )
+    return values
+
+
+def link_next(request, response, cursor, limit):
+    """
+    set the link of the next page in the Link header
+    """
+    url = request.url.include_query_params(cursor=cursor, limit=limit)
+    response.headers['Link'] = f'<{url}>; rel="next"'
+
+
+class Page:
+    """
+    a page of a list, its records are sorted by a key, the primary key by
+    default, and the cursor has the key of the last record of the previous page,
+    so the inserted records do not move the pages.
+    The link of the next page goes in the Link header.
+    Without a limit or a cursor the list is whole, in the order of the
+    collection unless another order is asked.
+    A stream has all the records from the cursor to the end, in NDJSON
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        response: Response,
+        limit: Optional[int] = Query(
+            default=None, ge=1, le=config.PAGE_SIZE_MAX,
+            description=(
+                "records in the page, the list is paginated when a limit or a cursor is "
+                f"given, with {config.PAGE_SIZE} records by default"
+            )
+        ),
+        cursor: Optional[str] = Query(
+            default=None,
+            description="cursor of the page, from the Link header of the previous one"
+        ),
+        stream: bool = Query(
+            default=False,
+            description="send the records from the cursor to the end in NDJSON, limit records at a time"
+        )
+    ):
+        self.request = request
+        self.response = response
+        self.paginated = limit is not None or cursor is not None
+        self.limit = config.PAGE_SIZE if limit is None else limit
+        self.cursor = cursor
+        self.after = None if cursor is None else decode_cursor(cursor, str, bool, (str, int), str)
+        self.stream = wants_stream(request, stream)
+
+    def get_after(self, key, descending):
+        """
+        get the pair of the key and the primary key of the cursor, None without a cursor
+        """
+        after = None
+        if self.after is not None:
+            # a cursor only goes on with the order it was made for
+            if self.after[:2] != [key or '', descending]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"HTTP_400_BAD_REQUEST: Invalid cursor '{self.cursor}' for the order"
+                )
+            after = tuple(self.after[2:])
+        return after
+
+    def get_page(self, path, after, key, descending, query, limit):
+        try:
+            return repository.get_page(
+                path, after, limit, key=key, descending=descending, **query
+            )
+        except TypeError:
+            if after is None:
+                raise
+            # the value of the cursor is not comparable with the values of the key
+            raise HTTPException(
+                status_code=400,
+                detail=f"HTTP_400_BAD_REQUEST: Invalid cursor '{self.cursor}'"
+            )
+
+    def records(self, path, key=None, descending=False, **query):
+        """
+        get the shared records of a collection in the page, they must not be mutated.
+        The key, the order and the query are those of repository.get_page
+        """
+        if not self.paginated:
+            if key is None and not descending:
+                return repository.get_records(path, query.get("equal"), query.get("where"))
+            return self.get_page(path, None, key, descending, query, None)[0]
+
+        after = self.get_after(key, descending)
+        records, last = self.get_page(path, after, key, descending, query, self.limit)
+        if last is not None:
+            cursor = codec.encode_cursor([key or '', descending, *last])
+            link_next(self.request, self.response, cursor, self.limit)
+        return records
+
+    def stream_records(self, path, join=None, key=None, descending=False, **query):
+        """
+        get a stream of the records of a collection from the cursor to the end,
+        join(records) gets the records sent for each page of them.
+        The key, the order and the query are those of repository.get_page
+        """
+        after = self.get_after(key, descending)
+        # the first page is checked before the response starts
+        first = self.get_page(path, after, key, descending, query, self.limit)
+
+        def batches():
+            records, last = first
+            while True:
+                yield records if join is None else join(records)
+                if last is None:
+                    return
+                records, last = self.get_page(path, last, key, descending, query, self.limit)
+
+        return RecordStream(batches())
+
+
+class CommentPage:
+    """
+    a page of the comments of a record, the most recent or the most liked
+    first. The cursor has the sort key of the last comment of the previous page
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        response: Response,
+        limit: int = Query(
+            default=config.PAGE_SIZE, ge=1, le=config.PAGE_SIZE_MAX,
+            description="comments in the page"
+        ),
+        cursor: Optional[str] = Query(
+            default=None,
+            description="cursor of the page, from the Link header of the previous one or the record"
+        ),
+        order: CommentOrder = Query(
+            default=CommentOrder.recent,
+            description="order of the comments, it must be the order of the cursor"
+        )
+    ):
+        self.request = request
+        self.response = response
+        self.limit = limit
+        self.order = order.value
+        self.after = None
+        if cursor is not None:
+            values = decode_cursor(cursor, str, *COMMENT_KEY_TYPES[self.order])
+            if values[0] != self.order:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"HTTP_400_BAD_REQUEST: Invalid cursor '{cursor}' for the order '{self.order}'"
+                )
+            self.after = tuple(values[1:])
+
+    def comments(self, loader, ids):
+        """
+        get the ids of the comments in the page
+        """
+        ids, _, cursor = loader.page_comments(ids, self.order, self.after, self.limit)
+        if cursor is not None:
+            link_next(self.request, self.response, cursor, self.limit)
+        return ids
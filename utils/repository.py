@@ -0,0 +1,787 @@
+# Python
+import bisect
+import contextlib
+import contextvars
+import itertools
+import marshal
+import os
+import threading
+import time
+
+# Utils
+from utils import config
+from utils.locks import RWLock
+from utils.locks import get_lock
+from utils.storage import PRIMARY_KEYS
+from utils.storage import UNIQUE_KEYS
+from utils.storage import get_name
+from utils.storage import get_references
+from utils.storage import get_storage
+
+
+# sorted groups kept by a collection, they are dropped together when there are more
+MAX_GROUPS = 4096
+
+
+def copy_record(record):
+    """
+    get a private copy of a record, the caller can mutate it
+    """
+    return marshal.loads(marshal.dumps(record))
+
+
+_listeners = []
+
+
+def subscribe(listener):
+    """
+    call listener(path, old, record) after each change of a record,
+    old and record are None when all the data of a collection changes
+    """
+    _listeners.append(listener)
+
+
+def notify(path, old, record):
+    for listener in _listeners:
+        listener(path, old, record)
+
+
+class Change:
+    """
+    a change of a record waiting to be written with other changes,
+    op is insert, update, replace or delete. key and value find the
+    old record and record is the new one. An update moves the record
+    to the end of the collection and a replace keeps its position
+    """
+
+    def __init__(self, op, key, value, record, check=None):
+        self.op = op
+        self.key = key
+        self.value = value
+        self.record = record
+        self.check = check
+        self.old = None
+        self.error = None
+        self.done = False
+
+
+class Collection:
+    """
+    a collection kept in memory while its storage does not change,
+    the signature is the one of the last version of the data and stored
+    the last one of the storage, a compaction only changes the latter.
+    The records of a list are kept in slots in their order, so a change
+    finds its record without going through the list
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = get_name(path)
+        self.storage = get_storage()
+        self.primary_key = PRIMARY_KEYS.get(self.name)
+        self.signature = None
+        self.stored = None
+        self.modified = None
+        self.content = None
+        # slot -> record, in the order of the list, and id of a record -> its slot
+        self.slots = None
+        self.positions = {}
+        self.counter = itertools.count()
+        self.snapshot = None
+        self.indexes = {}
+        self.orders = {}
+        self.groups = {}
+        self.grouped = {}
+        self.buckets = {}
+        self.bucket_orders = {}
+        self.duplicated = set()
+        self.references = {}
+        self.version = 0
+        self.lock = RWLock()
+        self.queue = []
+        self.committing = False
+        self.condition = threading.Condition()
+
+    def refresh(self):
+        """
+        reload the collection if it changed since the last load
+        """
+        signature = self.storage.signature(self.path)
+        if signature == self.stored:
+            return self
+
+        with self.lock.write():
+            signature = self.storage.signature(self.path)
+            if signature != self.stored:
+                if self.storage.compacted(self.path, self.stored, signature):
+                    # the data did not change, its version goes on
+                    self.stored = signature
+                else:
+                    self.replace(self.storage.read(self.path), signature)
+
+        return self
+
+    def replace(self, data, signature):
+        """
+        replace the data in memory and drop the snapshot and indexes
+        """
+        notify(self.path, None, None)
+        self.content = data
+        self.slots = None
+        self.positions = {}
+        if isinstance(data, list):
+            self.slots = dict(enumerate(data))
+            self.positions = {id(record): slot for slot, record in self.slots.items()}
+            self.counter = itertools.count(len(data))
+        self.snapshot = None
+        self.indexes = {}
+        self.orders = {}
+        self.groups = {}
+        self.grouped = {}
+        self.buckets = {}
+        self.bucket_orders = {}
+        self.duplicated = set()
+        self.references = {}
+        self.signature = signature
+        self.stored = signature
+        self.modified = time.time()
+        self.version += 1
+
+        # the primary key and unique keys are indexed eagerly
+        if isinstance(data, list):
+            for key in [self.primary_key] + UNIQUE_KEYS.get(self.name, []):
+                if key:
+                    self.index(key)
+
+    @property
+    def data(self):
+        """
+        get the records of the collection in a list, it is made again after a change
+        """
+        if self.content is None and self.slots is not None:
+            self.content = list(self.slots.values())
+        return self.content
+
+    def add_slot(self, record):
+        slot = next(self.counter)
+        self.slots[slot] = record
+        self.positions[id(record)] = slot
+
+    def copy(self):
+        """
+        get a private copy of the data, the caller can mutate it
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.lock.read():
+                # marshal is only used in process, it is faster than json or pickle
+                snapshot = self.snapshot = marshal.dumps(self.data)
+        return marshal.loads(snapshot)
+
+    def index(self, key):
+        """
+        get a dict from the values of a key to its record,
+        the first record wins like in a linear scan
+        """
+        index = self.indexes.get(key)
+        if index is None:
+            index = {}
+            for record in self.data:
+                if key in record:
+                    if record[key] in index:
+                        self.duplicated.add(key)
+                    else:
+                        index[record[key]] = record
+            self.indexes[key] = index
+        return index
+
+    def order(self, key):
+        """
+        get the pairs of the value of a key and the primary key
+        of the records that have the key, sorted
+        """
+        order = self.orders.get(key)
+        if order is None:
+            order = self.orders[key] = sorted(
+                (record[key], record[self.primary_key]) for record in self.data if key in record
+            )
+        return order
+
+    def group(self, name, ids, sort_key):
+        """
+        get the pairs of sort_key(record) and the primary key of the records
+        with some ids, sorted. A group is kept for each name and ids, like
+        the comments of a record in an order, and updated like the orders
+        """
+        ids = tuple(ids)
+        group = self.groups.get((name, ids))
+        if group is None:
+            if len(self.groups) >= MAX_GROUPS:
+                self.groups = {}
+                self.grouped = {}
+            index = self.index(self.primary_key)
+            pairs = sorted((sort_key(index[i]), i) for i in set(ids) if i in index)
+            group = self.groups[(name, ids)] = (sort_key, pairs)
+            # the missing ids are in the group too, they can be added later
+            for i in ids:
+                self.grouped.setdefault(i, set()).add((name, ids))
+        return group[1]
+
+    def bucket(self, key):
+        """
+        get a dict from the values of a key to the records that have it
+        """
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = {}
+            for record in self.data:
+                if key in record:
+                    bucket.setdefault(record[key], []).append(record)
+            self.buckets[key] = bucket
+        return bucket
+
+    def bucket_order(self, key, value, sort):
+        """
+        get the pairs of the value of sort and the primary key of the records
+        with a value of a key, sorted. They are kept for each key and sort
+        and updated like the orders
+        """
+        orders = self.bucket_orders.get((key, sort))
+        if orders is None:
+            orders = self.bucket_orders[(key, sort)] = {
+                v: sorted((r[sort], r[self.primary_key]) for r in records if sort in r)
+                for v, records in self.bucket(key).items()
+            }
+        return orders.get(value, [])
+
+    def referrers(self, reference):
+        """
+        get a dict from each id in a reference, like modules.id_classes,
+        to the records that have it
+        """
+        index = self.references.get(reference)
+        if index is None:
+            index = {}
+            for record in self.data:
+                for id in dict.fromkeys(get_references(record, reference)):
+                    index.setdefault(id, []).append(record)
+            self.references[reference] = index
+        return index
+
+    def add_to_indexes(self, record):
+        """
+        index a new record in all the built indexes
+        """
+        for key, index in self.indexes.items():
+            if key in record:
+                if record[key] in index:
+                    self.duplicated.add(key)
+                else:
+                    index[record[key]] = record
+
+        for key, order in self.orders.items():
+            if key in record:
+                bisect.insort(order, (record[key], record[self.primary_key]))
+
+        for name in self.grouped.get(record.get(self.primary_key), ()):
+            group = self.groups.get(name)
+            if group is not None:
+                bisect.insort(group[1], (group[0](record), record[self.primary_key]))
+
+        for key, bucket in self.buckets.items():
+            if key in record:
+                bucket.setdefault(record[key], []).append(record)
+
+        for (key, sort), orders in self.bucket_orders.items():
+            if key in record and sort in record:
+                pair = (record[sort], record[self.primary_key])
+                bisect.insort(orders.setdefault(record[key], []), pair)
+
+        for reference, index in self.references.items():
+            for id in dict.fromkeys(get_references(record, reference)):
+                index.setdefault(id, []).append(record)
+
+    def remove_from_indexes(self, record):
+        """
+        remove a record from all the built indexes
+        """
+        for key in list(self.indexes):
+            if key not in record:
+                continue
+            if key in self.duplicated:
+                # another record could share the value, rebuild it when needed
+                del self.indexes[key]
+                self.duplicated.discard(key)
+            else:
+                self.indexes[key].pop(record[key], None)
+
+        for key, order in self.orders.items():
+            if key in record:
+                pair = (record[key], record[self.primary_key])
+                position = bisect.bisect_left(order, pair)
+                if position < len(order) and order[position] == pair:
+                    del order[position]
+
+        for name in self.grouped.get(record.get(self.primary_key), ()):
+            group = self.groups.get(name)
+            if group is not None:
+                pair = (group[0](record), record[self.primary_key])
+                position = bisect.bisect_left(group[1], pair)
+                if position < len(group[1]) and group[1][position] == pair:
+                    del group[1][position]
+
+        for key, bucket in self.buckets.items():
+            if key in record:
+                records = [r for r in bucket.get(record[key], []) if r is not record]
+                if records:
+                    bucket[record[key]] = records
+                else:
+                    bucket.pop(record[key], None)
+
+        for (key, sort), orders in self.bucket_orders.items():
+            if key in record and sort in record:
+                order = orders.get(record[key], [])
+                pair = (record[sort], record[self.primary_key])
+                position = bisect.bisect_left(order, pair)
+                if position < len(order) and order[position] == pair:
+                    del order[position]
+                if not order:
+                    orders.pop(record[key], None)
+
+        for reference, index in self.references.items():
+            for id in dict.fromkeys(get_references(record, reference)):
+                records = [r for r in index.get(id, []) if r is not record]
+                if records:
+                    index[id] = records
+                else:
+                    index.pop(id, None)
+
+    def write(self, content):
+        """
+        write the content in the storage and keep it in memory
+        """
+        with self.lock.write():
+            self.replace(content, self.storage.write(self.path, content))
+
+    def changed(self, signature):
+        """
+        keep the signature of the storage after a change in a record
+        """
+        self.snapshot = None
+        self.signature = signature
+        self.stored = signature
+        self.modified = time.time()
+        self.version += 1
+
+    def apply(self, changes):
+        """
+        apply a batch of changes and write all of them at once,
+        a change that fails its check fails alone
+        """
+        with get_lock(self.path), self.lock.write():
+            self.refresh()
+            applied = []
+            for change in changes:
+                try:
+                    if change.check is not None:
+                        change.check()
+                    self.apply_change(change)
+                    applied.append(change)
+                except Exception as e:
+                    change.error = e
+
+            if not applied:
+                return
+            try:
+                self.changed(self.storage.apply(
+                    self.path, self.data, [(c.op, c.old, c.record) for c in applied]
+                ))
+            except Exception as e:
+                # the data in memory was not written, it is loaded again
+                self.changed(None)
+                for change in applied:
+                    change.error = e
+
+    def apply_change(self, change):
+        """
+        apply a change to the data in memory
+        """
+        self.content = None
+        if change.op == 'insert':
+            self.add_slot(change.record)
+            self.add_to_indexes(change.record)
+            notify(self.path, None, change.record)
+            return
+
+        change.old = self.index(change.key)[change.value]
+        self.remove_from_indexes(change.old)
+        slot = self.positions.pop(id(change.old))
+        if change.op == 'replace':
+            self.slots[slot] = change.record
+            self.positions[id(change.record)] = slot
+        else:
+            del self.slots[slot]
+            if change.op == 'update':
+                self.add_slot(change.record)
+        if change.record is not None:
+            self.add_to_indexes(change.record)
+        notify(self.path, change.old, change.record)
+
+    def commit(self, change):
+        """
+        write a change along with the changes of the other writers,
+        the first writer writes all the changes waiting at that moment
+        """
+        if get_lock(self.path).owned():
+            # nobody else can write while the caller holds the collection
+            self.apply([change])
+        else:
+            with self.condition:
+                self.queue.append(change)
+            while True:
+                with self.condition:
+                    while self.committing and not change.done:
+                        self.condition.wait()
+                    if change.done:
+                        break
+                    self.committing = True
+
+                if config.GROUP_COMMIT_WINDOW:
+                    time.sleep(config.GROUP_COMMIT_WINDOW)
+                with self.condition:
+                    batch = self.queue[:config.GROUP_COMMIT_SIZE]
+                    del self.queue[:config.GROUP_COMMIT_SIZE]
+                try:
+                    self.apply(batch)
+                except Exception as e:
+                    for c in batch:
+                        c.error = c.error or e
+                finally:
+                    with self.condition:
+                        for c in batch:
+                            c.done = True
+                        self.committing = False
+                        self.condition.notify_all()
+
+        if change.error is not None:
+            raise change.error
+        return change
+
+    def insert(self, record, check=None):
+        """
+        add a record at the end of the collection
+        """
+        return self.commit(Change('insert', None, None, record, check)).record
+
+    def update(self, key, value, record, check=None):
+        """
+        replace the record with a value in a key,
+        the new record goes to the end of the collection
+        """
+        return self.commit(Change('update', key, value, record, check)).record
+
+    def delete(self, key, value, check=None):
+        """
+        remove the record with a value in a key
+        """
+        return self.commit(Change('delete', key, value, None, check)).old
+
+
+_collections = {}
+_collections_lock = threading.Lock()
+_recovered = set()
+
+
+def _get(path):
+    collection = _collections.get(path)
+    if collection is None:
+        with _collections_lock:
+            # the transactions interrupted by a crash are finished first
+            directory = os.path.dirname(path)
+            if directory not in _recovered:
+                get_storage().recover(directory)
+                _recovered.add(directory)
+            collection = _collections.setdefault(path, Collection(path))
+    return collection
+
+
+# the collections read in the current context, see track_reads
+_reads = contextvars.ContextVar('reads', default=())
+
+
+@contextlib.contextmanager
+def track_reads():
+    """
+    record the collections read in the current context, get a dict from the
+    path of each one to its signature and modified time when it was read.
+    The records can be nested, a read is recorded in all of them
+    """
+    reads = {}
+    token = _reads.set(_reads.get() + (reads,))
+    try:
+        yield reads
+    finally:
+        _reads.reset(token)
+
+
+def record_reads(reads):
+    """
+    record the collections read somewhere else in the current context,
+    like the ones of a response built for another request
+    """
+    for tracked in _reads.get():
+        for path, read in reads.items():
+            tracked.setdefault(path, read)
+
+
+def get_collection(path):
+    """
+    get the collection for a path, it is loaded the first time
+    """
+    collection = _get(path).refresh()
+    for reads in _reads.get():
+        if path not in reads:
+            reads[path] = (collection.signature, collection.modified)
+    return collection
+
+
+def load(path):
+    """
+    get the shared data of a collection, it must not be mutated
+    """
+    return get_collection(path).data
+
+
+def load_copy(path):
+    """
+    get a private copy of the data of a collection
+    """
+    return get_collection(path).copy()
+
+
+def get_index(path, key):
+    """
+    get the shared index of a key in a collection, it must not be mutated
+    """
+    collection = get_collection(path)
+    with collection.lock.read():
+        return collection.index(key)
+
+
+def bisect_value(order, value, right=False):
+    """
+    get the position of the first pair of an order with a value
+    from a value, or over it when right is True
+    """
+    low, high = 0, len(order)
+    while low < high:
+        middle = (low + high) // 2
+        if order[middle][0] < value or (right and order[middle][0] == value):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def get_page(
+    path, after=None, limit=None, key=None, descending=False,
+    low=None, high=None, equal=None, where=None
+):
+    """
+    get the shared records of a collection sorted by a key, the primary key
+    by default, they must not be mutated. The records have a value of the key
+    from low to high, the values in equal and pass the where check.
+    At most limit of them after a pair of the value of the key and the
+    primary key are taken, the pair of the last one is returned too when
+    there are more records
+    """
+    collection = get_collection(path)
+    with collection.lock.read():
+        primary = collection.primary_key
+        key = key or primary
+        index = collection.index(primary)
+        if equal:
+            # the smallest bucket goes instead of the whole order
+            order = min((collection.bucket_order(k, v, key) for k, v in equal.items()), key=len)
+        else:
+            order = collection.order(key)
+
+        start = 0 if low is None else bisect_value(order, low)
+        end = len(order) if high is None else bisect_value(order, high, right=True)
+        if after is not None:
+            if descending:
+                end = min(end, bisect.bisect_left(order, after))
+            else:
+                start = max(start, bisect.bisect_right(order, after))
+
+        records = []
+        last = None
+        positions = range(end - 1, start - 1, -1) if descending else range(start, end)
+        for position in positions:
+            record = index[order[position][1]]
+            if equal and any(record.get(k) != v for k, v in equal.items()):
+                continue
+            if where is not None and not where(record):
+                continue
+            if limit is not None and len(records) == limit:
+                last = (records[-1][key], records[-1][primary])
+                break
+            records.append(record)
+        return records, last
+
+
+def get_group_page(path, name, ids, sort_key, after=None, limit=None):
+    """
+    get the primary keys of the records of a collection with some ids sorted
+    by sort_key(record), the greatest first. At most limit of them with a sort
+    key under after are taken. Also gets the number of records and the sort
+    key of the last one when there are more
+    """
+    collection = get_collection(path)
+    with collection.lock.read():
+        pairs = collection.group(name, ids, sort_key)
+        # a sort key alone goes before the pairs with it
+        end = len(pairs) if after is None else bisect.bisect_left(pairs, (after,))
+        start = 0 if limit is None else max(end - limit, 0)
+        page = pairs[start:end]
+        last = page[0][0] if page and start > 0 else None
+        return [i for _, i in reversed(page)], len(pairs), last
+
+
+def get_records(path, equal=None, where=None):
+    """
+    get the shared records of a collection in its order, they must not be
+    mutated. The records have the values in equal and pass the where check
+    """
+    collection = get_collection(path)
+    with collection.lock.read():
+        records = collection.data
+    if equal:
+        records = [r for r in records if all(r.get(k) == v for k, v in equal.items())]
+    if where is not None:
+        records = [r for r in records if where(r)]
+    return records
+
+
+def save(path, content):
+    """
+    write the content of a collection, the collection takes ownership of it
+    """
+    _get(path).write(content)
+
+
+def get_referrers(path, reference, id):
+    """
+    get the shared records of a collection with an id in a reference,
+    they must not be mutated
+    """
+    collection = get_collection(path)
+    with collection.lock.read():
+        return list(collection.referrers(reference).get(id, []))
+
+
+class Transaction:
+    """
+    changes to several collections that are written together,
+    only the readers of these collections wait for them
+    """
+
+    def __init__(self):
+        self.contents = {}
+        self.changes = {}
+
+    def write(self, path, content):
+        """
+        replace all the content of a collection
+        """
+        self.contents[path] = content
+
+    def insert(self, path, record):
+        """
+        add a record at the end
+        """
+        self.changes.setdefault(path, []).append(Change('insert', None, None, record))
+
+    def update(self, path, key, value, record):
+        """
+        replace the record with a value in a key, in the same position
+        """
+        self.changes.setdefault(path, []).append(Change('replace', key, value, record))
+
+    def delete(self, path, key, value):
+        """
+        remove the record with a value in a key
+        """
+        self.changes.setdefault(path, []).append(Change('delete', key, value, None))
+
+    def commit(self):
+        paths = sorted({*self.contents, *self.changes})
+        if not paths:
+            return
+        collections = [_get(path) for path in paths]
+        with contextlib.ExitStack() as stack:
+            # the locks are taken in order so two transactions can not deadlock
+            for collection in collections:
+                stack.enter_context(get_lock(collection.path))
+                stack.enter_context(collection.lock.write())
+
+            try:
+                batch = {}
+                for collection in collections:
+                    if collection.path in self.contents:
+                        batch[collection.path] = (self.contents[collection.path], None)
+                        continue
+                    collection.refresh()
+                    changes = self.changes[collection.path]
+                    for change in changes:
+                        collection.apply_change(change)
+                    batch[collection.path] = (
+                        collection.data, [(c.op, c.old, c.record) for c in changes]
+                    )
+                signatures = get_storage().apply_many(batch)
+            except Exception:
+                # the data in memory was not written, it is loaded again
+                for collection in collections:
+                    collection.changed(None)
+                raise
+
+            for collection in collections:
+                if collection.path in self.contents:
+                    collection.replace(self.contents[collection.path], signatures[collection.path])
+                else:
+                    collection.changed(signatures[collection.path])
+
+
+@contextlib.contextmanager
+def locked(*paths):
+    """
+    hold several collections for a read-modify-write cycle, the other
+    cycles over them wait for it in this and in the other processes
+    while the readers go on with the last written data
+    """
+    with contextlib.ExitStack() as stack:
+        # the locks are taken in order so two cycles can not deadlock
+        for path in sorted(set(paths)):
+            stack.enter_context(get_lock(path))
+        yield
+
+
+def insert(path, record, check=None):
+    """
+    add a record to a collection, check runs just before it is added
+    """
+    return _get(path).insert(record, check)
+
+
+def update(path, key, value, record):
+    """
+    replace the record with a value in a key of a collection
+    """
+    return _get(path).update(key, value, record)
+
+
+def delete(path, key, value):
+    """
+    remove the record with a value in a key of a collection
+    """
+    return _get(path).delete(key, value)
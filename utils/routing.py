@@ -0,0 +1,165 @@
+# Python
+import asyncio
+import functools
+
+# FastAPI
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+
+# Pydantic
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
+
+# Utils
+from utils.executor import run_io
+from utils.streaming import RecordStream
+
+
+def parse_fields(fields):
+    """
+    get the names in a comma separated list of fields, None for all the fields
+    """
+    if fields is None:
+        return None
+    return [f.strip() for f in fields.split(',') if f.strip()] or None
+
+
+def get_projection(field):
+    """
+    get a function that keeps only the keys of a response field in a value,
+    like the response model does but without validating the value again
+    """
+    project = get_model_projection(field.type_) if is_model(field.type_) else None
+    if field.shape == SHAPE_SINGLETON:
+        if project is None:
+            return lambda value: value
+        return lambda value: None if value is None else project(value)
+
+    if project is None:
+        return lambda value: value
+    return lambda value: None if value is None else [project(v) for v in value]
+
+
+def is_model(type_):
+    return isinstance(type_, type) and issubclass(type_, BaseModel)
+
+
+@functools.lru_cache(maxsize=None)
+def get_model_projection(model):
+    """
+    get a function that keeps only the fields of a model in a dict,
+    the missing fields get their default value
+    """
+    fields = []
+    for name, field in model.__fields__.items():
+        # the projections of a model are made when they are first used
+        # so a model can be nested in itself
+        fields.append((name, field, field.alias, lambda f=field: get_projection(f)))
+
+    projections = {}
+
+    def project(value, only=None):
+        if isinstance(value, BaseModel):
+            value = value.dict(by_alias=True)
+        content = {}
+        for name, field, alias, get in fields:
+            if only is not None and alias not in only:
+                continue
+            if alias in value:
+                projection = projections.get(name)
+                if projection is None:
+                    projection = projections[name] = get()
+                content[alias] = projection(value[alias])
+            else:
+                content[alias] = field.get_default()
+        return content
+
+    return project
+
+
+class TrustedRoute(APIRoute):
+    """
+    a route that does not validate the response of a GET again,
+    its response model only selects the keys of the response.
+    The data comes from the store and it was validated when it was written.
+    A fields parameter of the path operation selects the top level keys,
+    and a RecordStream returned by a list is sent as NDJSON
+    """
+
+    def get_route_handler(self):
+        call = self.dependant.call
+        if (
+            self.response_field is not None and 'GET' in self.methods
+            and not getattr(call, 'trusted', False)
+        ):
+            project = get_projection(self.response_field)
+            project_model = None
+            if self.response_field.shape == SHAPE_SINGLETON and is_model(self.response_field.type_):
+                project_model = get_model_projection(self.response_field.type_)
+            # each record of a stream has the type of the items of the list
+            project_item = lambda value: value
+            if self.response_field.shape != SHAPE_SINGLETON and is_model(self.response_field.type_):
+                project_item = get_model_projection(self.response_field.type_)
+            response_class = self.response_class
+            if isinstance(response_class, DefaultPlaceholder):
+                response_class = response_class.value
+            status_code = self.status_code or 200
+
+            # the headers set in the response parameter by the path operation
+            # or its dependencies are kept, like FastAPI does
+            response_param = self.dependant.response_param_name
+            if response_param is None:
+                self.dependant.response_param_name = '_trusted_response'
+
+            def prepare(kwargs):
+                if response_param is None:
+                    sub_response = kwargs.pop('_trusted_response')
+                else:
+                    sub_response = kwargs[response_param]
+                return sub_response, parse_fields(kwargs.get('fields'))
+
+            def respond(content, sub_response, fields):
+                if isinstance(content, Response):
+                    return content
+                if isinstance(content, RecordStream):
+                    response = content.response(
+                        project_item, status_code=sub_response.status_code or status_code
+                    )
+                    response.headers.raw.extend(sub_response.headers.raw)
+                    return response
+                if fields is not None and project_model is not None and content is not None:
+                    content = project_model(content, only=fields)
+                else:
+                    content = project(content)
+                response = response_class(
+                    content=content, status_code=sub_response.status_code or status_code
+                )
+                response.headers.raw.extend(sub_response.headers.raw)
+                return response
+
+            offloaded = getattr(call, 'offloaded', None)
+            if offloaded is not None:
+                # the response is made in the i/o threads along with the path operation
+                @functools.wraps(call)
+                async def trusted(*args, **kwargs):
+                    sub_response, fields = prepare(kwargs)
+
+                    def run():
+                        return respond(offloaded(*args, **kwargs), sub_response, fields)
+
+                    return await run_io(run)
+            elif asyncio.iscoroutinefunction(call):
+                @functools.wraps(call)
+                async def trusted(*args, **kwargs):
+                    sub_response, fields = prepare(kwargs)
+                    return respond(await call(*args, **kwargs), sub_response, fields)
+            else:
+                @functools.wraps(call)
+                def trusted(*args, **kwargs):
+                    sub_response, fields = prepare(kwargs)
+                    return respond(call(*args, **kwargs), sub_response, fields)
+
+            trusted.trusted = True
+            self.dependant.call = trusted
+        return super().get_route_handler()
@@ -0,0 +1,739 @@
+# Python
+import os
+import sqlite3
+import threading
+import uuid
+
+# Utils
+from utils import codec
+from utils import config
+from utils.locks import get_lock
+from utils.locks import get_shared_lock
+
+
+# primary key of the records in each collection
+PRIMARY_KEYS = {
+    'courses': 'id_course',
+    'classes': 'id_class',
+    'routes': 'id_route',
+    'categories': 'id_category',
+    'comments': 'id_contribution',
+    'blogs': 'id_contribution',
+    'forums': 'id_contribution',
+    'tutorials': 'id_contribution',
+    'users': 'id_user',
+    'teachers': 'id_teacher',
+    'projects': 'id_project',
+    'glossary': 'id_glossary',
+}
+
+# keys indexed along with the primary key
+UNIQUE_KEYS = {
+    'courses': ['name'],
+    'classes': ['name'],
+    'routes': ['name'],
+    'categories': ['name'],
+}
+
+
+def get_name(path):
+    """
+    get the name of a collection from its path, data/courses.json -> courses
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def get_references(record, reference):
+    """
+    get the ids in a reference of a record, like modules.id_classes
+    """
+    values = [record]
+    for key in reference.split('.'):
+        values = [
+            v for value in values if isinstance(value, dict)
+            for v in (value.get(key) or [])
+        ]
+    return values
+
+
+class JsonStorage:
+    """
+    store each collection in its json file, every write rewrites the file
+    """
+
+    fsync = config.FSYNC
+
+    def signature(self, path):
+        """
+        get the signature of the file, its mtime and size
+        """
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def compacted(self, path, old, new):
+        """
+        check if the storage of a collection only changed from a signature to
+        another one by a compaction, its data is the same
+        """
+        return False
+
+    def read(self, path):
+        """
+        read all the data of a collection
+        """
+        with open(path, 'rb') as f:
+            return codec.loads(f.read())
+
+    def write(self, path, content):
+        """
+        write all the data of a collection and return its new signature,
+        the file is replaced by a complete one so a reader or a crash
+        never sees it half written
+        """
+        directory = os.path.dirname(path)
+        temp = f'{path}.{uuid.uuid4().hex}.txn'
+        # the recovery drops the temporal files left by a crash
+        with self.transactions(directory):
+            self.write_temp(temp, content)
+            self.install(path, temp)
+            self.sync_directory(directory)
+        return self.signature(path)
+
+    def apply(self, path, data, changes):
+        """
+        write a batch of changes to a collection, each one is a tuple
+        (op, old, record) with op in insert, update, replace or delete
+        """
+        return self.write(path, data)
+
+    def apply_many(self, batch):
+        """
+        write the changes of several collections together, the batch maps
+        each path to its data and its changes, or None to write all the data
+        """
+        return self.write_many({path: data for path, (data, changes) in batch.items()})
+
+    def write_temp(self, temp, content):
+        """
+        write a json file that is renamed later
+        """
+        with open(temp, 'wb') as f:
+            f.write(codec.dumps_bytes(content))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def sync_directory(self, directory):
+        """
+        flush the renames in a directory to the disk
+        """
+        if self.fsync and os.name == 'posix':
+            fd = os.open(directory or '.', os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def install(self, path, temp):
+        """
+        replace the file of a collection with a temporal file
+        """
+        os.replace(temp, path)
+
+    def transactions(self, directory, exclusive=False):
+        """
+        hold the transactions of a directory, the live transactions share
+        it and the recovery holds it alone so it never sees one of them
+        """
+        return get_shared_lock(os.path.join(directory or '.', '.transactions.lock')).hold(exclusive)
+
+    def write_many(self, contents):
+        """
+        write the data of several collections, after a crash all of them
+        or none of them are written. Return the new signature of each one
+        """
+        transaction = uuid.uuid4().hex
+        directory = os.path.dirname(next(iter(contents)))
+        temps = {path: f'{path}.{transaction}.txn' for path in contents}
+        with self.transactions(directory):
+            for path, content in contents.items():
+                self.write_temp(temps[path], content)
+
+            self.commit(directory, transaction, {
+                "files": temps, "signatures": self.signatures(contents)
+            })
+        return {path: self.signature(path) for path in contents}
+
+    def signatures(self, paths):
+        """
+        get the signature of each collection before a transaction, None when
+        its file does not exist. The writers hold the collections meanwhile
+        """
+        signatures = {}
+        for path in paths:
+            try:
+                signatures[path] = list(self.signature(path))
+            except FileNotFoundError:
+                signatures[path] = None
+        return signatures
+
+    def unchanged(self, path, content):
+        """
+        check if a collection was not written since a transaction was committed,
+        a transaction left by a crash never goes over the newer writes of the
+        live processes. A transaction without signatures is always finished
+        """
+        signatures = content.get("signatures", {})
+        if path not in signatures:
+            return True
+        return self.signatures([path])[path] == signatures[path]
+
+    def commit(self, directory, transaction, content):
+        """
+        write the marker of a transaction and finish it,
+        the transaction is committed once its marker is in the disk
+        """
+        marker = os.path.join(directory, f'.{transaction}.commit')
+        self.write_temp(f'{marker}.tmp', content)
+        os.replace(f'{marker}.tmp', marker)
+        self.sync_directory(directory)
+        self.finish(marker, content)
+
+    def finish(self, marker, content):
+        """
+        install the files of a committed transaction and drop its marker,
+        the files written after the transaction keep their data
+        """
+        for path, temp in content.get("files", {}).items():
+            if os.path.exists(temp):
+                if self.unchanged(path, content):
+                    self.install(path, temp)
+                else:
+                    os.remove(temp)
+        self.sync_directory(os.path.dirname(marker))
+        try:
+            os.remove(marker)
+        except FileNotFoundError:
+            pass
+
+    def recover(self, directory):
+        """
+        finish the transactions committed before a crash and
+        drop the files of the ones that were not committed.
+        It waits for the live transactions of every process, so
+        the transactions left are the ones of a crashed process
+        """
+        with self.transactions(directory, exclusive=True):
+            for name in os.listdir(directory):
+                if name.endswith('.commit'):
+                    marker = os.path.join(directory, name)
+                    with open(marker, 'rb') as f:
+                        self.finish(marker, codec.loads(f.read()))
+
+            for name in os.listdir(directory):
+                if name.endswith('.txn') or name.endswith('.commit.tmp'):
+                    os.remove(os.path.join(directory, name))
+
+
+def replay(data, entries, primary_key):
+    """
+    apply the entries of a journal to the data of a collection,
+    the records are matched by primary key so replaying twice is harmless
+    """
+    records = {record.get(primary_key): record for record in data}
+    if len(records) != len(data):
+        # the primary key is not unique, apply the entries on the list
+        for entry in entries:
+            if entry['op'] == 'replace':
+                for i, r in enumerate(data):
+                    if r.get(primary_key) == entry['value']:
+                        data[i] = entry['record']
+                        break
+                continue
+            if entry['op'] in ('update', 'delete'):
+                data = [r for r in data if r.get(primary_key) != entry['value']]
+            if entry['op'] in ('insert', 'update'):
+                id = entry['record'].get(primary_key)
+                data = [r for r in data if r.get(primary_key) != id]
+                data.append(entry['record'])
+        return data
+
+    for entry in entries:
+        if entry['op'] == 'replace' and entry['record'].get(primary_key) == entry['value']:
+            # the record keeps its position
+            records[entry['value']] = entry['record']
+            continue
+        if entry['op'] in ('update', 'replace', 'delete'):
+            records.pop(entry['value'], None)
+        if entry['op'] in ('insert', 'update', 'replace'):
+            id = entry['record'].get(primary_key)
+            records.pop(id, None)
+            records[id] = entry['record']
+    return list(records.values())
+
+
+class JournalStorage(JsonStorage):
+    """
+    store each collection in its json file plus an append-only journal,
+    a write only appends the changed record to the journal and the
+    journal is folded back into the json file in the background
+    """
+
+    def __init__(self, compact_size=config.JOURNAL_COMPACT_SIZE, fsync=config.FSYNC):
+        self.compact_size = compact_size
+        self.fsync = fsync
+        self.locks = {}
+        self.compacting = set()
+        self.lock = threading.Lock()
+
+    def journal(self, path):
+        return f'{path}.journal'
+
+    def compaction(self, path):
+        return f'{path}.compacted'
+
+    def path_lock(self, path):
+        """
+        get the lock for the journal of a collection
+        """
+        lock = self.locks.get(path)
+        if lock is None:
+            with self.lock:
+                lock = self.locks.setdefault(path, threading.Lock())
+        return lock
+
+    def files(self, path, exclusive=False):
+        """
+        hold the json file and the journal of a collection, the readers share
+        it and a compaction holds it alone while it replaces both of them
+        """
+        return get_shared_lock(f'{path}.files.lock').hold(exclusive)
+
+    def signature(self, path):
+        """
+        get the signature of the file and its journal
+        """
+        st = os.stat(path)
+        try:
+            journal = os.stat(self.journal(path))
+            return (st.st_mtime_ns, st.st_size, journal.st_mtime_ns, journal.st_size)
+        except FileNotFoundError:
+            return (st.st_mtime_ns, st.st_size, 0, 0)
+
+    def compacted(self, path, old, new):
+        """
+        check if the storage of a collection only changed from a signature to
+        another one by a compaction, the last compaction is kept in a file
+        """
+        if old is None:
+            return False
+        try:
+            with open(self.compaction(path), 'rb') as f:
+                folded = codec.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return False
+        return folded == {"from": list(old), "to": list(new)}
+
+    def read_journal(self, path, size=None):
+        """
+        read the entries of a journal, a torn last line is ignored
+        """
+        try:
+            with open(self.journal(path), 'rb') as f:
+                content = f.read() if size is None else f.read(size)
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        for line in content.split(b'\n'):
+            if not line.strip():
+                continue
+            try:
+                entries.append(codec.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def read(self, path):
+        """
+        read the json file and apply its journal, a compaction never
+        replaces them between both reads
+        """
+        with self.files(path):
+            data = super().read(path)
+            entries = self.read_journal(path)
+        if entries and isinstance(data, list):
+            data = replay(data, entries, PRIMARY_KEYS.get(get_name(path)))
+        return data
+
+    def write(self, path, content):
+        """
+        write all the data of a collection in its json file,
+        the file is replaced atomically and the journal is emptied
+        """
+        return self.write_many({path: content})[path]
+
+    def install(self, path, temp):
+        """
+        replace the json file of a collection and empty its journal,
+        the journal goes first so it is never applied to the new file
+        """
+        with self.path_lock(path), self.files(path, exclusive=True):
+            try:
+                os.remove(self.journal(path))
+            except FileNotFoundError:
+                pass
+            os.replace(temp, path)
+
+    def append(self, path, entries):
+        """
+        append entries to the journal of a collection
+        """
+        lines = b''.join(codec.dumps_bytes(e) + b'\n' for e in entries)
+        with self.path_lock(path):
+            with open(self.journal(path), 'ab+') as f:
+                # a torn last line must not swallow the new entries
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        lines = b'\n' + lines
+                f.write(lines)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                size = f.tell()
+            signature = self.signature(path)
+
+        if size > max(self.compact_size, signature[1]):
+            self.compact_later(path)
+        return signature
+
+    def entries(self, path, changes):
+        """
+        get the journal entries for a batch of changes
+        """
+        primary_key = PRIMARY_KEYS[get_name(path)]
+        entries = []
+        for op, old, record in changes:
+            if op == 'insert':
+                entries.append({"op": op, "record": record})
+            elif op == 'delete':
+                entries.append({"op": op, "value": old.get(primary_key)})
+            else:
+                entries.append({"op": op, "value": old.get(primary_key), "record": record})
+        return entries
+
+    def apply(self, path, data, changes):
+        """
+        append a batch of changes to the journal with a single flush
+        """
+        if PRIMARY_KEYS.get(get_name(path)) is None:
+            return self.write(path, data)
+        return self.append(path, self.entries(path, changes))
+
+    def apply_many(self, batch):
+        """
+        append the changes of several collections to their journals, the
+        entries go first in the marker of the transaction so they are
+        appended again after a crash
+        """
+        if any(
+            changes is None or PRIMARY_KEYS.get(get_name(path)) is None
+            for path, (data, changes) in batch.items()
+        ):
+            return super().apply_many(batch)
+
+        entries = {path: self.entries(path, changes) for path, (data, changes) in batch.items()}
+        directory = os.path.dirname(next(iter(batch)))
+        with self.transactions(directory):
+            self.commit(directory, uuid.uuid4().hex, {
+                "entries": entries, "signatures": self.signatures(batch)
+            })
+        return {path: self.signature(path) for path in batch}
+
+    def finish(self, marker, content):
+        """
+        append the entries of a committed transaction and drop its marker,
+        the entries of a journal that changed since were already appended
+        or they would go over newer writes
+        """
+        for path, entries in content.get("entries", {}).items():
+            if self.unchanged(path, content):
+                self.append(path, entries)
+        super().finish(marker, content)
+
+    def compact_later(self, path):
+        """
+        fold the journal of a collection in a background thread
+        """
+        with self.lock:
+            if path in self.compacting:
+                return
+            self.compacting.add(path)
+        threading.Thread(target=self.compact, args=(path,), daemon=True).start()
+
+    def compact(self, path):
+        """
+        fold the journal into the json file, the entries appended
+        while the json file is written stay in the journal
+        """
+        try:
+            try:
+                size = os.path.getsize(self.journal(path))
+                st = os.stat(path)
+            except FileNotFoundError:
+                return
+            data = replay(
+                JsonStorage.read(self, path), self.read_journal(path, size),
+                PRIMARY_KEYS.get(get_name(path))
+            )
+            temp = f'{path}.{uuid.uuid4().hex}.compact'
+            self.write_temp(temp, data)
+
+            # the writers of the other processes only append under the lock of the collection
+            with get_lock(path), self.path_lock(path):
+                # the json file was written meanwhile, this compaction is stale
+                current = os.stat(path)
+                if (current.st_mtime_ns, current.st_size) != (st.st_mtime_ns, st.st_size):
+                    os.remove(temp)
+                    return
+                before = self.signature(path)
+                with open(self.journal(path), 'rb') as f:
+                    f.seek(size)
+                    rest = f.read()
+                journal = f'{self.journal(path)}.tmp'
+                with open(journal, 'wb') as f:
+                    f.write(rest)
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                # a reader between both renames would miss the folded entries
+                with self.files(path, exclusive=True):
+                    os.replace(temp, path)
+                    os.replace(journal, self.journal(path))
+
+                # the collections loaded before go on with the same data
+                folded = f'{self.compaction(path)}.tmp'
+                with open(folded, 'wb') as f:
+                    f.write(codec.dumps_bytes({"from": before, "to": self.signature(path)}))
+                os.replace(folded, self.compaction(path))
+        finally:
+            with self.lock:
+                self.compacting.discard(path)
+
+
+class SqliteStorage:
+    """
+    store each collection in a table of a sqlite database,
+    the json files are only read to fill an empty table
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.local = threading.local()
+        self.tables = set()
+        self.lock = threading.Lock()
+
+    def connection(self):
+        """
+        get the connection of the current thread
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.database, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS versions ('
+                'name TEXT PRIMARY KEY, version INTEGER NOT NULL)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                'name TEXT PRIMARY KEY, document TEXT NOT NULL)'
+            )
+            connection.commit()
+            self.local.connection = connection
+        return connection
+
+    def table(self, path):
+        """
+        get the table of a collection, it is created and filled the first time
+        """
+        name = get_name(path)
+        if name in self.tables:
+            return name
+
+        with self.lock:
+            connection = self.connection()
+            # the lookups by key are served by the indexes in memory,
+            # the table only finds the row of a changed record by its id
+            with connection:
+                connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" ('
+                    'position INTEGER PRIMARY KEY, id TEXT, document TEXT NOT NULL)'
+                )
+                connection.execute(f'CREATE INDEX IF NOT EXISTS "{name}_id" ON "{name}" (id)')
+
+            # fill the table with the json file the first time
+            version = connection.execute(
+                'SELECT version FROM versions WHERE name = ?', (name,)
+            ).fetchone()
+            if version is None:
+                content = JsonStorage().read(path) if os.path.exists(path) else []
+                with connection:
+                    self.replace(connection, name, content)
+
+            self.tables.add(name)
+        return name
+
+    def bump(self, connection, name):
+        """
+        increase the version of a collection in the current transaction
+        """
+        connection.execute(
+            'INSERT INTO versions (name, version) VALUES (?, 1) '
+            'ON CONFLICT (name) DO UPDATE SET version = version + 1',
+            (name,)
+        )
+        return connection.execute(
+            'SELECT version FROM versions WHERE name = ?', (name,)
+        ).fetchone()[0]
+
+    def add(self, connection, name, record, position=None):
+        """
+        insert a record at the end of a table or in a position
+        """
+        connection.execute(
+            f'INSERT INTO "{name}" (position, id, document) VALUES (?, ?, ?)',
+            (position, record.get(PRIMARY_KEYS.get(name)), codec.dumps(record))
+        )
+
+    def remove(self, connection, name, old):
+        """
+        delete the first row of a table with the same record,
+        return its position
+        """
+        document = codec.dumps(old)
+        rows = connection.execute(
+            f'SELECT position, document FROM "{name}" WHERE id IS ? ORDER BY position',
+            (old.get(PRIMARY_KEYS.get(name)),)
+        ).fetchall()
+        for position, row in rows:
+            if row == document or codec.loads(row) == old:
+                connection.execute(f'DELETE FROM "{name}" WHERE position = ?', (position,))
+                return position
+
+    def change(self, connection, name, op, old, record):
+        """
+        apply a change of a record to a table
+        """
+        position = None
+        if op != 'insert':
+            position = self.remove(connection, name, old)
+        if op == 'update':
+            # the record goes to the end of the table
+            position = None
+        if op != 'delete':
+            self.add(connection, name, record, position)
+
+    def replace(self, connection, name, content):
+        """
+        replace all the rows of a table
+        """
+        connection.execute(f'DELETE FROM "{name}"')
+        if isinstance(content, list):
+            connection.execute('DELETE FROM documents WHERE name = ?', (name,))
+            for record in content:
+                self.add(connection, name, record)
+        else:
+            connection.execute(
+                'INSERT OR REPLACE INTO documents (name, document) VALUES (?, ?)',
+                (name, codec.dumps(content))
+            )
+        return self.bump(connection, name)
+
+    def signature(self, path):
+        """
+        get the version of a collection, it changes with every write
+        """
+        name = self.table(path)
+        return self.connection().execute(
+            'SELECT version FROM versions WHERE name = ?', (name,)
+        ).fetchone()[0]
+
+    def compacted(self, path, old, new):
+        """
+        check if a collection only changed by a compaction, the versions only change with the data
+        """
+        return False
+
+    def read(self, path):
+        """
+        read all the data of a collection
+        """
+        name = self.table(path)
+        connection = self.connection()
+        document = connection.execute(
+            'SELECT document FROM documents WHERE name = ?', (name,)
+        ).fetchone()
+        if document is not None:
+            return codec.loads(document[0])
+        return [
+            codec.loads(row[0]) for row in
+            connection.execute(f'SELECT document FROM "{name}" ORDER BY position')
+        ]
+
+    def write(self, path, content):
+        name = self.table(path)
+        connection = self.connection()
+        with connection:
+            return self.replace(connection, name, content)
+
+    def apply(self, path, data, changes):
+        name = self.table(path)
+        connection = self.connection()
+        with connection:
+            for op, old, record in changes:
+                self.change(connection, name, op, old, record)
+            return self.bump(connection, name)
+
+    def apply_many(self, batch):
+        names = {path: self.table(path) for path in batch}
+        connection = self.connection()
+        signatures = {}
+        with connection:
+            for path, (data, changes) in batch.items():
+                if changes is None:
+                    signatures[path] = self.replace(connection, names[path], data)
+                    continue
+                for op, old, record in changes:
+                    self.change(connection, names[path], op, old, record)
+                signatures[path] = self.bump(connection, names[path])
+        return signatures
+
+    def recover(self, directory):
+        # sqlite recovers its own transactions
+        pass
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """
+    get the storage engine configured in config.STORAGE
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if config.STORAGE == 'sqlite':
+                    _storage = SqliteStorage(config.SQLITE_PATH)
+                elif config.STORAGE == 'journal':
+                    _storage = JournalStorage()
+                elif config.STORAGE == 'json':
+                    _storage = JsonStorage()
+                else:
+                    raise ValueError(f"Invalid storage engine '{config.STORAGE}'")
+    return _storage
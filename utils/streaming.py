@@ -0,0 +1,52 @@
+# FastAPI
+from fastapi.responses import StreamingResponse
+
+# Utils
+from utils import codec
+from utils.executor import run_io
+
+
+# media type of the streamed lists, a json document in each line
+NDJSON = "application/x-ndjson"
+
+
+def wants_stream(request, stream=False):
+    """
+    check if a request asks for a list as a stream,
+    with the stream parameter or the NDJSON media type
+    """
+    return stream or NDJSON in request.headers.get("accept", "")
+
+
+class RecordStream:
+    """
+    the records of a list sent as NDJSON as they are made, batches is an
+    iterable of lists of records and each list is made when the previous
+    one was sent, so only one of them is in memory
+    """
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def next_lines(self, batches, project):
+        # a batch goes in a single chunk of the body
+        batch = next(batches, None)
+        if batch is None:
+            return None
+        return b"".join(codec.dumps_bytes(project(record)) + b"\n" for record in batch)
+
+    async def lines(self, project):
+        batches = iter(self.batches)
+        while True:
+            # the records are read and joined in the i/o threads
+            chunk = await run_io(self.next_lines, batches, project)
+            if chunk is None:
+                return
+            yield chunk
+
+    def response(self, project, status_code=200):
+        """
+        get the streaming response of the records,
+        project(record) gets the content of each one
+        """
+        return StreamingResponse(self.lines(project), status_code=status_code, media_type=NDJSON)
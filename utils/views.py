@@ -0,0 +1,96 @@
+# Python
+import threading
+
+# Utils
+from utils import repository
+from utils.loader import Loader
+
+
+class Views:
+    """
+    documents built from the records of several collections, each one is
+    kept until a record it was built from changes. build(key, loader)
+    makes the document of a key, every record it loads with the loader
+    becomes a dependency of the document
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.documents = {}
+        self.dependents = {}
+        self.keys = {}
+        self.generations = {}
+        self.lock = threading.Lock()
+        repository.subscribe(self.changed)
+
+    def get(self, key):
+        """
+        get the document of a key, it is built when it is not kept.
+        The document is shared so it must not be mutated
+        """
+        content = self.cached(key)
+        if content is not None:
+            return content
+
+        with self.lock:
+            generations = dict(self.generations)
+        loader = Loader()
+        content = self.build(key, loader)
+
+        with self.lock:
+            paths = {path for path, _, _ in loader.dependencies}
+            # a document built while its collections changed can be stale
+            if all(self.generations.get(p, 0) == generations.get(p, 0) for p in paths):
+                self.drop(key)
+                self.documents[key] = (content, paths, loader.dependencies)
+                for dependency in loader.dependencies:
+                    self.dependents.setdefault(dependency, set()).add(key)
+                    self.keys.setdefault(dependency[0], set()).add(dependency[1])
+        return content
+
+    def cached(self, key):
+        """
+        get the document of a key when it is kept, None otherwise
+        """
+        document = self.documents.get(key)
+        if document is not None:
+            # the collections changed by other processes are loaded again,
+            # that drops the documents built from them
+            for path in document[1]:
+                repository.get_collection(path)
+            document = self.documents.get(key)
+        return None if document is None else document[0]
+
+    def changed(self, path, old, record):
+        """
+        drop the documents built from a changed record
+        """
+        with self.lock:
+            # nothing was built from a collection before it was first loaded
+            self.generations[path] = self.generations.get(path, -1) + 1
+            if old is None and record is None:
+                dependencies = [d for d in self.dependents if d[0] == path]
+            else:
+                dependencies = [
+                    (path, key, r[key])
+                    for key in self.keys.get(path, ())
+                    for r in (old, record) if r is not None and key in r
+                ]
+
+            for dependency in dependencies:
+                for key in list(self.dependents.get(dependency, ())):
+                    self.drop(key)
+
+    def drop(self, key):
+        """
+        drop the document of a key from all its dependencies
+        """
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        for dependency in document[2]:
+            keys = self.dependents.get(dependency)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dependents[dependency]